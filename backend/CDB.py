@@ -1,11 +1,22 @@
-import io
 import os
-import time
 import logging
-from google.cloud import videointelligence_v1 as videointelligence
-from groq import Groq
 import chromadb
 from dotenv import load_dotenv
+from ingest import get_object_store
+from clients import get_groq_client, get_video_client
+from scheduler import CHAT_HEDGE_AFTER, scheduler
+from activity import find_active_segments
+from annotator import annotate_sections
+from profiles import profile_sections
+from ids import new_video_id
+from embeddings import get_embedding_function
+from summarizer import Summarizer, SummaryCache
+from compaction import compact_sections, compression_report, report_lines
+from annotation_store import extract_annotations
+from indexing import BulkWriter
+from chunking import chunk_sections
+from formatters import format_section
+from retrieval import ANALYSIS_SECTION, assemble_sections, get_video_sections, query_video_windows, section_id
 
 # Load environment variables
 load_dotenv()
@@ -17,75 +28,40 @@ logger = logging.getLogger(__name__)
 class VideoAnalyzer:
     def __init__(self):
         try:
-            self.client = videointelligence.VideoIntelligenceServiceClient()
-            self.groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+            self.client = get_video_client()
+            self.groq_client = get_groq_client()
+            self.summarizer = Summarizer(self.groq_client, SummaryCache())
             self.chroma_client = chromadb.PersistentClient(path=os.getenv('CHROMA_DB_PATH', './chroma_db'))
-            self.collection = self.chroma_client.get_or_create_collection(name="video_analysis")
+            self.collection = self.chroma_client.get_or_create_collection(
+                name="video_analysis", embedding_function=get_embedding_function()
+            )
+            self.store = get_object_store()
         except Exception as e:
             logger.error(f"Error initializing VideoAnalyzer: {str(e)}")
             raise
 
-    def analyze_video(self, video_path):
+    def analyze_video(self, video_path, profile=None):
+        """Annotate the sections of the named analysis profile (default "full"), then summarize with Groq."""
         try:
-            with io.open(video_path, "rb") as file:
-                input_content = file.read()
-
-            features = [
-                videointelligence.Feature.LABEL_DETECTION,
-                videointelligence.Feature.FACE_DETECTION,
-                videointelligence.Feature.PERSON_DETECTION,
-                videointelligence.Feature.SHOT_CHANGE_DETECTION,
-                videointelligence.Feature.OBJECT_TRACKING,
-                videointelligence.Feature.SPEECH_TRANSCRIPTION
-            ]
-
-            config = videointelligence.VideoContext(
-                face_detection_config=videointelligence.FaceDetectionConfig(
-                    include_bounding_boxes=True,
-                    include_attributes=True
-                ),
-                person_detection_config=videointelligence.PersonDetectionConfig(
-                    include_bounding_boxes=True,
-                    include_attributes=True,
-                    include_pose_landmarks=True
-                ),
-                speech_transcription_config=videointelligence.SpeechTranscriptionConfig(
-                    language_code="en-US",
-                    enable_automatic_punctuation=True
+            section_names = profile_sections(profile)
+            active_segments = find_active_segments(video_path)
+            sections = annotate_sections(section_names, video_path, self.store, active_segments=active_segments)
+
+            video_id = new_video_id()
+
+            section_texts = {
+                section_name: self.process_section(section_name, section_data)
+                for section_name, section_data in sections
+            }
+
+            # One batched upsert for the sections and the Groq analysis
+            with BulkWriter(self.collection) as writer:
+                writer.add_video(video_id, section_texts)
+                for doc_id, document, doc_metadata in chunk_sections(video_id, sections):
+                    writer.add(doc_id, document, doc_metadata)
+                groq_analysis = self.process_video_analysis(
+                    video_id, section_texts, writer, rows=list(extract_annotations(sections))
                 )
-            )
-
-            operation = self.client.annotate_video(
-                request={
-                    "features": features,
-                    "input_content": input_content,
-                    "video_context": config,
-                }
-            )
-
-            logger.info("Waiting for operation to complete...")
-            result = operation.result(timeout=1200)
-
-            video_id = f"video_{int(time.time())}"
-            
-            sections = [
-                ("LABEL_DETECTION", result.annotation_results[0].segment_label_annotations),
-                ("FACE_DETECTION", result.annotation_results[0].face_detection_annotations),
-                ("PERSON_DETECTION", result.annotation_results[0].person_detection_annotations),
-                ("SHOT_CHANGE_DETECTION", result.annotation_results[0].shot_annotations),
-                ("OBJECT_TRACKING", result.annotation_results[0].object_annotations),
-                ("SPEECH_TRANSCRIPTION", result.annotation_results[0].speech_transcriptions)
-            ]
-
-            for section_name, section_data in sections:
-                section_text = self.process_section(section_name, section_data)
-                self.collection.add(
-                    documents=[section_text],
-                    metadatas=[{"video_id": video_id, "section": section_name}],
-                    ids=[f"{video_id}_{section_name}"]
-                )
-
-            groq_analysis = self.process_video_analysis(video_id)
             return video_id, groq_analysis
         except Exception as e:
             logger.error(f"Error in analyze_video: {str(e)}")
@@ -93,143 +69,39 @@ class VideoAnalyzer:
 
     def process_section(self, section_name, section_data):
         try:
-            if section_name == "LABEL_DETECTION":
-                return self.process_label_detection(section_data)
-            elif section_name == "FACE_DETECTION":
-                return self.process_face_detection(section_data)
-            elif section_name == "PERSON_DETECTION":
-                return self.process_person_detection(section_data)
-            elif section_name == "SHOT_CHANGE_DETECTION":
-                return self.process_shot_change_detection(section_data)
-            elif section_name == "OBJECT_TRACKING":
-                return self.process_object_tracking(section_data)
-            elif section_name == "SPEECH_TRANSCRIPTION":
-                return self.process_speech_transcription(section_data)
-            else:
-                return f"{section_name}:\n{str(section_data)}"
+            return format_section(section_name, section_data)
         except Exception as e:
             logger.error(f"Error in process_section for {section_name}: {str(e)}")
             return f"Error processing {section_name}"
 
-    def process_label_detection(self, label_annotations):
-        result = "LABEL DETECTION:\n"
-        for label in label_annotations:
-            result += f"Label: {label.entity.description}\n"
-            for segment in label.segments:
-                confidence = segment.confidence
-                start_time = segment.segment.start_time_offset.total_seconds()
-                end_time = segment.segment.end_time_offset.total_seconds()
-                result += f"  Segment: {start_time:.2f}s to {end_time:.2f}s (Confidence: {confidence:.2f})\n"
-        return result
-
-    def process_face_detection(self, face_annotations):
-        result = "FACE DETECTION:\n"
-        for face in face_annotations:
-            for track in face.tracks:
-                result += f"Face detected with confidence: {track.confidence:.2f}\n"
-                start_time = track.segment.start_time_offset.total_seconds()
-                end_time = track.segment.end_time_offset.total_seconds()
-                result += f"  Tracked from {start_time:.2f}s to {end_time:.2f}s\n"
-                for attribute in track.timestamped_objects[0].attributes:
-                    result += f"    Attribute: {attribute.name} (Confidence: {attribute.confidence:.2f})\n"
-        return result
-
-    def process_person_detection(self, person_annotations):
-        result = "PERSON DETECTION:\n"
-        for person in person_annotations:
-            for track in person.tracks:
-                result += f"Person detected with confidence: {track.confidence:.2f}\n"
-                start_time = track.segment.start_time_offset.total_seconds()
-                end_time = track.segment.end_time_offset.total_seconds()
-                result += f"  Tracked from {start_time:.2f}s to {end_time:.2f}s\n"
-                for attribute in track.timestamped_objects[0].attributes:
-                    result += f"    Attribute: {attribute.name} (Confidence: {attribute.confidence:.2f})\n"
-        return result
-
-    def process_shot_change_detection(self, shot_annotations):
-        result = "SHOT CHANGE DETECTION:\n"
-        for i, shot in enumerate(shot_annotations):
-            start_time = shot.start_time_offset.total_seconds()
-            end_time = shot.end_time_offset.total_seconds()
-            result += f"  Shot {i + 1}: {start_time:.2f}s to {end_time:.2f}s\n"
-        return result
-
-    def process_object_tracking(self, object_annotations):
-        result = "OBJECT TRACKING:\n"
-        for obj in object_annotations:
-            result += f"Tracked object: {obj.entity.description}\n"
-            start_time = obj.segment.start_time_offset.total_seconds()
-            end_time = obj.segment.end_time_offset.total_seconds()
-            result += f"  Tracked from {start_time:.2f}s to {end_time:.2f}s\n"
-            result += f"  Confidence: {obj.confidence:.2f}\n"
-        return result
-
-    def process_speech_transcription(self, speech_transcriptions):
-        result = "SPEECH TRANSCRIPTION:\n"
-        for speech_transcription in speech_transcriptions:
-            for alternative in speech_transcription.alternatives:
-                result += f"Transcript: {alternative.transcript}\n"
-                result += f"Confidence: {alternative.confidence:.2f}\n"
-                result += "Word level information:\n"
-                for word_info in alternative.words:
-                    start_time = word_info.start_time.total_seconds()
-                    end_time = word_info.end_time.total_seconds()
-                    result += f"  {start_time:.2f}s - {end_time:.2f}s: {word_info.word}\n"
-        return result
-
-    def process_video_analysis(self, video_id):
+    def process_video_analysis(self, video_id, sections=None, writer=None, rows=None):
         try:
-            results = self.collection.query(
-                query_texts=[f"Video analysis for {video_id}"],
-                n_results=10
-            )
-            
-            documents = [item for sublist in results['documents'] for item in (sublist if isinstance(sublist, list) else [sublist])]
-            documents = [doc for doc in documents if isinstance(doc, str)]
+            # Prefer the in-memory sections from analyze_video over a ChromaDB round trip
+            if sections is None:
+                sections = get_video_sections(self.collection, video_id)
+            if rows is not None:
+                compacted = compact_sections(rows)
+                for line in report_lines(compression_report(sections, compacted)):
+                    logger.info(f"Compacted {line}")
+                documents = assemble_sections(compacted)
+            else:
+                documents = assemble_sections(sections)
             
             if not documents:
                 return "No analysis data found."
 
-            video_analysis = "\n\n".join(documents)
-            custom_prompt = f"""You are a video consultant tasked with describing and analyzing a video based on provided analysis data. Your goal is to create a comprehensive description of the video's content and conclude with its main story.
+            # Long videos are summarized window by window when the annotation rows are given
+            output_text = self.summarizer.summarize(documents, rows)
 
-            Here is the video analysis data:
-            <video_analysis>
-            {video_analysis}
-            </video_analysis>
-
-            Based on this data, please provide:
-            1. A detailed description of the video's content, including:
-               - Main objects and people detected
-               - Key actions and events
-               - Any text or speech detected
-               - Descriptions of different scenes or shots
-            2. An analysis of the video's main theme or story
-            3. Any notable or interesting observations about the video
-
-            Please be as specific and detailed as possible in your description and analysis.
-            """
-
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": custom_prompt,
-                    }
-                ],
-                model="mixtral-8x7b-32768",
-                max_tokens=8192,
-                temperature=0,
-                top_p=0.95,
-            )
-
-            output_text = chat_completion.choices[0].message.content
-
-            self.collection.add(
-                documents=[output_text],
-                metadatas=[{"video_id": video_id, "section": "GROQ_ANALYSIS"}],
-                ids=[f"{video_id}_GROQ_ANALYSIS"]
-            )
+            doc_metadata = {"video_id": video_id, "section": ANALYSIS_SECTION}
+            if writer is not None:
+                writer.add(section_id(video_id, ANALYSIS_SECTION), output_text, doc_metadata)
+            else:
+                self.collection.upsert(
+                    documents=[output_text],
+                    metadatas=[doc_metadata],
+                    ids=[section_id(video_id, ANALYSIS_SECTION)]
+                )
 
             return output_text
         except Exception as e:
@@ -238,13 +110,7 @@ class VideoAnalyzer:
 
     def get_conversation_response(self, video_id, user_input):
         try:
-            results = self.collection.query(
-                query_texts=[user_input],
-                n_results=3
-            )
-            
-            documents = [item for sublist in results['documents'] for item in (sublist if isinstance(sublist, list) else [sublist])]
-            documents = [doc for doc in documents if isinstance(doc, str)]
+            documents = query_video_windows(self.collection, video_id, user_input, n_results=3)
             
             relevant_info = "\n".join(documents) if documents else "No relevant information found."
 
@@ -259,12 +125,12 @@ class VideoAnalyzer:
                 {"role": "user", "content": user_input}
             ]
 
-            response = self.groq_client.chat.completions.create(
+            response = scheduler.call('groq', lambda: self.groq_client.chat.completions.create(
                 model="mixtral-8x7b-32768",
                 messages=messages,
                 max_tokens=8192,
                 temperature=0.5,
-            )
+            ), hedge_after=CHAT_HEDGE_AFTER)
 
             return response.choices[0].message.content
         except Exception as e:
@@ -286,7 +152,7 @@ def main():
         video_path = os.getenv('VIDEO_PATH')
 
         # Analyze the video
-        video_id, groq_analysis = analyzer.analyze_video(video_path)
+        video_id, groq_analysis = analyzer.analyze_video(video_path, os.getenv('VIDEO_PROFILE'))
         
         logger.info(f"Video analysis complete. Video ID: {video_id}")
         logger.info("\nGroq Analysis:")
@@ -1,340 +1,613 @@
-import io
 import os
 import time
-from google.cloud import videointelligence_v1 as videointelligence
-from groq import Groq
+import threading
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, wait
 import chromadb
+from ingest import hash_file
+from clients import get_groq_client
+from scheduler import CHAT_HEDGE_AFTER, scheduler
+from activity import find_active_segments
+from annotator import annotate_results, annotate_sections, dump_results, load_results
+from profiles import profile_sections, result_sections, sections_needed
+from ids import new_video_id
+from embeddings import get_embedding_function
+from journal import ANNOTATED, INDEXED, SUMMARIZED, reached
+from summarizer import get_summarizer
+from compaction import KIND_SECTIONS, compact_sections, compression_report, report_lines
+from result_cache import feature_key
+from token_budget import TokenBudget, truncate_to_tokens
+from indexing import BulkWriter
+from chunking import chunk_sections
+from formatters import (
+    format_section, iter_label_detection, iter_face_detection, iter_person_detection,
+    iter_shot_change_detection, iter_object_tracking, iter_speech_transcription
+)
+from retrieval import (
+    ANALYSIS_SECTION, SECTIONS, assemble_sections, get_video_analysis, get_video_sections, query_video_windows, section_id
+)
+from annotation_store import VideoAnnotations, extract_annotations, parse_time_range, describe_annotations, LOOKUP_QUESTION
+# The analysis of a video in which the motion pass found nothing moving
+STATIC_ANALYSIS = ("No motion was detected anywhere in this video. The scene stays static from start to end, "
+                   "so no people, objects, speech or other activity were found.")
+ERROR_RESPONSE = "I'm sorry, but I encountered an error while processing your request. Could you please try asking your question in a different way?"
+
+def build_system_prompt(analysis, max_analysis_tokens):
+    """The system prompt of a conversation about a video with the given analysis."""
+    return f"""You are a video analysis assistant. You have analyzed a video and produced the following analysis:
+
+{truncate_to_tokens(analysis, max_analysis_tokens)}
+
+Based on this analysis, you will now engage in a conversation with the user about the video. Respond to their questions and comments, drawing upon the information in the analysis. If asked about something not covered in the analysis, politely explain that you don't have that information.
+
+Let's begin the conversation."""
+
 class ConversationHandler:
-    def __init__(self, collection):
-        self.client = Groq(api_key=os.environ['GROQ_API_KEY'])
+    def __init__(self, collection, client=None, budget=None, annotations=None, fetcher=None, responses=None):
+        self.client = client or get_groq_client()
+        self.budget = budget or TokenBudget()
+        # Optional AnnotationStore used to answer questions about specific times locally
+        self.annotations = annotations
+        # Optional SectionFetcher that adds sections the video's analysis profile skipped
+        self.fetcher = fetcher
+        # Optional ResponseCache shared by every conversation, for questions asked before
+        self.responses = responses
+        # Where the answer of the current turn is cached, if it can be
+        self.cache_key = None
         self.conversation_history = []
+        # Rolling summary of turns that have dropped out of conversation_history
+        self.memory = ""
         self.system_prompt = ""
+        self.video_id = None
         self.collection = collection
 
-    def start_conversation(self, video_id, initial_analysis):
-        # Retrieve the stored analysis from ChromaDB
-        results = self.collection.query(
-            query_texts=[f"Video analysis for {video_id}"],
-            n_results=1
-        )
-        
-        print(f"Start conversation query results: {results}")  # Debug print
-        
-        if results['documents'] and isinstance(results['documents'][0], list):
-            stored_analysis = results['documents'][0][0] if results['documents'][0] else initial_analysis
-        elif results['documents']:
-            stored_analysis = results['documents'][0]
-        else:
-            stored_analysis = initial_analysis
+    def start_conversation(self, video_id, initial_analysis=None):
+        """Build the system prompt for video_id. Returns the analysis used, or None if there is none."""
+        # Fetch the stored analysis for this video directly by id
+        stored_analysis = get_video_analysis(self.collection, video_id) or initial_analysis
+
+        if stored_analysis is None:
+            return None
 
-        if stored_analysis != initial_analysis:
+        if stored_analysis is initial_analysis:
             # Store the analysis in ChromaDB if it's not already there
-            self.collection.add(
+            self.collection.upsert(
                 documents=[stored_analysis],
-                metadatas=[{"video_id": video_id}],
-                ids=[f"analysis_{video_id}"]
+                metadatas=[{"video_id": video_id, "section": ANALYSIS_SECTION}],
+                ids=[section_id(video_id, ANALYSIS_SECTION)]
             )
 
-        self.system_prompt = f"""You are a video analysis assistant. You have analyzed a video and produced the following analysis:
-
-{stored_analysis}
-
-Based on this analysis, you will now engage in a conversation with the user about the video. Respond to their questions and comments, drawing upon the information in the analysis. If asked about something not covered in the analysis, politely explain that you don't have that information.
-
-Let's begin the conversation."""
+        self.system_prompt = build_system_prompt(stored_analysis, self.budget.max_analysis_tokens)
 
+        self.video_id = video_id
         self.conversation_history = []
+        self.memory = ""
+        return stored_analysis
+
+    def restore(self, video_id, system_prompt, conversation_history, memory=""):
+        """Resume a conversation saved by another request or worker without touching ChromaDB."""
+        self.video_id = video_id
+        self.system_prompt = system_prompt
+        self.conversation_history = list(conversation_history)
+        self.memory = memory
+
+    def summarize_history(self):
+        """Fold messages older than the recent window into the running memory."""
+        older, recent = self.budget.split(self.conversation_history)
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in older)
+        prompt = f"""Update the summary of a conversation about a video. Keep facts, questions asked and answers given; drop pleasantries. Reply with the summary only.
+
+Current summary:
+{self.memory or "(none)"}
+
+New messages:
+{transcript}"""
+        try:
+            response = scheduler.call('groq', lambda: self.client.chat.completions.create(
+                model="mixtral-8x7b-32768",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=self.budget.summary_tokens,
+                temperature=0,
+            ))
+            self.memory = response.choices[0].message.content
+        except Exception as e:
+            # Keep the prompt bounded even if the summary call fails
+            print(f"Error summarizing conversation: {str(e)}")
+            self.memory = truncate_to_tokens(f"{self.memory}\n{transcript}", self.budget.summary_tokens)
+        self.conversation_history = recent
 
-    def get_response(self, user_input):
+    def timeline_context(self, user_input):
+        """Describe the annotations in the time range a question refers to.
+
+        Returns (description, exact), or (None, False) if it names no time. exact is True for an
+        explicit instant or range, which a who/what question can be answered from directly.
+        """
+        if self.annotations is None:
+            return None, False
+        video_annotations = self.annotations.get(self.video_id)
+        if video_annotations is None:
+            return None, False
+        time_range = parse_time_range(user_input, video_annotations.duration())
+        if time_range is None:
+            return None, False
+        start, end, exact = time_range
+        return describe_annotations(video_annotations.query(start, end), start, end), exact
+
+    def _prepare_turn(self, user_input):
+        """Record the user message. Returns (answer, None) if it can be answered locally, else (None, messages)."""
         self.conversation_history.append({"role": "user", "content": user_input})
 
-        # Query ChromaDB for relevant information
-        results = self.collection.query(
-            query_texts=[user_input],
-            n_results=3
+        self.cache_key = None
+        if self.responses is not None:
+            try:
+                cached, self.cache_key = self.responses.lookup(self.video_id, user_input)
+            except Exception as e:
+                print(f"Error looking up cached response: {str(e)}")
+                cached = None
+            if cached is not None:
+                self.conversation_history.append({"role": "assistant", "content": cached})
+                return cached, None
+
+        pending, failed = self.fetcher(self.video_id, user_input) if self.fetcher is not None else ([], [])
+        if pending or failed:
+            # Answers given before all the sections are in are not reused
+            self.cache_key = None
+
+        timeline, exact = self.timeline_context(user_input)
+        complete = self.fetcher is None or self.fetcher.complete(self.video_id)
+        if timeline is not None and exact and not pending and complete and LOOKUP_QUESTION.match(user_input):
+            # "Who/what ... at 02:13?" is answered straight from the annotation index; approximate
+            # times ("around 02:13") only give the model context. So do videos still missing
+            # sections, whose index may never have looked for what is asked about
+            self.conversation_history.append({"role": "assistant", "content": timeline})
+            return timeline, None
+
+        if timeline is not None:
+            relevant_info = timeline
+        else:
+            # Query ChromaDB for the time windows of this video most relevant to the question
+            documents = query_video_windows(self.collection, self.video_id, user_input, n_results=3)
+            relevant_info = "\n".join(documents) if documents else "No relevant information found."
+        if pending:
+            names = ", ".join(name.replace("_", " ").lower() for name in pending)
+            relevant_info += f"\n\nNote: {names} for this video is still being processed. If the answer depends on it, say so."
+        if failed:
+            names = ", ".join(name.replace("_", " ").lower() for name in failed)
+            relevant_info += f"\n\nNote: {names} could not be run on this video. If the answer depends on it, say so."
+
+        return None, self.budget.build_messages(
+            self.system_prompt, self.memory, relevant_info, self.conversation_history
         )
-        
-        print(f"Query results: {results}")  # Debug print
-
-        # Process and flatten the documents
-        documents = []
-        for doc in results['documents']:
-            if isinstance(doc, list):
-                documents.extend(doc)
-            elif isinstance(doc, str):
-                documents.append(doc)
-        
-        relevant_info = "\n".join(documents) if documents else "No relevant information found."
 
-        messages = [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "system", "content": f"Additional relevant information:\n{relevant_info}"},
-            *self.conversation_history
-        ]
+    def _finish_turn(self, assistant_response):
+        self.conversation_history.append({"role": "assistant", "content": assistant_response})
+        if self.responses is not None:
+            self.responses.put(self.cache_key, assistant_response)
+
+        if self.budget.needs_summary(self.conversation_history):
+            self.summarize_history()
+
+    def get_response(self, user_input):
+        answer, messages = self._prepare_turn(user_input)
+        if answer is not None:
+            return answer
 
         try:
-            response = self.client.chat.completions.create(
+            response = scheduler.call('groq', lambda: self.client.chat.completions.create(
                 model="mixtral-8x7b-32768",
                 messages=messages,
-                max_tokens=8192,
+                max_tokens=self.budget.max_response_tokens,
                 temperature=0.5,
-            )
+            ), hedge_after=CHAT_HEDGE_AFTER)
 
             assistant_response = response.choices[0].message.content
-            self.conversation_history.append({"role": "assistant", "content": assistant_response})
+            self._finish_turn(assistant_response)
 
             return assistant_response
         except Exception as e:
             print(f"Error in Groq API call: {str(e)}")
-            return "I'm sorry, but I encountered an error while processing your request. Could you please try asking your question in a different way?"
+            return ERROR_RESPONSE
 
-def analyze_video(video_path, collection):
-    """Analyze a local video file using Google Cloud Video Intelligence API and Groq, and store the results in ChromaDB."""
+    def stream_response(self, user_input):
+        """Like get_response, but yields the answer piece by piece as the model produces it."""
+        answer, messages = self._prepare_turn(user_input)
+        if answer is not None:
+            yield answer
+            return
+
+        pieces = []
+        try:
+            stream = scheduler.stream('groq', lambda: self.client.chat.completions.create(
+                model="mixtral-8x7b-32768",
+                messages=messages,
+                max_tokens=self.budget.max_response_tokens,
+                temperature=0.5,
+                stream=True,
+            ), hedge_after=CHAT_HEDGE_AFTER)
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    pieces.append(delta)
+                    yield delta
+        except Exception as e:
+            print(f"Error in Groq API call: {str(e)}")
+            # A partial answer is kept in the history but not cached
+            self.cache_key = None
+            if not pieces:
+                yield ERROR_RESPONSE
+                return
+
+        self._finish_turn("".join(pieces))
+
+def analyze_video(video_path, collection, store=None, cache=None, content_hash=None, metadata=None, annotations=None,
+                  on_summary_delta=None, profile=None, records=None, source_store=None, journal=None, job_id=None):
+    """Analyze a local video file using Google Cloud Video Intelligence API and Groq, and store the results in ChromaDB.
+
+    If an object store is given the video is uploaded there and the annotator reads it by URI
+    instead of receiving the bytes inline. If a result cache is given, an upload whose content
+    was already analyzed with the same features returns the earlier result without any remote call.
+    Extra metadata (e.g. user, label) is stored on every document so retrieval can filter on it.
+    If an AnnotationStore is given the raw annotations are also indexed there for timeline queries.
+    on_summary_delta receives the Groq summary piece by piece while it is generated.
+    A local motion pass limits annotation to the active parts of the video (see activity.py).
+    profile names the sections annotated now (see profiles.py; default DEFAULT_PROFILE). With a VideoRecordStore
+    and a source_store, a partial profile keeps the video so fetch_sections can add the rest later.
+    With a JobJournal, job_id's stages are recorded as they complete and a resumed job continues
+    after the last one, under the same video id (see journal.py). The job is left open for the
+    caller to close with journal.finish(job_id, result) once it has stored what it returns.
+    """
+    metadata = {key: value for key, value in (metadata or {}).items() if value}
     
     time_start_read1 = time.time()
 
-    client = videointelligence.VideoIntelligenceServiceClient()
-
-    # Read the video file
-    with io.open(video_path, "rb") as file:
-        input_content = file.read()
-
-    # Specify the features you want to analyze
-    features = [
-        videointelligence.Feature.LABEL_DETECTION,
-        videointelligence.Feature.FACE_DETECTION,
-        videointelligence.Feature.PERSON_DETECTION,
-        videointelligence.Feature.SHOT_CHANGE_DETECTION,
-        videointelligence.Feature.OBJECT_TRACKING,
-        videointelligence.Feature.SPEECH_TRANSCRIPTION
-    ]
-
-    # Set up advanced configuration for some features
-    config = videointelligence.VideoContext(
-        face_detection_config=videointelligence.FaceDetectionConfig(
-            include_bounding_boxes=True,
-            include_attributes=True
-        ),
-        person_detection_config=videointelligence.PersonDetectionConfig(
-            include_bounding_boxes=True,
-            include_attributes=True,
-            include_pose_landmarks=True
-        ),
-        speech_transcription_config=videointelligence.SpeechTranscriptionConfig(
-            language_code="en-US",
-            enable_automatic_punctuation=True
+    # The sections (and so the Video Intelligence features) this profile asks for
+    section_names = profile_sections(profile)
+
+    # Ids are unique across workers; a journaled job keeps the id it was given first
+    job = journal.begin(job_id) if journal is not None else None
+    video_id = job['video_id'] if job is not None else new_video_id()
+
+    if cache is not None and not reached(job, ANNOTATED):
+        content_hash = content_hash or hash_file(video_path)
+        # A full analysis of the same content also satisfies a partial profile
+        for candidate in dict.fromkeys((tuple(section_names), tuple(SECTIONS))):
+            cached = cache.get(content_hash, feature_key(candidate))
+            if cached is not None:
+                print(f"Cache hit for {content_hash}, reusing analysis of {cached['video_id']}")
+                restore_cached_analysis(collection, cached)
+                return cached['video_id'], cached['analysis']
+
+    if reached(job, ANNOTATED):
+        print(f"\nResuming {video_id} after the {job['stage']} stage")
+        plan = journal.artifact(job_id, 'plan')
+        section_names, active_segments, source_uri = plan['sections'], plan['segments'], plan['source_uri']
+        content_hash = content_hash or plan['content_hash']
+        results = load_results(journal.artifact(job_id, 'annotations', raw=True))
+    else:
+        # Local motion pass: only the spans where something moves are sent for annotation
+        active_segments = find_active_segments(video_path)
+        if active_segments == []:
+            # A static video has nothing for any feature, so every section is complete (and empty)
+            section_names = tuple(SECTIONS)
+
+        source_uri = None
+        if records is not None and source_store is not None and len(section_names) < len(SECTIONS):
+            source_uri = source_store.put_file(video_path)
+
+        print(f"\nSending video for analysis ({', '.join(section_names)}). This might take a while...")
+        results = annotate_results(
+            section_names, video_path, store, source_uri=source_uri, source_store=source_store,
+            active_segments=active_segments
         )
-    )
-
-    print(f"\nSending video for analysis. This might take a while...")
-    operation = client.annotate_video(
-        request={
-            "features": features,
-            "input_content": input_content,
-            "video_context": config,
-        }
-    )
-
-    print("Waiting for operation to complete...")
-
-    result = operation.result(timeout=1200)
-
+        if journal is not None:
+            journal.advance(job_id, ANNOTATED, annotations=dump_results(results), plan={
+                'sections': list(section_names), 'segments': active_segments, 'source_uri': source_uri,
+                'content_hash': content_hash
+            })
     print("\nOperation completed. Processing results...")
-
-    # Generate a unique identifier for this video
-    video_id = f"video_{int(time.time())}"
-    
-    # Store each section of the analysis separately
-    sections = [
-        ("LABEL_DETECTION", result.annotation_results[0].segment_label_annotations),
-        ("FACE_DETECTION", result.annotation_results[0].face_detection_annotations),
-        ("PERSON_DETECTION", result.annotation_results[0].person_detection_annotations),
-        ("SHOT_CHANGE_DETECTION", result.annotation_results[0].shot_annotations),
-        ("OBJECT_TRACKING", result.annotation_results[0].object_annotations),
-        ("SPEECH_TRANSCRIPTION", result.annotation_results[0].speech_transcriptions)
-    ]
-
-    for section_name, section_data in sections:
-        section_text = process_section(section_name, section_data)
-        collection.add(
-            documents=[section_text],
-            metadatas=[{"video_id": video_id, "section": section_name}],
-            ids=[f"{video_id}_{section_name}"]
-        )
-
-    print(f"\nVideo Intelligence API results stored in ChromaDB")
-
-    # Now process with Groq
-    print("Starting Groq analysis...")
-    groq_analysis = process_video_analysis(video_id, collection)
+    sections = result_sections(results, section_names)
+
+    # Sections and the Groq analysis go to ChromaDB in one batched upsert. The writer flushes on
+    # exit, so the sections are still stored if the Groq stage fails. Every write is an upsert by
+    # id, so repeating a stage after a crash overwrites rather than duplicates.
+    with BulkWriter(collection) as writer:
+        if reached(job, INDEXED):
+            section_texts = journal.artifact(job_id, 'sections')
+        else:
+            section_texts = index_sections(video_id, sections, writer, metadata, annotations)
+            if journal is not None:
+                # The stage only counts once its documents are written
+                writer.flush()
+                journal.advance(job_id, INDEXED, sections=section_texts)
+
+        if reached(job, SUMMARIZED):
+            groq_analysis = journal.artifact(job_id, 'analysis')
+        else:
+            if active_segments == []:
+                # Nothing was annotated, so there is nothing for Groq to summarize
+                groq_analysis = STATIC_ANALYSIS
+                store_analysis(video_id, collection, groq_analysis, metadata, writer)
+                if on_summary_delta is not None:
+                    on_summary_delta(groq_analysis)
+            else:
+                # Now process with Groq
+                print("Starting Groq analysis...")
+                groq_analysis = process_video_analysis(
+                    video_id, collection, metadata, sections=section_texts, writer=writer, on_delta=on_summary_delta,
+                    rows=list(extract_annotations(sections))
+                )
+            if journal is not None:
+                writer.flush()
+                journal.advance(job_id, SUMMARIZED, analysis=groq_analysis)
+
+    print(f"\nAnalysis results stored in ChromaDB")
+
+    if records is not None:
+        records.put(video_id, section_names, content_hash, source_uri, active_segments, metadata)
+
+    if cache is not None and groq_analysis is not None:
+        cache.put(content_hash, feature_key(section_names), video_id, section_texts, groq_analysis)
 
     time_end_read1 = time.time()
     print(f"\nTotal analysis time: {time_end_read1 - time_start_read1:.2f} seconds")
 
     return video_id, groq_analysis
 
+def restore_cached_analysis(collection, cached):
+    """Re-add a cached analysis to ChromaDB if its documents are no longer there."""
+    video_id = cached['video_id']
+    if collection.get(ids=[section_id(video_id, ANALYSIS_SECTION)])['ids']:
+        return
+    with BulkWriter(collection) as writer:
+        writer.add_video(video_id, cached['sections'], cached['analysis'])
+
+def index_sections(video_id, sections, writer, metadata=None, annotations=None):
+    """Queue the section documents and time-window chunks of annotated sections on a BulkWriter.
+
+    Annotations are merged into any already stored for the video. Returns {section_name: text}.
+    """
+    section_texts = {
+        section_name: process_section(section_name, section_data)
+        for section_name, section_data in sections
+    }
+
+    if annotations is not None:
+        written = {section_name for section_name, _ in sections}
+
+        def merge(existing):
+            rows = extract_annotations(sections)
+            if existing is not None:
+                # Rows of the sections being written replace any stored for them, so a repeated write
+                # does not duplicate them
+                kept = (row for row in existing.rows() if KIND_SECTIONS[row[0]] not in written)
+                rows = chain(kept, rows)
+            return VideoAnnotations.from_rows(rows)
+
+        # Merged under the video's lock, so a concurrent fetch of other sections is not lost
+        annotations.update(video_id, merge)
+
+    writer.add_video(video_id, section_texts, metadata=metadata)
+    # Time-window chunks are what conversation retrieval searches
+    for doc_id, document, doc_metadata in chunk_sections(video_id, sections, metadata):
+        writer.add(doc_id, document, doc_metadata)
+    return section_texts
+
+def fetch_sections(video_id, section_names, collection, records, source_store, annotations=None, cache=None):
+    """Annotate sections a video's profile skipped and merge them into its stored analysis.
+
+    Returns the section names that were added. Nothing is fetched if the video's source is gone.
+    """
+    record = records.get(video_id)
+    if record is None or not record['source_uri']:
+        return []
+    missing = [name for name in section_names if name not in record['sections']]
+    if not missing:
+        return []
+
+    print(f"Fetching {', '.join(missing)} for {video_id}...")
+    sections = annotate_sections(
+        missing, source_uri=record['source_uri'], source_store=source_store, active_segments=record['segments']
+    )
+    with BulkWriter(collection) as writer:
+        index_sections(video_id, sections, writer, record['metadata'], annotations)
+
+    done = records.add_sections(video_id, missing, record['source_uri'])
+    if set(done) >= set(SECTIONS):
+        # Every section is in; the source is no longer needed
+        source_store.delete(record['source_uri'])
+        records.add_sections(video_id, [], None)
+
+    if cache is not None and record['content_hash']:
+        analysis = get_video_analysis(collection, video_id)
+        if analysis is not None:
+            cache.put(record['content_hash'], feature_key(done), video_id,
+                      get_video_sections(collection, video_id, done), analysis)
+    return missing
+
+def resummarize_video(video_id, collection, records, annotations, cache=None):
+    """Rewrite a video's Groq analysis after sections were added. Unchanged windows come from the summary cache."""
+    record = records.get(video_id)
+    video_annotations = annotations.get(video_id)
+    if record is None or video_annotations is None:
+        return None
+    sections = get_video_sections(collection, video_id, record['sections'])
+    analysis = process_video_analysis(video_id, collection, record['metadata'], sections=sections,
+                                      rows=list(video_annotations.rows()))
+    if cache is not None and analysis is not None and record['content_hash']:
+        cache.put(record['content_hash'], feature_key(record['sections']), video_id, sections, analysis)
+    return analysis
+
+class SectionFetcher:
+    """Fetches the sections a question needs but the video's profile skipped, in the background.
+
+    A conversation turn waits up to wait seconds for the fetch; if it takes longer the answer is
+    given from what is indexed so far and the sections still pending are reported. Concurrent
+    turns needing the same section share one fetch.
+
+    A section whose fetch failed is not tried again for retry_after seconds. on_analysis(video_id,
+    analysis) is called with the new overall analysis once added sections have changed it.
+    """
+
+    def __init__(self, collection, records, source_store, annotations=None, cache=None, wait=None, max_workers=None,
+                 responses=None, retry_after=None, on_analysis=None):
+        self.collection = collection
+        self.records = records
+        self.source_store = source_store
+        self.annotations = annotations
+        self.cache = cache
+        # ResponseCache whose answers for a video are dropped once its analysis changes
+        self.responses = responses
+        self.on_analysis = on_analysis
+        # Short by default: the turn holds its request and the session lock while it waits
+        self.wait = wait if wait is not None else float(os.getenv('LAZY_FETCH_WAIT', '5'))
+        self.retry_after = retry_after if retry_after is not None else float(os.getenv('LAZY_FETCH_RETRY_AFTER', '300'))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or int(os.getenv('LAZY_FETCH_WORKERS', '2')))
+        self.pending = {}
+        # (video_id, section) -> when its last fetch failed
+        self.failed = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, video_id, question):
+        """Make sure the sections question needs are indexed. Returns (pending, failed): the sections
+        still being fetched, and those that cannot be added now (their fetch failed, or the video's
+        source is gone).
+        """
+        record = self.records.get(video_id)
+        if record is None:
+            return [], []
+        needed = sections_needed(question, record['sections'])
+        if not needed:
+            return [], []
+        if not record['source_uri']:
+            return [], needed
+
+        now = time.monotonic()
+        with self.lock:
+            failed = [name for name in needed if now - self.failed.get((video_id, name), -self.retry_after) < self.retry_after]
+            futures = {name: self.pending.get((video_id, name)) for name in needed if name not in failed}
+            to_fetch = [name for name, future in futures.items() if future is None]
+            if to_fetch:
+                future = self.executor.submit(self._fetch, video_id, to_fetch)
+                for name in to_fetch:
+                    self.pending[(video_id, name)] = futures[name] = future
+
+        done, _ = wait(set(futures.values()), timeout=self.wait)
+        pending = [name for name, future in futures.items() if future not in done]
+        failed += [name for name, future in futures.items() if future in done and future.exception() is not None]
+        return pending, failed
+
+    def complete(self, video_id):
+        """Whether every section of the video has been annotated. Videos without a record were analyzed in full."""
+        record = self.records.get(video_id)
+        return record is None or all(name in record['sections'] for name in SECTIONS)
+
+    def _fetch(self, video_id, section_names):
+        failed_at = None
+        try:
+            added = fetch_sections(video_id, section_names, self.collection, self.records, self.source_store,
+                                   self.annotations, self.cache)
+        except Exception as e:
+            print(f"Error fetching sections for {video_id}: {str(e)}")
+            failed_at = time.monotonic()
+            raise
+        finally:
+            with self.lock:
+                for name in section_names:
+                    self.pending.pop((video_id, name), None)
+                    if failed_at is None:
+                        self.failed.pop((video_id, name), None)
+                    else:
+                        self.failed[(video_id, name)] = failed_at
+        if added and self.responses is not None:
+            self.responses.invalidate(video_id)
+        if added and self.annotations is not None:
+            # The conversation does not wait for the new overall analysis
+            self.executor.submit(self._resummarize, video_id)
+        return added
+
+    def _resummarize(self, video_id):
+        try:
+            analysis = resummarize_video(video_id, self.collection, self.records, self.annotations, self.cache)
+            if analysis is not None and self.on_analysis is not None:
+                self.on_analysis(video_id, analysis)
+        except Exception as e:
+            print(f"Error re-summarizing {video_id}: {str(e)}")
+        if self.responses is not None:
+            self.responses.invalidate(video_id)
+
 def process_section(section_name, section_data):
     """Process each section of the video analysis"""
-    if section_name == "LABEL_DETECTION":
-        return process_label_detection(section_data)
-    elif section_name == "FACE_DETECTION":
-        return process_face_detection(section_data)
-    elif section_name == "PERSON_DETECTION":
-        return process_person_detection(section_data)
-    elif section_name == "SHOT_CHANGE_DETECTION":
-        return process_shot_change_detection(section_data)
-    elif section_name == "OBJECT_TRACKING":
-        return process_object_tracking(section_data)
-    elif section_name == "SPEECH_TRANSCRIPTION":
-        return process_speech_transcription(section_data)
-    else:
-        return f"{section_name}:\n{str(section_data)}"
+    return format_section(section_name, section_data)
 
 def process_label_detection(label_annotations):
-    result = "LABEL DETECTION:\n"
-    for label in label_annotations:
-        result += f"Label: {label.entity.description}\n"
-        for segment in label.segments:
-            confidence = segment.confidence
-            start_time = segment.segment.start_time_offset.total_seconds()
-            end_time = segment.segment.end_time_offset.total_seconds()
-            result += f"  Segment: {start_time:.2f}s to {end_time:.2f}s (Confidence: {confidence:.2f})\n"
-    return result
+    return "".join(iter_label_detection(label_annotations))
 
 def process_face_detection(face_annotations):
-    result = "FACE DETECTION:\n"
-    for face in face_annotations:
-        for track in face.tracks:
-            result += f"Face detected with confidence: {track.confidence:.2f}\n"
-            start_time = track.segment.start_time_offset.total_seconds()
-            end_time = track.segment.end_time_offset.total_seconds()
-            result += f"  Tracked from {start_time:.2f}s to {end_time:.2f}s\n"
-            for attribute in track.timestamped_objects[0].attributes:
-                result += f"    Attribute: {attribute.name} (Confidence: {attribute.confidence:.2f})\n"
-    return result
+    return "".join(iter_face_detection(face_annotations))
 
 def process_person_detection(person_annotations):
-    result = "PERSON DETECTION:\n"
-    for person in person_annotations:
-        for track in person.tracks:
-            result += f"Person detected with confidence: {track.confidence:.2f}\n"
-            start_time = track.segment.start_time_offset.total_seconds()
-            end_time = track.segment.end_time_offset.total_seconds()
-            result += f"  Tracked from {start_time:.2f}s to {end_time:.2f}s\n"
-            for attribute in track.timestamped_objects[0].attributes:
-                result += f"    Attribute: {attribute.name} (Confidence: {attribute.confidence:.2f})\n"
-    return result
+    return "".join(iter_person_detection(person_annotations))
 
 def process_shot_change_detection(shot_annotations):
-    result = "SHOT CHANGE DETECTION:\n"
-    for i, shot in enumerate(shot_annotations):
-        start_time = shot.start_time_offset.total_seconds()
-        end_time = shot.end_time_offset.total_seconds()
-        result += f"  Shot {i + 1}: {start_time:.2f}s to {end_time:.2f}s\n"
-    return result
+    return "".join(iter_shot_change_detection(shot_annotations))
 
 def process_object_tracking(object_annotations):
-    result = "OBJECT TRACKING:\n"
-    for obj in object_annotations:
-        result += f"Tracked object: {obj.entity.description}\n"
-        start_time = obj.segment.start_time_offset.total_seconds()
-        end_time = obj.segment.end_time_offset.total_seconds()
-        result += f"  Tracked from {start_time:.2f}s to {end_time:.2f}s\n"
-        result += f"  Confidence: {obj.confidence:.2f}\n"
-    return result
+    return "".join(iter_object_tracking(object_annotations))
 
 def process_speech_transcription(speech_transcriptions):
-    result = "SPEECH TRANSCRIPTION:\n"
-    for speech_transcription in speech_transcriptions:
-        for alternative in speech_transcription.alternatives:
-            result += f"Transcript: {alternative.transcript}\n"
-            result += f"Confidence: {alternative.confidence:.2f}\n"
-            result += "Word level information:\n"
-            for word_info in alternative.words:
-                start_time = word_info.start_time.total_seconds()
-                end_time = word_info.end_time.total_seconds()
-                result += f"  {start_time:.2f}s - {end_time:.2f}s: {word_info.word}\n"
-    return result
-
-def process_video_analysis(video_id, collection):
-    """Process video analysis using Groq and store the result in ChromaDB."""
+    return "".join(iter_speech_transcription(speech_transcriptions))
+
+def process_video_analysis(video_id, collection, metadata=None, sections=None, writer=None, on_delta=None, rows=None):
+    """Process video analysis using Groq and store the result in ChromaDB.
+
+    sections maps section names to their text as produced by analyze_video; when it is not
+    given the sections are fetched from ChromaDB by id. If a BulkWriter is given the result is
+    queued on it instead of written immediately. If on_delta is given the completion is streamed
+    and on_delta is called with each piece as it arrives. With the video's annotation rows the
+    prompt is built from compacted annotations (see compaction.py), and long videos are
+    summarized window by window (see summarizer.py).
+    """
     try:
-        client = Groq(api_key=os.environ['GROQ_API_KEY'])
+        summarizer = get_summarizer()
     except KeyError:
         print("GROQ_API_KEY environment variable is not set. Please set it and try again.")
         return None
 
-    # Retrieve all sections of the video analysis from ChromaDB
-    results = collection.query(
-        query_texts=[f"Video analysis for {video_id}"],
-        n_results=10  # Adjust this number based on how many sections you have
-    )
-    
-    print(f"Query results: {results}")  # Debug print
-    
-    # Check if 'documents' is in results and is a list
-    if 'documents' not in results or not isinstance(results['documents'], list):
-        print(f"Unexpected result structure: {results}")
-        return None
-
-    # Flatten the list of documents if it's a nested list
-    documents = [item for sublist in results['documents'] for item in (sublist if isinstance(sublist, list) else [sublist])]
-    
-    # Filter out any non-string items
-    documents = [doc for doc in documents if isinstance(doc, str)]
+    if sections is None:
+        sections = get_video_sections(collection, video_id)
+    if rows is not None:
+        # The prompt gets the compacted annotations rather than the full formatter output
+        compacted = compact_sections(rows)
+        for line in report_lines(compression_report(sections, compacted)):
+            print(f"Compacted {line}")
+        documents = assemble_sections(compacted)
+    else:
+        documents = assemble_sections(sections)
     
     if not documents:
-        print("No valid documents found in the query results.")
+        print(f"No analysis sections found for {video_id}.")
         return None
 
-    video_analysis = "\n\n".join(documents)
-    # Custom prompt
-    custom_prompt = f"""You are a video consultant tasked with describing and analyzing a video based on provided analysis data. Your goal is to create a comprehensive description of the video's content and conclude with its main story.
-
-        Here is the video analysis data:
-        <video_analysis>
-        {video_analysis}
-        </video_analysis>
-
-        Based on this data, please provide:
-        1. A detailed description of the video's content, including:
-           - Main objects and people detected
-           - Key actions and events
-           - Any text or speech detected
-           - Descriptions of different scenes or shots
-        2. An analysis of the video's main theme or story
-        3. Any notable or interesting observations about the video
-
-        Please be as specific and detailed as possible in your description and analysis.
-        """
-
-    # Make a request to the Groq API
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": custom_prompt,
-            }
-        ],
-        model="mixtral-8x7b-32768",
-        max_tokens=8192,
-        temperature=0,
-        top_p=0.95,
-    )
-
-    # Get the response text
-    output_text = chat_completion.choices[0].message.content
+    output_text = summarizer.summarize(documents, rows, on_delta)
 
     # Store the Groq analysis in ChromaDB
-    collection.add(
-        documents=[output_text],
-        metadatas=[{"video_id": video_id, "section": "GROQ_ANALYSIS"}],
-        ids=[f"{video_id}_GROQ_ANALYSIS"]
-    )
+    store_analysis(video_id, collection, output_text, metadata, writer)
 
     print("Groq analysis complete and stored in ChromaDB!")
     return output_text
 
+def store_analysis(video_id, collection, analysis, metadata=None, writer=None):
+    """Store a video's overall analysis in ChromaDB, or queue it on a BulkWriter if one is given."""
+    doc_metadata = {**(metadata or {}), "video_id": video_id, "section": ANALYSIS_SECTION}
+    if writer is not None:
+        writer.add(section_id(video_id, ANALYSIS_SECTION), analysis, doc_metadata)
+    else:
+        collection.upsert(
+            documents=[analysis],
+            metadatas=[doc_metadata],
+            ids=[section_id(video_id, ANALYSIS_SECTION)]
+        )
+
 def start_conversation(video_id, groq_analysis, collection):
     conversation_handler = ConversationHandler(collection)
     conversation_handler.start_conversation(video_id, groq_analysis)
@@ -360,7 +633,7 @@ def main():
     collection_name = "video_analysis"
 
     # Get or create the collection
-    collection = chroma_client.get_or_create_collection(name=collection_name)
+    collection = chroma_client.get_or_create_collection(name=collection_name, embedding_function=get_embedding_function())
 
     # Set up the path to your test video file
     test_video_path = r"C:\Users\izcin\OneDrive\Documents\HTN\Video-Audio-To-Text-Generator\backend\youtube_downloads\Video.mp4"
@@ -0,0 +1,134 @@
+import os
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PREFILTER_ENABLED = os.getenv('MOTION_PREFILTER', '1') not in ('0', 'false', 'False', '')
+SAMPLE_FPS = float(os.getenv('MOTION_SAMPLE_FPS', '2'))
+FRAME_WIDTH = int(os.getenv('MOTION_FRAME_WIDTH', '160'))
+# A pixel counts as changed when its grey level moves by more than this between samples
+PIXEL_DELTA = int(os.getenv('MOTION_PIXEL_DELTA', '25'))
+# A sample is active when more than this fraction of its pixels changed
+MOTION_THRESHOLD = float(os.getenv('MOTION_THRESHOLD', '0.01'))
+# Seconds of context kept around activity, and the largest quiet gap merged into one segment
+PAD_SECONDS = float(os.getenv('MOTION_PAD_SECONDS', '2'))
+MIN_GAP_SECONDS = float(os.getenv('MOTION_MIN_GAP_SECONDS', '4'))
+# Above this active fraction the whole video is sent; segments would save little
+MAX_ACTIVE_FRACTION = float(os.getenv('MOTION_MAX_ACTIVE_FRACTION', '0.8'))
+BLOCK_FRAMES = 256
+
+
+def sample_frames(video_path, sample_fps=SAMPLE_FPS, width=FRAME_WIDTH):
+    """Yield (seconds, grey frame) for about sample_fps frames per second, downscaled to width pixels.
+
+    Needs OpenCV (cv2); frames that are not sampled are grabbed without being converted.
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video {video_path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, int(round(fps / sample_fps)))
+        index = 0
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                height = max(1, int(frame.shape[0] * width / frame.shape[1]))
+                small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                yield index / fps, cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            index += 1
+    finally:
+        capture.release()
+
+
+def motion_scores(frames, pixel_delta=PIXEL_DELTA):
+    """Fraction of changed pixels between consecutive sampled frames.
+
+    Returns (times, scores) arrays; scores[i] is the change from frame i - 1 to frame i, with
+    the first frame scored 0. Frames are differenced in blocks so memory stays flat.
+    """
+    times = []
+    scores = []
+    previous = None
+    block = []
+
+    def flush():
+        nonlocal previous
+        stack = np.stack(block).astype(np.int16)
+        if previous is None:
+            # The first frame is differenced against itself
+            previous = stack[0]
+        changed = np.abs(np.diff(np.concatenate([previous[None], stack]), axis=0)) > pixel_delta
+        scores.append(changed.mean(axis=(1, 2)))
+        previous = stack[-1]
+        block.clear()
+
+    for t, frame in frames:
+        times.append(t)
+        block.append(frame)
+        if len(block) >= BLOCK_FRAMES:
+            flush()
+    if block:
+        flush()
+    if not scores:
+        return np.asarray(times), np.zeros(0)
+    return np.asarray(times), np.concatenate(scores)
+
+
+def active_segments(times, scores, threshold=MOTION_THRESHOLD, pad=PAD_SECONDS, min_gap=MIN_GAP_SECONDS, duration=None):
+    """Turn per-sample motion scores into merged (start, end) second ranges of activity."""
+    if len(times) == 0:
+        return []
+    duration = duration if duration is not None else float(times[-1])
+    active = np.concatenate([[False], scores > threshold, [False]])
+    # Run boundaries: rising edges start a run, falling edges end one
+    edges = np.flatnonzero(np.diff(active.astype(np.int8)))
+    # A score measures the change since the previous sample, so activity starts one sample earlier
+    starts = times[np.maximum(edges[0::2] - 1, 0)]
+    ends = times[edges[1::2] - 1]
+
+    segments = []
+    for start, end in zip(starts, ends):
+        start = max(0.0, float(start) - pad)
+        end = min(duration, float(end) + pad)
+        if segments and start - segments[-1][1] <= min_gap:
+            segments[-1] = (segments[-1][0], max(segments[-1][1], end))
+        else:
+            segments.append((start, end))
+    return segments
+
+
+def find_active_segments(video_path):
+    """Where anything moves in a video, as (start, end) seconds.
+
+    Returns None when the whole video should be annotated: the pre-filter is disabled, OpenCV is
+    not installed, the video cannot be decoded, or most of it is active anyway. Returns [] for a
+    completely static video.
+    """
+    if not PREFILTER_ENABLED:
+        return None
+    try:
+        times, scores = motion_scores(sample_frames(video_path))
+    except ImportError:
+        logger.info("OpenCV is not installed; annotating the whole video")
+        return None
+    except Exception as e:
+        logger.warning(f"Motion pre-filter failed, annotating the whole video: {e}")
+        return None
+    if len(times) == 0:
+        return None
+
+    # The last sample may be up to one sampling interval before the true end
+    duration = float(times[-1]) + 1.0 / SAMPLE_FPS
+    segments = active_segments(times, scores, duration=duration)
+    active = sum(end - start for start, end in segments)
+    logger.info(f"Motion pre-filter: {len(segments)} active segment(s), {active:.1f}s of {duration:.1f}s")
+    if active > MAX_ACTIVE_FRACTION * duration:
+        return None
+    return segments
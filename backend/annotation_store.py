@@ -0,0 +1,432 @@
+import os
+import io
+import re
+import json
+import struct
+import tempfile
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+KINDS = ("label", "face", "person", "shot", "object", "word")
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# (attribute, array typecode) for every column, in file order
+COLUMNS = (("starts", "d"), ("ends", "d"), ("kinds", "B"), ("names", "I"), ("confidences", "f"))
+
+
+def _seconds(offset):
+    return offset.total_seconds()
+
+
+def extract_annotations(sections):
+    """Yield (kind, name, start, end, confidence) for every timed item in the annotation sections."""
+    for section_name, section_data in sections:
+        if section_name == "LABEL_DETECTION":
+            for label in section_data:
+                for segment in label.segments:
+                    yield ("label", label.entity.description, _seconds(segment.segment.start_time_offset),
+                           _seconds(segment.segment.end_time_offset), segment.confidence)
+        elif section_name in ("FACE_DETECTION", "PERSON_DETECTION"):
+            kind = "face" if section_name == "FACE_DETECTION" else "person"
+            for annotation in section_data:
+                for track in annotation.tracks:
+                    attributes = []
+                    if track.timestamped_objects:
+                        attributes = [attribute.name for attribute in track.timestamped_objects[0].attributes]
+                    yield (kind, ", ".join(attributes) or kind, _seconds(track.segment.start_time_offset),
+                           _seconds(track.segment.end_time_offset), track.confidence)
+        elif section_name == "SHOT_CHANGE_DETECTION":
+            for i, shot in enumerate(section_data):
+                yield "shot", f"Shot {i + 1}", _seconds(shot.start_time_offset), _seconds(shot.end_time_offset), 1.0
+        elif section_name == "OBJECT_TRACKING":
+            for obj in section_data:
+                yield ("object", obj.entity.description, _seconds(obj.segment.start_time_offset),
+                       _seconds(obj.segment.end_time_offset), obj.confidence)
+        elif section_name == "SPEECH_TRANSCRIPTION":
+            for speech_transcription in section_data:
+                for alternative in speech_transcription.alternatives[:1]:
+                    for word_info in alternative.words:
+                        yield ("word", word_info.word, _seconds(word_info.start_time),
+                               _seconds(word_info.end_time), alternative.confidence)
+
+
+class VideoAnnotations:
+    """One video's annotations as parallel typed arrays with an interval index.
+
+    Rows are sorted by start time. A max-end segment tree over the rows answers "which intervals
+    overlap [start, end]" in O(log n + k log n), and per-name posting lists answer entity lookups
+    without a scan. Entity names are interned once in a string table.
+    """
+
+    def __init__(self, starts, ends, kinds, names, confidences, name_table):
+        self.starts = starts
+        self.ends = ends
+        self.kinds = kinds
+        self.names = names
+        self.confidences = confidences
+        self.name_table = name_table
+        self._build_index()
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = sorted(rows, key=lambda row: row[2])
+        name_table = []
+        name_codes = {}
+        columns = {attr: array(typecode) for attr, typecode in COLUMNS}
+        for kind, name, start, end, confidence in rows:
+            code = name_codes.get(name)
+            if code is None:
+                code = name_codes[name] = len(name_table)
+                name_table.append(name)
+            columns["starts"].append(start)
+            columns["ends"].append(max(start, end))
+            columns["kinds"].append(KIND_CODES[kind])
+            columns["names"].append(code)
+            columns["confidences"].append(confidence)
+        return cls(name_table=name_table, **columns)
+
+    @classmethod
+    def from_sections(cls, sections):
+        return cls.from_rows(extract_annotations(sections))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def rows(self):
+        """Yield (kind, name, start, end, confidence) for every row, e.g. to merge in more annotations."""
+        for row in range(len(self)):
+            yield (KINDS[self.kinds[row]], self.name_table[self.names[row]], self.starts[row], self.ends[row],
+                   self.confidences[row])
+
+    def _build_index(self):
+        # Bottom-up segment tree of max end times; leaves live at [size, size + n)
+        n = len(self.starts)
+        size = 1
+        while size < n:
+            size *= 2
+        tree = array("d", [float("-inf")]) * (2 * size)
+        tree[size:size + n] = self.ends
+        for i in range(size - 1, 0, -1):
+            tree[i] = max(tree[2 * i], tree[2 * i + 1])
+        self._size = size
+        self._tree = tree
+        self._postings = {}
+        for row, code in enumerate(self.names):
+            self._postings.setdefault(code, array("I")).append(row)
+        # Lowercased name -> its codes ("Car" and "car" are interned separately)
+        self._codes_by_name = {}
+        for code, entity in enumerate(self.name_table):
+            self._codes_by_name.setdefault(entity.lower(), []).append(code)
+
+    def _overlapping_rows(self, start, end):
+        """Rows whose [start, end] overlaps the query, in start order."""
+        # Only rows that start by `end` can overlap; they form a prefix
+        limit = bisect_right(self.starts, end)
+        rows = []
+        stack = [(1, 0, self._size)]
+        tree = self._tree
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= limit or tree[node] < start:
+                continue
+            if hi - lo == 1:
+                rows.append(lo)
+                continue
+            mid = (lo + hi) // 2
+            # Right child first so rows pop off the stack in ascending order
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        return rows
+
+    def _row(self, row):
+        return {
+            "kind": KINDS[self.kinds[row]],
+            "name": self.name_table[self.names[row]],
+            "start": self.starts[row],
+            "end": self.ends[row],
+            "confidence": round(self.confidences[row], 4),
+        }
+
+    def query(self, start=0.0, end=float("inf"), kinds=None, min_confidence=0.0):
+        """Annotations overlapping [start, end] seconds, optionally limited to some kinds."""
+        codes = None if not kinds else {KIND_CODES[kind] for kind in kinds}
+        return [
+            self._row(row) for row in self._overlapping_rows(start, end)
+            if (codes is None or self.kinds[row] in codes) and self.confidences[row] >= min_confidence
+        ]
+
+    def at(self, t, kinds=None):
+        """Everything in frame (or being said) at time t."""
+        return self.query(t, t, kinds)
+
+    def find(self, name, start=0.0, end=float("inf")):
+        """Occurrences of an entity by name (case-insensitive), optionally within a time range."""
+        rows = []
+        for code in self._codes_by_name.get(name.lower(), ()):
+            rows.extend(self._postings.get(code, ()))
+        rows.sort()
+        return [self._row(row) for row in rows if self.starts[row] <= end and self.ends[row] >= start]
+
+    def duration(self):
+        return max(self.ends) if len(self.ends) else 0.0
+
+    def to_bytes(self):
+        header = json.dumps({
+            "count": len(self),
+            "name_table": self.name_table,
+            "columns": [[attr, typecode] for attr, typecode in COLUMNS],
+        }).encode("utf-8")
+        out = io.BytesIO()
+        out.write(struct.pack("<I", len(header)))
+        out.write(header)
+        for attr, _ in COLUMNS:
+            out.write(getattr(self, attr).tobytes())
+        return out.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        (header_len,) = struct.unpack_from("<I", data)
+        header = json.loads(data[4:4 + header_len].decode("utf-8"))
+        offset = 4 + header_len
+        columns = {}
+        for attr, typecode in header["columns"]:
+            column = array(typecode)
+            nbytes = header["count"] * column.itemsize
+            column.frombytes(data[offset:offset + nbytes])
+            offset += nbytes
+            columns[attr] = column
+        return cls(name_table=header["name_table"], **columns)
+
+
+# A time is a clock time (1:02:13, 02:13, 02:13.5) or a number with a unit (133s, 2 minutes).
+# In a range the unit may be given once for both numbers: "between 10 and 20 seconds".
+_CLOCK = r"(?:\d+:)?\d{1,2}:\d{2}(?:\.\d+)?"
+_NUMBER = r"(?<!['’\w.:])\d+(?:\.\d+)?"
+_UNIT = r"(?:hours?|hrs?|minutes?|mins?|seconds?|secs?|s)\b"
+UNIT_SECONDS = {"h": 3600, "m": 60, "s": 1}
+# "the 1990s", "80s music": a decade, not a number of seconds
+DECADE = re.compile(r"^(?:1[5-9]|20)\d0$")
+
+
+def _time(name):
+    return rf"(?:(?P<{name}_clock>{_CLOCK})|(?P<{name}>{_NUMBER})(?P<{name}_space>\s*)(?P<{name}_unit>{_UNIT})?)"
+
+
+TIME_RANGE = re.compile(
+    rf"\b(?:between|from)\s+{_time('a')}\s*(?:and|to|until|till|-|–|—)\s*{_time('b')}"
+    rf"|{_time('c')}\s*(?:-|–|—|to)\s*{_time('d')}",
+    re.IGNORECASE
+)
+RELATIVE_RANGE = re.compile(
+    rf"\b(?P<which>first|opening|last|final)\s+(?:(?P<n>{_NUMBER})\s*)?(?P<unit>{_UNIT})", re.IGNORECASE
+)
+TIME_POINT = re.compile(
+    rf"(?:\b(?P<qualifier>around|about|approximately|roughly|near|after|since|before|until|by)\s+)?{_time('t')}",
+    re.IGNORECASE
+)
+# "12:30 pm", "9am", "10 o'clock": a time of day, not a position in the video
+TIME_OF_DAY = re.compile(r"\s*(?:[ap]\.?m\b\.?|o['’]?clock\b)", re.IGNORECASE)
+# How far either side of "around 02:13" a question looks
+AROUND_SECONDS = 5.0
+LOOKUP_QUESTION = re.compile(r"^\s*(who|what)\b", re.IGNORECASE)
+
+
+def _unit_seconds(unit):
+    return UNIT_SECONDS[unit[0].lower()] if unit else None
+
+
+def _seconds_of(match, name, shared_unit=None):
+    """Seconds of a _time(name) group, or None if it is a bare number with no unit, or a decade."""
+    clock = match.group(f"{name}_clock")
+    if clock:
+        seconds = 0.0
+        for part in clock.split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    number, unit = match.group(name), match.group(f"{name}_unit")
+    if unit and unit.lower() == "s" and not match.group(f"{name}_space") and DECADE.match(number):
+        return None
+    scale = _unit_seconds(unit) or shared_unit
+    return float(number) * scale if scale else None
+
+
+def parse_time_range(text, duration=None):
+    """Find the time or time range a question is about. Returns (start, end, exact) in seconds, or None.
+
+    Ranges ("between 10 and 20 seconds", "1:00-1:30", "the first 30 seconds") and instants
+    ("at 02:13", "133s") are exact. Times qualified by around/after/before are not. "the last
+    N seconds" needs the video's duration and gives None without it.
+
+    Times of day ("at 12:30 pm") are not offsets into the video and are skipped. With a duration,
+    a time past the end of the video is taken for a time of day too ("at 14:05" in a 4 minute
+    clip), and gives None.
+    """
+    time_range = _parse_time_range(text, duration)
+    if time_range is not None and duration is not None and time_range[0] > duration:
+        return None
+    return time_range
+
+
+def _time_of_day(text, match):
+    return TIME_OF_DAY.match(text, match.end()) is not None
+
+
+def _parse_time_range(text, duration):
+    # Spans of "from 9:00 to 9:30 am", whose times are not looked at again as instants
+    times_of_day = []
+    for match in TIME_RANGE.finditer(text):
+        if _time_of_day(text, match):
+            times_of_day.append(match.span())
+            continue
+        first, second = ("a", "b") if match.group("a") or match.group("a_clock") else ("c", "d")
+        shared = _unit_seconds(match.group(f"{second}_unit")) or _unit_seconds(match.group(f"{first}_unit"))
+        start, end = _seconds_of(match, first, shared), _seconds_of(match, second, shared)
+        if start is not None and end is not None:
+            return min(start, end), max(start, end), True
+
+    match = RELATIVE_RANGE.search(text)
+    if match:
+        length = float(match.group("n") or 1) * _unit_seconds(match.group("unit"))
+        if match.group("which").lower() in ("first", "opening"):
+            return 0.0, length, True
+        if duration is None:
+            return None
+        return max(0.0, duration - length), duration, True
+
+    points = []
+    for match in TIME_POINT.finditer(text):
+        if _time_of_day(text, match) or any(start <= match.start() < end for start, end in times_of_day):
+            continue
+        seconds = _seconds_of(match, "t")
+        if seconds is not None:
+            points.append(((match.group("qualifier") or "").lower(), seconds))
+    if not points:
+        return None
+    if len(points) > 1:
+        # "at 00:10 and at 00:50": the span between the first two times mentioned
+        times = [seconds for _, seconds in points[:2]]
+        return min(times), max(times), False
+    qualifier, seconds = points[0]
+    if qualifier in ("around", "about", "approximately", "roughly", "near"):
+        return max(0.0, seconds - AROUND_SECONDS), seconds + AROUND_SECONDS, False
+    if qualifier in ("after", "since"):
+        return seconds, duration if duration is not None else float("inf"), False
+    if qualifier in ("before", "until", "by"):
+        return 0.0, seconds, False
+    return seconds, seconds, True
+
+
+def format_timestamp(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes):02d}:{seconds:05.2f}"
+
+
+def describe_annotations(rows, start, end):
+    """Readable summary of the annotations found in a time window."""
+    if start == end:
+        header = f"At {format_timestamp(start)}:"
+    else:
+        header = f"Between {format_timestamp(start)} and {format_timestamp(end)}:"
+    by_kind = {}
+    for row in rows:
+        by_kind.setdefault(row["kind"], []).append(row)
+
+    lines = [header]
+    if by_kind.get("person"):
+        lines.append(f"- People in frame: {len(by_kind['person'])}")
+    if by_kind.get("face"):
+        lines.append(f"- Faces detected: {len(by_kind['face'])}")
+    for kind, title in (("object", "Objects"), ("label", "Labels")):
+        counts = {}
+        for row in by_kind.get(kind, ()):
+            counts[row["name"]] = counts.get(row["name"], 0) + 1
+        if counts:
+            names = ", ".join(f"{name} (x{count})" if count > 1 else name for name, count in sorted(counts.items()))
+            lines.append(f"- {title}: {names}")
+    if by_kind.get("shot"):
+        lines.append(f"- Shots: {', '.join(row['name'] for row in by_kind['shot'])}")
+    if by_kind.get("word"):
+        lines.append(f"- Speech: {' '.join(row['name'] for row in by_kind['word'])}")
+    if len(lines) == 1:
+        lines.append("- Nothing was detected in this part of the video.")
+    return "\n".join(lines)
+
+
+class AnnotationStore:
+    """Per-video VideoAnnotations persisted as one compact file each, with a small in-memory LRU.
+
+    Writers to the same video are serialized by update(), so concurrent fetches of different
+    sections each merge into what the other stored rather than overwriting it.
+    """
+
+    def __init__(self, root=None, max_cached=None):
+        self.root = root or os.getenv('ANNOTATION_STORE_PATH', './annotations')
+        self.max_cached = max_cached or int(os.getenv('ANNOTATION_STORE_CACHE', '64'))
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.video_locks = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, video_id):
+        return os.path.join(self.root, f"{video_id}.ann")
+
+    def _video_lock(self, video_id):
+        with self.lock:
+            return self.video_locks.setdefault(video_id, threading.Lock())
+
+    def save(self, video_id, annotations):
+        with self._video_lock(video_id):
+            self._write(video_id, annotations)
+
+    def _write(self, video_id, annotations):
+        path = self._path(video_id)
+        # A temporary file of its own, so two writers never interleave in one
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=f"{video_id}.", suffix=".tmp")
+        try:
+            with io.open(fd, "wb") as file:
+                file.write(annotations.to_bytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._remember(video_id, annotations)
+
+    def update(self, video_id, fn):
+        """Replace a video's annotations with fn(current), where current is None if none are stored.
+
+        The read, fn and the write happen under the video's lock. Returns what fn returned.
+        """
+        with self._video_lock(video_id):
+            annotations = fn(self._load(video_id))
+            self._write(video_id, annotations)
+            return annotations
+
+    def get(self, video_id):
+        """Return the VideoAnnotations for video_id, or None if none were stored."""
+        with self.lock:
+            annotations = self.cache.get(video_id)
+            if annotations is not None:
+                self.cache.move_to_end(video_id)
+                return annotations
+        annotations = self._load(video_id)
+        if annotations is not None:
+            self._remember(video_id, annotations, replace=False)
+        return annotations
+
+    def _load(self, video_id):
+        path = self._path(video_id)
+        if not os.path.exists(path):
+            return None
+        with io.open(path, "rb") as file:
+            return VideoAnnotations.from_bytes(file.read())
+
+    def _remember(self, video_id, annotations, replace=True):
+        with self.lock:
+            if replace or video_id not in self.cache:
+                # A read that raced a write must not put the older annotations back
+                self.cache[video_id] = annotations
+            self.cache.move_to_end(video_id)
+            while len(self.cache) > self.max_cached:
+                self.cache.popitem(last=False)
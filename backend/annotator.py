@@ -0,0 +1,101 @@
+import logging
+from datetime import timedelta
+
+from google.cloud import videointelligence_v1 as videointelligence
+
+from clients import VIDEO_OPERATION_TIMEOUT, get_video_client
+from scheduler import scheduler
+from ingest import annotation_input
+from profiles import result_sections
+
+logger = logging.getLogger(__name__)
+
+
+def features_for(section_names):
+    return [videointelligence.Feature[name] for name in section_names]
+
+
+def video_context(section_names, active_segments=None):
+    """VideoContext with the settings of the requested sections, limited to active_segments if given."""
+    settings = {}
+    if "FACE_DETECTION" in section_names:
+        settings["face_detection_config"] = videointelligence.FaceDetectionConfig(
+            include_bounding_boxes=True,
+            include_attributes=True
+        )
+    if "PERSON_DETECTION" in section_names:
+        settings["person_detection_config"] = videointelligence.PersonDetectionConfig(
+            include_bounding_boxes=True,
+            include_attributes=True,
+            include_pose_landmarks=True
+        )
+    if "SPEECH_TRANSCRIPTION" in section_names:
+        settings["speech_transcription_config"] = videointelligence.SpeechTranscriptionConfig(
+            language_code="en-US",
+            enable_automatic_punctuation=True
+        )
+    if active_segments:
+        # The annotator reports offsets on the original timeline, so nothing needs remapping
+        settings["segments"] = [
+            videointelligence.VideoSegment(
+                start_time_offset=timedelta(seconds=start), end_time_offset=timedelta(seconds=end)
+            )
+            for start, end in active_segments
+        ]
+    return videointelligence.VideoContext(**settings)
+
+
+def annotate_results(section_names, video_path=None, store=None, source_uri=None, source_store=None,
+                     active_segments=None):
+    """Annotate the requested sections of a video. Returns its VideoAnnotationResults.
+
+    The video is read from source_uri in source_store if given, otherwise from video_path (through
+    store, like annotation_input). active_segments == [] means nothing moves, so no call is made.
+    Only gs:// input keeps memory constant: with any other store the whole video is sent inline
+    and held until the operation finishes.
+    """
+    if active_segments == []:
+        logger.info("No motion detected, skipping remote annotation")
+        return videointelligence.VideoAnnotationResults()
+
+    stored_uri = None
+    if source_uri is not None and source_store.scheme == 'gs':
+        video_input = {"input_uri": source_uri}
+    elif source_uri is not None:
+        with source_store.open(source_uri) as file:
+            video_input = {"input_content": file.read()}
+    else:
+        video_input, stored_uri = annotation_input(video_path, store)
+
+    request = {
+        "features": features_for(section_names),
+        **video_input,
+        "video_context": video_context(section_names, active_segments),
+    }
+
+    def annotate():
+        operation = get_video_client().annotate_video(request=request)
+        logger.info(f"Waiting for annotation of {', '.join(section_names)}...")
+        return operation.result(timeout=VIDEO_OPERATION_TIMEOUT)
+
+    try:
+        # The in-flight cap covers the whole operation, not just its submission
+        result = scheduler.call('video_intelligence', annotate)
+    finally:
+        if stored_uri:
+            store.delete(stored_uri)
+    return result.annotation_results[0]
+
+
+def annotate_sections(section_names, *args, **kwargs):
+    """Like annotate_results, but returns [(section_name, data)]."""
+    return result_sections(annotate_results(section_names, *args, **kwargs), section_names)
+
+
+def dump_results(results):
+    """Serialize a VideoAnnotationResults, e.g. for the job journal."""
+    return videointelligence.VideoAnnotationResults.serialize(results)
+
+
+def load_results(data):
+    return videointelligence.VideoAnnotationResults.deserialize(data)
@@ -0,0 +1,178 @@
+"""Micro-benchmark: section formatters on synthetic annotation payloads.
+
+Compares the old `result += ...` formatters with the generator-based ones in formatters.py,
+both joined into a string (format_section) and streamed into a sink (write_section), reporting
+wall time and peak allocated memory for each section.
+
+CPython resizes a concatenated string in place when nothing else references it, so the old
+formatters are close to linear there; they go quadratic on other interpreters or as soon as a
+reference to the partial result is held. Streaming is where the memory win is: the text is
+never materialized.
+
+    python bench_formatters.py [--words 200000] [--tracks 20000] [--repeat 3]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+from types import SimpleNamespace
+
+from formatters import format_section, write_section
+
+
+def _segment(start, end):
+    return SimpleNamespace(start_time_offset=timedelta(seconds=start), end_time_offset=timedelta(seconds=end))
+
+
+def synthetic_sections(words, tracks, labels=500, duration=3600.0, seed=0):
+    """Annotation-shaped objects with the attributes the formatters read."""
+    rng = random.Random(seed)
+
+    def track():
+        start = rng.uniform(0, duration)
+        return SimpleNamespace(
+            confidence=rng.random(),
+            segment=_segment(start, start + rng.uniform(0.5, 30)),
+            timestamped_objects=[SimpleNamespace(attributes=[
+                SimpleNamespace(name=f"attribute_{i}", confidence=rng.random()) for i in range(4)
+            ])],
+        )
+
+    word_infos = [
+        SimpleNamespace(word=rng.choice(["someone", "is", "at", "the", "door", "hello"]),
+                        start_time=timedelta(seconds=i * duration / words),
+                        end_time=timedelta(seconds=i * duration / words + 0.3))
+        for i in range(words)
+    ]
+    return [
+        ("LABEL_DETECTION", [
+            SimpleNamespace(entity=SimpleNamespace(description=f"label_{i}"),
+                            segments=[SimpleNamespace(segment=_segment(0, duration), confidence=rng.random())])
+            for i in range(labels)
+        ]),
+        ("FACE_DETECTION", [SimpleNamespace(tracks=[track()]) for _ in range(tracks)]),
+        ("PERSON_DETECTION", [SimpleNamespace(tracks=[track()]) for _ in range(tracks)]),
+        ("SHOT_CHANGE_DETECTION", [_segment(i, i + 1) for i in range(int(duration))]),
+        ("OBJECT_TRACKING", [
+            SimpleNamespace(entity=SimpleNamespace(description="person"), segment=_segment(i, i + 5), confidence=0.9)
+            for i in range(tracks)
+        ]),
+        ("SPEECH_TRANSCRIPTION", [SimpleNamespace(alternatives=[SimpleNamespace(
+            transcript=" ".join(w.word for w in word_infos), confidence=0.9, words=word_infos
+        )])]),
+    ]
+
+
+# The formatters as they were before formatters.py, kept here as the baseline
+def legacy_tracks(title, annotations):
+    result = f"{title} DETECTION:\n"
+    for annotation in annotations:
+        for track in annotation.tracks:
+            result += f"{title.capitalize()} detected with confidence: {track.confidence:.2f}\n"
+            start_time = track.segment.start_time_offset.total_seconds()
+            end_time = track.segment.end_time_offset.total_seconds()
+            result += f"  Tracked from {start_time:.2f}s to {end_time:.2f}s\n"
+            for attribute in track.timestamped_objects[0].attributes:
+                result += f"    Attribute: {attribute.name} (Confidence: {attribute.confidence:.2f})\n"
+    return result
+
+
+def legacy_section(section_name, section_data):
+    if section_name == "LABEL_DETECTION":
+        result = "LABEL DETECTION:\n"
+        for label in section_data:
+            result += f"Label: {label.entity.description}\n"
+            for segment in label.segments:
+                start_time = segment.segment.start_time_offset.total_seconds()
+                end_time = segment.segment.end_time_offset.total_seconds()
+                result += f"  Segment: {start_time:.2f}s to {end_time:.2f}s (Confidence: {segment.confidence:.2f})\n"
+        return result
+    if section_name == "FACE_DETECTION":
+        return legacy_tracks("FACE", section_data)
+    if section_name == "PERSON_DETECTION":
+        return legacy_tracks("PERSON", section_data)
+    if section_name == "SHOT_CHANGE_DETECTION":
+        result = "SHOT CHANGE DETECTION:\n"
+        for i, shot in enumerate(section_data):
+            start_time = shot.start_time_offset.total_seconds()
+            end_time = shot.end_time_offset.total_seconds()
+            result += f"  Shot {i + 1}: {start_time:.2f}s to {end_time:.2f}s\n"
+        return result
+    if section_name == "OBJECT_TRACKING":
+        result = "OBJECT TRACKING:\n"
+        for obj in section_data:
+            result += f"Tracked object: {obj.entity.description}\n"
+            start_time = obj.segment.start_time_offset.total_seconds()
+            end_time = obj.segment.end_time_offset.total_seconds()
+            result += f"  Tracked from {start_time:.2f}s to {end_time:.2f}s\n"
+            result += f"  Confidence: {obj.confidence:.2f}\n"
+        return result
+    result = "SPEECH TRANSCRIPTION:\n"
+    for speech_transcription in section_data:
+        for alternative in speech_transcription.alternatives:
+            result += f"Transcript: {alternative.transcript}\n"
+            result += f"Confidence: {alternative.confidence:.2f}\n"
+            result += "Word level information:\n"
+            for word_info in alternative.words:
+                start_time = word_info.start_time.total_seconds()
+                end_time = word_info.end_time.total_seconds()
+                result += f"  {start_time:.2f}s - {end_time:.2f}s: {word_info.word}\n"
+    return result
+
+
+class CountingSink:
+    """Stands in for a file or socket; keeps only the byte count."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+
+def stream_section(section_name, section_data):
+    sink = CountingSink()
+    write_section(section_name, section_data, sink)
+    return sink.size
+
+
+def measure(fn, section_name, section_data, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = fn(section_name, section_data)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(section_name, section_data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return output, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words', type=int, default=200000)
+    parser.add_argument('--tracks', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    sections = synthetic_sections(args.words, args.tracks)
+    print(f"{'section':<24}{'MB out':>8}{'legacy s':>10}{'joined s':>10}{'stream s':>10}"
+          f"{'legacy MB':>11}{'joined MB':>11}{'stream MB':>11}")
+    for section_name, section_data in sections:
+        old_text, old_time, old_peak = measure(legacy_section, section_name, section_data, args.repeat)
+        new_text, new_time, new_peak = measure(format_section, section_name, section_data, args.repeat)
+        size, stream_time, stream_peak = measure(stream_section, section_name, section_data, args.repeat)
+        assert old_text == new_text, f"{section_name} output differs"
+        assert size == len(old_text), f"{section_name} streamed size differs"
+        print(f"{section_name:<24}{len(old_text) / 1e6:>8.1f}{old_time:>10.3f}{new_time:>10.3f}{stream_time:>10.3f}"
+              f"{old_peak / 1e6:>11.1f}{new_peak / 1e6:>11.1f}{stream_peak / 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os
+import math
+
+from retrieval import section_id
+from annotation_store import extract_annotations
+from compaction import compact_text
+
+WINDOW_SECONDS = float(os.getenv('CHUNK_WINDOW_SECONDS', '30'))
+OVERLAP_SECONDS = float(os.getenv('CHUNK_OVERLAP_SECONDS', '5'))
+
+WINDOW_KIND = "window"
+
+
+def window_entries(entries, window=WINDOW_SECONDS, overlap=OVERLAP_SECONDS):
+    """Group (start, end, text) entries into overlapping time windows.
+
+    An entry goes into every window its [start, end] overlaps, so a label seen from 10s to 200s
+    is in each window of that span. Yields (window_start, window_end, entries) for every
+    non-empty window, with entries in start order.
+    """
+    entries = sorted(entries, key=lambda entry: entry[0])
+    if not entries:
+        return
+    step = max(window - overlap, 1e-3)
+
+    def first_window(t):
+        # Start of the earliest window on the step grid that contains t
+        return max(0.0, (math.floor((t - window) / step) + 1) * step)
+
+    following = 0
+    # Entries that started before the current window ends and may still overlap it
+    active = []
+    window_start = first_window(entries[0][0])
+    while following < len(entries) or active:
+        if not active and entries[following][0] >= window_start + window:
+            # Jump over stretches with nothing in them
+            window_start = first_window(entries[following][0])
+        window_end = window_start + window
+        while following < len(entries) and entries[following][0] < window_end:
+            active.append(entries[following])
+            following += 1
+        # An entry that ended before this window cannot overlap a later one either
+        active = [entry for entry in active if entry[1] > window_start or entry[0] >= window_start]
+        if active:
+            yield window_start, window_end, list(active)
+        window_start += step
+
+
+def chunk_section(video_id, section_name, section_data, metadata=None, window=WINDOW_SECONDS, overlap=OVERLAP_SECONDS):
+    """Split one section into time-window documents. Returns a list of (id, document, metadata).
+
+    Each window's annotations are compacted (see compaction.py) before they become a document.
+    """
+    entries = [(row[2], row[3], row) for row in extract_annotations([(section_name, section_data)])]
+    chunks = []
+    for i, (start, end, items) in enumerate(window_entries(entries, window, overlap)):
+        body = compact_text([row for _, _, row in items])
+        document = f"{section_name.replace('_', ' ')} {start:.2f}s to {end:.2f}s:\n{body}"
+        chunks.append((
+            section_id(video_id, f"{section_name}_w{i}"),
+            document,
+            {**(metadata or {}), "video_id": video_id, "section": section_name,
+             "kind": WINDOW_KIND, "start": start, "end": end},
+        ))
+    return chunks
+
+
+def chunk_sections(video_id, sections, metadata=None):
+    """Time-window documents for every (section_name, section_data) pair."""
+    chunks = []
+    for section_name, section_data in sections:
+        chunks.extend(chunk_section(video_id, section_name, section_data, metadata))
+    return chunks
@@ -0,0 +1,134 @@
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+GROQ_POOL_SIZE = int(os.getenv('GROQ_POOL_SIZE', '20'))
+GROQ_TIMEOUT = float(os.getenv('GROQ_TIMEOUT', '120'))
+# Retries and backoff are handled by the call scheduler, so the SDK's own are off by default
+GROQ_MAX_RETRIES = int(os.getenv('GROQ_MAX_RETRIES', '0'))
+# Seconds to wait for a Video Intelligence annotation operation
+VIDEO_OPERATION_TIMEOUT = float(os.getenv('VIDEO_OPERATION_TIMEOUT', '1200'))
+
+
+class ClientRegistry:
+    """Creates each remote API client once per process and hands out the shared instance.
+
+    The clients are thread-safe and keep their connections open, so requests reuse pooled
+    TLS connections instead of building a client (and handshaking) every time. Tests can
+    override a client with a stub, or point a factory at a local server through the env.
+    """
+
+    def __init__(self):
+        self.factories = {}
+        self.health_checks = {}
+        self.instances = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, factory, health_check=None):
+        self.factories[name] = factory
+        if health_check is not None:
+            self.health_checks[name] = health_check
+
+    def get(self, name):
+        instance = self.instances.get(name)
+        if instance is not None:
+            return instance
+        with self.lock:
+            instance = self.instances.get(name)
+            if instance is None:
+                instance = self.factories[name]()
+                self.instances[name] = instance
+                logger.info(f"Created {name} client")
+            return instance
+
+    def override(self, name, instance):
+        """Replace a client, e.g. with a stub in tests."""
+        with self.lock:
+            self.instances[name] = instance
+
+    def reset(self, name=None):
+        with self.lock:
+            if name is None:
+                self.instances.clear()
+            else:
+                self.instances.pop(name, None)
+
+    def health(self, names=None):
+        """Run the health checks for names (default: every client). Returns {name: {'ok': bool, 'error': str or None}}."""
+        report = {}
+        for name in names or self.factories:
+            try:
+                client = self.get(name)
+                check = self.health_checks.get(name)
+                if check is not None:
+                    check(client)
+                report[name] = {'ok': True, 'error': None}
+            except Exception as e:
+                report[name] = {'ok': False, 'error': str(e)}
+        return report
+
+
+def _groq_factory():
+    import httpx
+    from groq import Groq
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=GROQ_POOL_SIZE, max_keepalive_connections=GROQ_POOL_SIZE),
+        timeout=httpx.Timeout(GROQ_TIMEOUT),
+    )
+    return Groq(
+        api_key=os.environ['GROQ_API_KEY'],
+        base_url=os.getenv('GROQ_BASE_URL') or None,
+        max_retries=GROQ_MAX_RETRIES,
+        timeout=GROQ_TIMEOUT,
+        http_client=http_client,
+    )
+
+
+def _video_factory():
+    from google.cloud import videointelligence_v1 as videointelligence
+
+    endpoint = os.getenv('VIDEO_INTELLIGENCE_ENDPOINT')
+    if endpoint and os.getenv('VIDEO_INTELLIGENCE_INSECURE'):
+        # Plain-text gRPC to a local stub server
+        import grpc
+        from google.auth.credentials import AnonymousCredentials
+        from google.cloud.videointelligence_v1.services.video_intelligence_service.transports import (
+            VideoIntelligenceServiceGrpcTransport,
+        )
+        transport = VideoIntelligenceServiceGrpcTransport(
+            channel=grpc.insecure_channel(endpoint), credentials=AnonymousCredentials()
+        )
+        return videointelligence.VideoIntelligenceServiceClient(transport=transport)
+    client_options = {"api_endpoint": endpoint} if endpoint else None
+    return videointelligence.VideoIntelligenceServiceClient(client_options=client_options)
+
+
+def _storage_factory():
+    from google.cloud import storage
+
+    return storage.Client()
+
+
+def _groq_health(client):
+    client.models.list()
+
+
+registry = ClientRegistry()
+registry.register('groq', _groq_factory, _groq_health)
+registry.register('video_intelligence', _video_factory)
+registry.register('storage', _storage_factory)
+
+
+def get_groq_client():
+    return registry.get('groq')
+
+
+def get_video_client():
+    return registry.get('video_intelligence')
+
+
+def get_storage_client():
+    return registry.get('storage')
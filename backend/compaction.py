@@ -0,0 +1,128 @@
+"""Compact rendering of annotations for LLM prompts.
+
+The section formatters keep every detection; prompts do not need that. Here detections below a
+confidence threshold are dropped, the segments of one entity that touch or overlap are merged
+into a single list of spans, and word-level speech timings are collapsed into sentences.
+Works on the (kind, name, start, end, confidence) rows of annotation_store.
+"""
+import os
+import re
+
+from annotation_store import KINDS
+
+MIN_CONFIDENCE = float(os.getenv('COMPACT_MIN_CONFIDENCE', '0.5'))
+# Segments of one entity closer than this many seconds are merged
+MERGE_GAP = float(os.getenv('COMPACT_MERGE_GAP', '1.0'))
+# A pause this long in speech ends a sentence even without punctuation
+SENTENCE_PAUSE = float(os.getenv('COMPACT_SENTENCE_PAUSE', '1.5'))
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*$")
+
+KIND_SECTIONS = {
+    "label": "LABEL_DETECTION",
+    "face": "FACE_DETECTION",
+    "person": "PERSON_DETECTION",
+    "shot": "SHOT_CHANGE_DETECTION",
+    "object": "OBJECT_TRACKING",
+    "word": "SPEECH_TRANSCRIPTION",
+}
+TITLES = {"label": "Label", "face": "Face", "person": "Person", "object": "Object"}
+
+
+def merge_intervals(intervals, gap=MERGE_GAP):
+    """Merge (start, end, confidence) intervals that overlap or lie within gap seconds of each other."""
+    merged = []
+    for start, end, confidence in sorted(intervals):
+        if merged and start - merged[-1][1] <= gap:
+            last = merged[-1]
+            merged[-1] = (last[0], max(last[1], end), max(last[2], confidence))
+        else:
+            merged.append((start, end, confidence))
+    return merged
+
+
+def _spans(intervals):
+    return ", ".join(f"{start:.1f}-{end:.1f}s" for start, end, _ in intervals)
+
+
+def _sentences(words, pause=SENTENCE_PAUSE):
+    """Group (start, end, word) into (start, end, sentence) at sentence punctuation or long pauses."""
+    sentence = []
+    for start, end, word in sorted(words):
+        if sentence and start - sentence[-1][1] > pause:
+            yield sentence[0][0], sentence[-1][1], " ".join(item[2] for item in sentence)
+            sentence = []
+        sentence.append((start, end, word))
+        if SENTENCE_END.search(word):
+            yield sentence[0][0], sentence[-1][1], " ".join(item[2] for item in sentence)
+            sentence = []
+    if sentence:
+        yield sentence[0][0], sentence[-1][1], " ".join(item[2] for item in sentence)
+
+
+def compact_entries(rows, min_confidence=MIN_CONFIDENCE, merge_gap=MERGE_GAP):
+    """Compact annotation rows into (kind, start, end, text) entries, ordered by kind then time."""
+    by_entity = {}
+    words = []
+    shots = []
+    for kind, name, start, end, confidence in rows:
+        if kind == "word":
+            words.append((start, end, name))
+        elif kind == "shot":
+            shots.append(start)
+        elif confidence >= min_confidence:
+            by_entity.setdefault((kind, name), []).append((start, end, confidence))
+
+    entries = []
+    for (kind, name), intervals in by_entity.items():
+        merged = merge_intervals(intervals, merge_gap)
+        # Tracks without attributes are named after their kind
+        subject = TITLES[kind] if name == kind else f"{TITLES[kind]}: {name}"
+        entries.append((
+            kind, merged[0][0], merged[-1][1],
+            f"{subject} at {_spans(merged)} ({len(intervals)}x, max confidence {max(c for _, _, c in merged):.2f})"
+        ))
+    if shots:
+        shots.sort()
+        entries.append(("shot", shots[0], shots[-1],
+                        f"{len(shots)} shots, cuts at {', '.join(f'{start:.1f}' for start in shots[1:]) or 'none'}"))
+    for start, end, sentence in _sentences(words):
+        entries.append(("word", start, end, f"[{start:.1f}-{end:.1f}s] {sentence}"))
+
+    order = {kind: i for i, kind in enumerate(KINDS)}
+    entries.sort(key=lambda entry: (order[entry[0]], entry[1]))
+    return entries
+
+
+def compact_text(rows, **options):
+    """Compacted text of rows as one block, e.g. for a time window."""
+    return "\n".join(text for _, _, _, text in compact_entries(rows, **options))
+
+
+def compact_sections(rows, **options):
+    """{section_name: compacted text} for every section that has rows."""
+    lines = {}
+    for kind, _, _, text in compact_entries(rows, **options):
+        lines.setdefault(KIND_SECTIONS[kind], []).append(text)
+    return {
+        section_name: f"{section_name.replace('_', ' ')}:\n" + "\n".join(section_lines)
+        for section_name, section_lines in lines.items()
+    }
+
+
+def compression_report(section_texts, compacted):
+    """Per section: formatter output size, compacted size and their ratio."""
+    report = {}
+    for section_name, text in section_texts.items():
+        compact = compacted.get(section_name, "")
+        report[section_name] = {
+            'original_chars': len(text),
+            'compact_chars': len(compact),
+            'ratio': round(len(text) / len(compact), 2) if compact else None,
+        }
+    return report
+
+
+def report_lines(report):
+    for section_name, stats in report.items():
+        ratio = f"{stats['ratio']}x smaller" if stats['ratio'] else "nothing left"
+        yield f"{section_name}: {stats['original_chars']} -> {stats['compact_chars']} chars ({ratio})"
@@ -0,0 +1,190 @@
+"""Embedding function for the video_analysis collection and the response cache.
+
+Text is embedded by a local CPU model (EMBEDDING_BACKEND):
+- "onnx" (default) is all-MiniLM-L6-v2 on ONNX Runtime. It is the model behind Chroma's default
+  embedding function, so collections indexed before keep working.
+- "sentence-transformers" runs EMBEDDING_MODEL with sentence-transformers on the CPU.
+
+Every vector is cached by a hash of the model and the text. The cache is a SQLite file shared by
+the workers, with a small in-memory LRU in front of it. Documents re-indexed unchanged, and
+questions asked before, are not embedded again. Misses go to the model in batches of
+EMBEDDING_BATCH_SIZE. The model is loaded once per process by get_embedding_function().warm_up().
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+import numpy as np
+from chromadb import EmbeddingFunction
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.getenv('EMBEDDING_BACKEND', 'onnx')
+MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+
+
+def onnx_backend():
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+    return ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+
+
+def sentence_transformers_backend():
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(MODEL, device="cpu")
+
+    def embed(texts):
+        return model.encode(list(texts), batch_size=BATCH_SIZE, normalize_embeddings=True)
+
+    return embed
+
+
+# Backend -> (model name that cache keys are derived from, loader)
+BACKENDS = {
+    "onnx": ("onnx/all-MiniLM-L6-v2", onnx_backend),
+    "sentence-transformers": (f"sentence-transformers/{MODEL}", sentence_transformers_backend),
+}
+
+
+class EmbeddingCache:
+    """Vectors keyed by a hash of model and text, in SQLite, evicted least recently used first."""
+
+    def __init__(self, path=None, max_entries=None, max_cached=None):
+        self.path = path or os.getenv('EMBEDDING_CACHE_PATH', './embedding_cache.db')
+        self.max_entries = max_entries or int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '500000'))
+        self.max_cached = max_cached or int(os.getenv('EMBEDDING_CACHE_MEMORY', '10000'))
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed_at ON embeddings (accessed_at)")
+            # Approximate row count; eviction runs once it is a tenth over max_entries
+            self.count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, keys):
+        """{key: vector} for the keys that are cached."""
+        found = {}
+        with self.lock:
+            for key in keys:
+                vector = self.memory.get(key)
+                if vector is not None:
+                    self.memory.move_to_end(key)
+                    found[key] = vector
+        missing = [key for key in keys if key not in found]
+        if not missing:
+            return found
+
+        with self.lock, self._connect() as conn:
+            # Stay under SQLite's limit on query parameters
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+                conn.executemany("UPDATE embeddings SET accessed_at = ? WHERE key = ?",
+                                 [(time.time(), key) for key, _ in rows])
+            self._remember(found)
+        return found
+
+    def put_many(self, vectors):
+        with self.lock, self._connect() as conn:
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, accessed_at) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in vectors.items()]
+            )
+            self.count += len(vectors)
+            if self.count > self.max_entries * 1.1:
+                # Evict in bulk rather than on every write; other workers' rows are counted here too
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                self.count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._remember(vectors)
+
+    def _remember(self, vectors):
+        for key, vector in vectors.items():
+            self.memory[key] = np.asarray(vector, dtype=np.float32)
+            self.memory.move_to_end(key)
+        while len(self.memory) > self.max_cached:
+            self.memory.popitem(last=False)
+
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """Chroma embedding function that embeds each distinct text at most once, across restarts."""
+
+    def __init__(self, backend=None, cache=None, batch_size=None):
+        self.backend_name = backend or BACKEND
+        if self.backend_name not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend '{self.backend_name}'. Expected one of: {', '.join(BACKENDS)}")
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batch_size = batch_size or BATCH_SIZE
+        self.model_name, self.loader = BACKENDS[self.backend_name]
+        self.model = None
+        self.load_lock = threading.Lock()
+
+    def _model(self):
+        with self.load_lock:
+            if self.model is None:
+                started = time.time()
+                self.model = self.loader()
+                # The first call loads the weights and builds the session
+                self.model(["warm up"])
+                logger.info(f"Loaded embedding model {self.model_name} in {time.time() - started:.1f}s")
+            return self.model
+
+    def warm_up(self):
+        """Load the model now rather than on the first query."""
+        self._model()
+        return self
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def __call__(self, input):
+        keys = [self.key(text) for text in input]
+        vectors = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # Each distinct uncached text is embedded once; the model is only needed for those
+        missing = {key: text for key, text in zip(keys, input) if key not in vectors}
+        new_vectors = {}
+        missing_keys = list(missing)
+        model = self._model() if missing_keys else None
+        for i in range(0, len(missing_keys), self.batch_size):
+            batch = missing_keys[i:i + self.batch_size]
+            for key, vector in zip(batch, model([missing[key] for key in batch])):
+                new_vectors[key] = np.asarray(vector, dtype=np.float32)
+        if new_vectors:
+            self.cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+        return [vectors[key].tolist() for key in keys]
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_embedding_function():
+    """The process-wide CachedEmbeddingFunction. Call warm_up() on it at startup."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = CachedEmbeddingFunction()
+        return _default
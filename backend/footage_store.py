@@ -0,0 +1,346 @@
+"""Footage records in DynamoDB, one item per upload.
+
+Table layout (FOOTAGE_TABLE, default "footage"), partitioned by user:
+
+    email (partition key)  sk (sort key)                            attributes
+    user@example.com       FOOTAGE#<upload_date>#<footage_id>       footage_id, label, name, upload_date, video_id, preview
+    user@example.com       ANALYSIS#<footage_id>                    analysis
+    user@example.com       VERSION                                  version
+
+Listing is a Query on the FOOTAGE# prefix, newest first, so it reads one page of small items
+and never the analysis bodies. An analysis is fetched on its own when it is needed. The version
+counter goes up with every change to the user's footage, so listings can be revalidated by it
+without running the Query.
+"""
+import os
+import json
+import base64
+import hashlib
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import Future
+
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+from ids import ulid
+
+logger = logging.getLogger(__name__)
+
+FOOTAGE_PREFIX = "FOOTAGE#"
+ANALYSIS_PREFIX = "ANALYSIS#"
+VERSION_KEY = "VERSION"
+PAGE_SIZE = int(os.getenv('FOOTAGE_PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = 200
+# Characters of the analysis kept on the listed item for the dashboard preview
+PREVIEW_CHARS = int(os.getenv('FOOTAGE_PREVIEW_CHARS', '200'))
+LIST_FIELDS = ("footage_id", "label", "name", "upload_date", "video_id", "preview")
+# Records written by the analyze pipeline are collected for this long, or up to this many, per batch
+WRITE_INTERVAL = float(os.getenv('FOOTAGE_WRITE_INTERVAL', '0.2'))
+WRITE_BATCH = int(os.getenv('FOOTAGE_WRITE_BATCH', '25'))
+
+deserializer = TypeDeserializer()
+
+
+class UserNotFoundError(Exception):
+    """Raised when footage is added for an email that has no user record."""
+
+
+def untyped(item):
+    """An item from the low-level attribute value format, e.g. the Item of a ConditionalCheckFailed error.
+
+    Calls made through a table's meta.client need no conversion: the resource layer converts
+    their parameters and responses.
+    """
+    return {key: deserializer.deserialize(value) for key, value in item.items()}
+
+
+def encode_cursor(last_key):
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key, sort_keys=True).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """The ExclusiveStartKey of a cursor from encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        last_key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(last_key, dict) or set(last_key) != {"email", "sk"}:
+        raise ValueError("Invalid cursor")
+    return last_key
+
+
+def ensure_table(dynamodb, name):
+    """Create the footage table if it does not exist, e.g. on a local DynamoDB endpoint."""
+    existing = [table.name for table in dynamodb.tables.all()]
+    if name not in existing:
+        logger.info(f"Creating DynamoDB table {name}")
+        dynamodb.create_table(
+            TableName=name,
+            KeySchema=[
+                {'AttributeName': 'email', 'KeyType': 'HASH'},
+                {'AttributeName': 'sk', 'KeyType': 'RANGE'},
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'email', 'AttributeType': 'S'},
+                {'AttributeName': 'sk', 'AttributeType': 'S'},
+            ],
+            BillingMode='PAY_PER_REQUEST',
+        ).wait_until_exists()
+    return dynamodb.Table(name)
+
+
+class FootageStore:
+    """A user's footage as separate DynamoDB items, with analysis bodies stored out of line.
+
+    With users_table, add() only writes footage for emails that have a user record.
+    """
+
+    def __init__(self, table, users_table=None):
+        self.table = table
+        self.users_table = users_table
+
+    def _items(self, email, footage_id, label, name, upload_date, analysis, video_id):
+        record = {
+            'footage_id': footage_id,
+            'label': label,
+            'name': name,
+            'upload_date': upload_date,
+        }
+        if video_id:
+            record['video_id'] = video_id
+        if analysis:
+            record['preview'] = analysis[:PREVIEW_CHARS]
+        items = [{'email': email, 'sk': f"{FOOTAGE_PREFIX}{upload_date}#{footage_id}", **record}]
+        if analysis:
+            items.append({'email': email, 'sk': f"{ANALYSIS_PREFIX}{footage_id}", 'analysis': analysis})
+        return record, items
+
+    def add(self, email, label, name=None, analysis=None, video_id=None, upload_date=None, footage_id=None):
+        """Store one footage record and its analysis. Returns the listed record.
+
+        The user check, both items and the version bump are one transaction, so this is a single
+        round trip. Raises UserNotFoundError if users_table is set and has no record for email.
+        """
+        footage_id = footage_id or ulid()
+        upload_date = upload_date or datetime.utcnow().isoformat(timespec='microseconds')
+        record, items = self._items(email, footage_id, label, name, upload_date, analysis, video_id)
+
+        actions = [{'Put': {'TableName': self.table.name, 'Item': item}} for item in items]
+        actions.append({'Update': {
+            'TableName': self.table.name,
+            'Key': {'email': email, 'sk': VERSION_KEY},
+            'UpdateExpression': "ADD #version :one",
+            'ExpressionAttributeNames': {'#version': 'version'},
+            'ExpressionAttributeValues': {':one': 1},
+        }})
+        if self.users_table is not None:
+            actions.insert(0, {'ConditionCheck': {
+                'TableName': self.users_table.name,
+                'Key': {'email': email},
+                'ConditionExpression': "attribute_exists(email)",
+            }})
+        try:
+            # The token makes a retried request a no-op if the first attempt went through
+            self.table.meta.client.transact_write_items(TransactItems=actions, ClientRequestToken=footage_id)
+        except ClientError as e:
+            reasons = e.response.get('CancellationReasons') or []
+            if self.users_table is not None and reasons and reasons[0].get('Code') == 'ConditionalCheckFailed':
+                raise UserNotFoundError(f"User {email} not found")
+            raise
+        return record
+
+    def set_analysis(self, email, footage_id, upload_date, analysis):
+        """Replace the analysis of an existing footage record, e.g. after sections were added to its video.
+
+        The analysis item, the listed preview and the version bump are one transaction.
+        """
+        sk = f"{FOOTAGE_PREFIX}{upload_date}#{footage_id}"
+        self.table.meta.client.transact_write_items(TransactItems=[
+            {'Put': {'TableName': self.table.name,
+                     'Item': {'email': email, 'sk': f"{ANALYSIS_PREFIX}{footage_id}", 'analysis': analysis}}},
+            {'Update': {
+                'TableName': self.table.name,
+                'Key': {'email': email, 'sk': sk},
+                'UpdateExpression': "SET #preview = :preview",
+                'ConditionExpression': "attribute_exists(sk)",
+                'ExpressionAttributeNames': {'#preview': 'preview'},
+                'ExpressionAttributeValues': {':preview': analysis[:PREVIEW_CHARS]},
+            }},
+            {'Update': {
+                'TableName': self.table.name,
+                'Key': {'email': email, 'sk': VERSION_KEY},
+                'UpdateExpression': "ADD #version :one",
+                'ExpressionAttributeNames': {'#version': 'version'},
+                'ExpressionAttributeValues': {':one': 1},
+            }},
+        ])
+
+    def add_many(self, records):
+        """Store several footage records (dicts of add()'s arguments) in batched writes.
+
+        Items go out 25 per BatchWriteItem request, followed by one version bump per user. With
+        users_table, records for emails that have no user record are skipped. Returns the listed
+        records in the same order, with None for each skipped one.
+        """
+        emails = list(dict.fromkeys(entry['email'] for entry in records))
+        known = self.existing_users(emails) if self.users_table is not None else set(emails)
+        listed = []
+        with self.table.batch_writer() as batch:
+            for entry in records:
+                if entry['email'] not in known:
+                    listed.append(None)
+                    continue
+                upload_date = entry.get('upload_date') or datetime.utcnow().isoformat(timespec='microseconds')
+                record, items = self._items(entry['email'], entry.get('footage_id') or ulid(), entry.get('label'),
+                                            entry.get('name'), upload_date, entry.get('analysis'), entry.get('video_id'))
+                for item in items:
+                    batch.put_item(Item=item)
+                listed.append(record)
+        for email in emails:
+            if email in known:
+                self._bump(email)
+        return listed
+
+    def existing_users(self, emails):
+        """The emails that have a user record in users_table, read with BatchGetItem."""
+        found = set()
+        client = self.users_table.meta.client
+        for i in range(0, len(emails), 100):
+            request = {self.users_table.name: {
+                'Keys': [{'email': email} for email in emails[i:i + 100]],
+                'ProjectionExpression': '#email',
+                'ExpressionAttributeNames': {'#email': 'email'},
+            }}
+            while request:
+                response = client.batch_get_item(RequestItems=request)
+                found.update(item['email'] for item in response['Responses'].get(self.users_table.name, []))
+                # Keys DynamoDB did not get to (e.g. when throttled) are asked for again
+                request = response.get('UnprocessedKeys') or None
+        return found
+
+    def version(self, email):
+        """The user's footage version; changes whenever their footage does."""
+        response = self.table.get_item(Key={'email': email, 'sk': VERSION_KEY}, ProjectionExpression='#version',
+                                       ExpressionAttributeNames={'#version': 'version'})
+        return int(response.get('Item', {}).get('version', 0))
+
+    def _bump(self, email):
+        self.table.update_item(
+            Key={'email': email, 'sk': VERSION_KEY},
+            UpdateExpression="ADD #version :one",
+            ExpressionAttributeNames={'#version': 'version'},
+            ExpressionAttributeValues={':one': 1}
+        )
+
+    def list(self, email, limit=None, cursor=None, fields=None):
+        """One page of a user's footage, newest first, without analyses. Returns (records, next_cursor).
+
+        fields limits the returned attributes to a subset of LIST_FIELDS; footage_id is always included.
+        Raises ValueError for unknown fields or a malformed cursor.
+        """
+        fields = ("footage_id",) + tuple(field for field in fields if field != "footage_id") if fields else LIST_FIELDS
+        unknown = [field for field in fields if field not in LIST_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown footage fields: {', '.join(unknown)}")
+        query = {
+            'KeyConditionExpression': Key('email').eq(email) & Key('sk').begins_with(FOOTAGE_PREFIX),
+            # name is a reserved word, so every field goes through a placeholder
+            'ProjectionExpression': ", ".join(f"#{field}" for field in fields),
+            'ExpressionAttributeNames': {f"#{field}": field for field in fields},
+            'ScanIndexForward': False,
+            'Limit': min(limit or PAGE_SIZE, MAX_PAGE_SIZE),
+        }
+        if cursor:
+            query['ExclusiveStartKey'] = decode_cursor(cursor)
+            if query['ExclusiveStartKey']['email'] != email:
+                raise ValueError("Invalid cursor")
+        response = self.table.query(**query)
+        return response.get('Items', []), encode_cursor(response.get('LastEvaluatedKey'))
+
+    def get_analysis(self, email, footage_id):
+        """The full analysis text of one footage record, or None."""
+        response = self.table.get_item(
+            Key={'email': email, 'sk': f"{ANALYSIS_PREFIX}{footage_id}"},
+            ProjectionExpression='analysis'
+        )
+        return response.get('Item', {}).get('analysis')
+
+    def migrate_user(self, users_table, email, footage):
+        """Move a user's legacy footage list (the list attribute on their users item) into this table.
+
+        Ids are derived from the legacy entries, so a migration interrupted halfway can be rerun
+        without duplicating anything. Returns the number of records moved.
+        """
+        with self.table.batch_writer() as batch:
+            for index, entry in enumerate(footage):
+                upload_date = entry.get('upload_date') or datetime.utcnow().isoformat(timespec='microseconds')
+                footage_id = hashlib.sha256(f"{email}\0{index}\0{upload_date}".encode("utf-8")).hexdigest()[:26]
+                _, items = self._items(email, footage_id, entry.get('label'), entry.get('name'), upload_date,
+                                       entry.get('analysis'), entry.get('video_id'))
+                for item in items:
+                    batch.put_item(Item=item)
+        self._bump(email)
+        users_table.update_item(Key={'email': email}, UpdateExpression="REMOVE #footage",
+                                ExpressionAttributeNames={'#footage': 'footage'})
+        logger.info(f"Migrated {len(footage)} footage records of {email}")
+        return len(footage)
+
+
+class FootageWriter:
+    """Writes the footage records of finished analysis jobs in batches, from a background thread.
+
+    Records arriving within WRITE_INTERVAL of each other share one add_many() call. submit()
+    returns a Future, so a job can wait for its record to be stored before it reports success.
+    The Future raises UserNotFoundError for an email that has no user record.
+    """
+
+    def __init__(self, store, interval=None, max_batch=None):
+        self.store = store
+        self.interval = interval if interval is not None else WRITE_INTERVAL
+        self.max_batch = max_batch or WRITE_BATCH
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='footage-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, email, label, name=None, analysis=None, video_id=None, footage_id=None, upload_date=None):
+        """Queue a record. Returns a Future of the listed record.
+
+        Submitting the same footage_id and upload_date again overwrites the record rather than adding one.
+        """
+        future = Future()
+        self.pending.put(({'email': email, 'label': label, 'name': name, 'analysis': analysis,
+                           'video_id': video_id, 'footage_id': footage_id or ulid(), 'upload_date': upload_date},
+                          future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                records = self.store.add_many([entry for entry, _ in batch])
+            except Exception as e:
+                logger.exception(f"Failed to write {len(batch)} footage records")
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (entry, future), record in zip(batch, records):
+                    if record is None:
+                        future.set_exception(UserNotFoundError(f"User {entry['email']} not found"))
+                    else:
+                        future.set_result(record)
@@ -0,0 +1,110 @@
+"""Text rendering of Video Intelligence annotation sections.
+
+Each iter_* function yields the section's text line by line so callers can join it or
+stream it into a buffer; nothing is built up with repeated string concatenation.
+"""
+from itertools import islice
+
+# Lines joined per batch, so the per-line strings are not all held until the final join
+JOIN_BATCH = 4096
+
+
+def iter_label_detection(label_annotations):
+    yield "LABEL DETECTION:\n"
+    for label in label_annotations:
+        yield f"Label: {label.entity.description}\n"
+        for segment in label.segments:
+            start_time = segment.segment.start_time_offset.total_seconds()
+            end_time = segment.segment.end_time_offset.total_seconds()
+            yield f"  Segment: {start_time:.2f}s to {end_time:.2f}s (Confidence: {segment.confidence:.2f})\n"
+
+
+def _iter_tracks(title, annotations):
+    yield f"{title} DETECTION:\n"
+    for annotation in annotations:
+        for track in annotation.tracks:
+            start_time = track.segment.start_time_offset.total_seconds()
+            end_time = track.segment.end_time_offset.total_seconds()
+            yield f"{title.capitalize()} detected with confidence: {track.confidence:.2f}\n"
+            yield f"  Tracked from {start_time:.2f}s to {end_time:.2f}s\n"
+            if track.timestamped_objects:
+                for attribute in track.timestamped_objects[0].attributes:
+                    yield f"    Attribute: {attribute.name} (Confidence: {attribute.confidence:.2f})\n"
+
+
+def iter_face_detection(face_annotations):
+    return _iter_tracks("FACE", face_annotations)
+
+
+def iter_person_detection(person_annotations):
+    return _iter_tracks("PERSON", person_annotations)
+
+
+def iter_shot_change_detection(shot_annotations):
+    yield "SHOT CHANGE DETECTION:\n"
+    for i, shot in enumerate(shot_annotations):
+        start_time = shot.start_time_offset.total_seconds()
+        end_time = shot.end_time_offset.total_seconds()
+        yield f"  Shot {i + 1}: {start_time:.2f}s to {end_time:.2f}s\n"
+
+
+def iter_object_tracking(object_annotations):
+    yield "OBJECT TRACKING:\n"
+    for obj in object_annotations:
+        start_time = obj.segment.start_time_offset.total_seconds()
+        end_time = obj.segment.end_time_offset.total_seconds()
+        yield f"Tracked object: {obj.entity.description}\n"
+        yield f"  Tracked from {start_time:.2f}s to {end_time:.2f}s\n"
+        yield f"  Confidence: {obj.confidence:.2f}\n"
+
+
+def iter_speech_transcription(speech_transcriptions):
+    yield "SPEECH TRANSCRIPTION:\n"
+    for speech_transcription in speech_transcriptions:
+        for alternative in speech_transcription.alternatives:
+            yield f"Transcript: {alternative.transcript}\n"
+            yield f"Confidence: {alternative.confidence:.2f}\n"
+            yield "Word level information:\n"
+            for word_info in alternative.words:
+                start_time = word_info.start_time.total_seconds()
+                end_time = word_info.end_time.total_seconds()
+                yield f"  {start_time:.2f}s - {end_time:.2f}s: {word_info.word}\n"
+
+
+FORMATTERS = {
+    "LABEL_DETECTION": iter_label_detection,
+    "FACE_DETECTION": iter_face_detection,
+    "PERSON_DETECTION": iter_person_detection,
+    "SHOT_CHANGE_DETECTION": iter_shot_change_detection,
+    "OBJECT_TRACKING": iter_object_tracking,
+    "SPEECH_TRANSCRIPTION": iter_speech_transcription,
+}
+
+
+def iter_section(section_name, section_data):
+    formatter = FORMATTERS.get(section_name)
+    if formatter is None:
+        yield f"{section_name}:\n{str(section_data)}"
+        return
+    yield from formatter(section_data)
+
+
+def format_section(section_name, section_data):
+    """Render a whole section as one string.
+
+    The result and the batches it is joined from are both alive at the end, so this peaks at about
+    twice the size of the text (bench_formatters.py); use write_section when the text can be
+    streamed instead.
+    """
+    lines = iter_section(section_name, section_data)
+    batches = []
+    while True:
+        batch = "".join(islice(lines, JOIN_BATCH))
+        if not batch:
+            return "".join(batches)
+        batches.append(batch)
+
+
+def write_section(section_name, section_data, out):
+    """Stream a section into a file-like object."""
+    out.writelines(iter_section(section_name, section_data))
@@ -0,0 +1,48 @@
+"""Conditional GETs and response compression for the JSON endpoints."""
+import os
+import gzip
+import hashlib
+
+from flask import Response
+
+GZIP_MIN_BYTES = int(os.getenv('GZIP_MIN_BYTES', '500'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+COMPRESSIBLE = {'application/json', 'text/plain', 'text/html'}
+
+
+def make_etag(*parts):
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(str(part).encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()[:32]
+
+
+def not_modified(etag, cache_control=None):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def cacheable(response, etag, cache_control="private, no-cache"):
+    """Tag a response for revalidation. no-cache makes the browser send If-None-Match every time."""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def gzip_response(response, request):
+    """Gzip a response in place if the client accepts it and it is big enough. Streams are left alone."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE
+            or not request.accept_encodings['gzip']):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
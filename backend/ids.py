@@ -0,0 +1,16 @@
+"""Video ids that stay unique across concurrent workers and processes."""
+import os
+import time
+
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+
+def ulid(timestamp=None):
+    """26-character ULID: a 48-bit millisecond timestamp then 80 random bits, so ids sort by creation time."""
+    millis = int((time.time() if timestamp is None else timestamp) * 1000) & ((1 << 48) - 1)
+    value = (millis << 80) | int.from_bytes(os.urandom(10), "big")
+    return "".join(CROCKFORD[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+
+def new_video_id():
+    return f"video_{ulid()}"
@@ -0,0 +1,87 @@
+import os
+import logging
+
+from retrieval import ANALYSIS_SECTION, section_id
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv('CHROMA_BATCH_SIZE', '256'))
+
+
+class BulkWriter:
+    """Collects documents and writes them to a collection in batched upserts.
+
+    Each flush is a single embedding pass and a single persistence transaction, instead of one
+    per document. Use as a context manager so whatever is left is flushed on exit.
+    """
+
+    def __init__(self, collection, batch_size=None):
+        self.collection = collection
+        self.batch_size = batch_size or BATCH_SIZE
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self.written = 0
+
+    def add(self, doc_id, document, metadata):
+        self.ids.append(doc_id)
+        self.documents.append(document)
+        self.metadatas.append(metadata)
+        if len(self.ids) >= self.batch_size:
+            self.flush()
+
+    def add_video(self, video_id, sections, analysis=None, metadata=None):
+        """Queue every section of a video, plus its Groq analysis if given."""
+        metadata = metadata or {}
+        for section_name, text in sections.items():
+            self.add(section_id(video_id, section_name), text,
+                     {**metadata, "video_id": video_id, "section": section_name})
+        if analysis is not None:
+            self.add(section_id(video_id, ANALYSIS_SECTION), analysis,
+                     {**metadata, "video_id": video_id, "section": ANALYSIS_SECTION})
+
+    def flush(self):
+        if not self.ids:
+            return
+        self.collection.upsert(ids=self.ids, documents=self.documents, metadatas=self.metadatas)
+        self.written += len(self.ids)
+        self.ids, self.documents, self.metadatas = [], [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+
+def backfill(collection, analyses, batch_size=None):
+    """Re-index stored analyses in bulk.
+
+    analyses yields dicts with video_id, sections, analysis and optionally metadata, such as the
+    entries of a ResultCache. Returns the number of documents written.
+    """
+    with BulkWriter(collection, batch_size) as writer:
+        for count, entry in enumerate(analyses, 1):
+            writer.add_video(entry['video_id'], entry['sections'], entry.get('analysis'), entry.get('metadata'))
+            if count % 100 == 0:
+                logger.info(f"Queued {count} analyses for re-indexing")
+    return writer.written
+
+
+def main():
+    """Rebuild the video_analysis collection from the result cache."""
+    import chromadb
+    from result_cache import ResultCache
+    from embeddings import get_embedding_function
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    chroma_client = chromadb.PersistentClient(path=os.getenv('CHROMA_DB_PATH', './chroma_db'))
+    # Unchanged documents are not embedded again, thanks to the embedding cache
+    collection = chroma_client.get_or_create_collection(name="video_analysis",
+                                                        embedding_function=get_embedding_function())
+    written = backfill(collection, ResultCache().entries())
+    logger.info(f"Re-indexed {written} documents")
+
+
+if __name__ == "__main__":
+    main()
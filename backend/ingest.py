@@ -0,0 +1,145 @@
+import io
+import os
+import hashlib
+import uuid
+import logging
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Size of the single reusable buffer used when copying uploads around
+CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', str(1024 * 1024)))
+# GCS resumable uploads need chunks in multiples of 256 KB
+GCS_CHUNK_SIZE = 32 * 256 * 1024
+
+
+def copy_stream(src, dst, chunk_size=CHUNK_SIZE, hasher=None):
+    """Copy src to dst through one fixed-size buffer, feeding hasher if given. Returns the number of bytes copied."""
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    total = 0
+    while True:
+        n = src.readinto(buffer) if hasattr(src, 'readinto') else _read_into(src, buffer)
+        if not n:
+            break
+        dst.write(view[:n])
+        if hasher is not None:
+            hasher.update(view[:n])
+        total += n
+    return total
+
+
+def _read_into(src, buffer):
+    data = src.read(len(buffer))
+    buffer[:len(data)] = data
+    return len(data)
+
+
+def save_upload(stream, dest_path, chunk_size=CHUNK_SIZE):
+    """Stream an uploaded file to dest_path without holding it in memory.
+
+    Returns the number of bytes written and the SHA-256 of the content.
+    """
+    hasher = hashlib.sha256()
+    with io.open(dest_path, "wb") as dst:
+        size = copy_stream(stream, dst, chunk_size, hasher)
+    return size, hasher.hexdigest()
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    """SHA-256 of a file on disk, read in chunks."""
+    hasher = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with io.open(path, "rb") as file:
+        while True:
+            n = file.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+class LocalObjectStore:
+    """Directory-backed object store. Stand-in for GCS in local runs and tests."""
+
+    scheme = 'file'
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def put_file(self, path, key=None):
+        key = key or f"{uuid.uuid4().hex}_{os.path.basename(path)}"
+        dest = os.path.join(self.root, key)
+        with io.open(path, "rb") as src, io.open(dest, "wb") as dst:
+            copy_stream(src, dst)
+        return f"file://{dest}"
+
+    def open(self, uri):
+        return io.open(urlparse(uri).path, "rb")
+
+    def delete(self, uri):
+        path = urlparse(uri).path
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class GCSObjectStore:
+    """Google Cloud Storage bucket. Video Intelligence can read gs:// URIs directly."""
+
+    scheme = 'gs'
+
+    def __init__(self, bucket, prefix=''):
+        from clients import get_storage_client
+
+        self.client = get_storage_client()
+        self.bucket = self.client.bucket(bucket)
+        self.prefix = prefix.strip('/')
+
+    def put_file(self, path, key=None):
+        key = key or f"{uuid.uuid4().hex}_{os.path.basename(path)}"
+        if self.prefix:
+            key = f"{self.prefix}/{key}"
+        blob = self.bucket.blob(key, chunk_size=GCS_CHUNK_SIZE)
+        # Resumable upload, sent chunk by chunk from disk
+        blob.upload_from_filename(path)
+        return f"gs://{self.bucket.name}/{key}"
+
+    def open(self, uri):
+        return self.bucket.blob(self._key(uri)).open("rb")
+
+    def delete(self, uri):
+        self.bucket.blob(self._key(uri)).delete()
+
+    def _key(self, uri):
+        return urlparse(uri).path.lstrip('/')
+
+
+def get_object_store(uri=None):
+    """Build the object store configured by VIDEO_STORAGE_URI (gs://bucket/prefix or a local path). None if unset."""
+    uri = uri or os.getenv('VIDEO_STORAGE_URI')
+    if not uri:
+        return None
+    parsed = urlparse(uri)
+    if parsed.scheme == 'gs':
+        return GCSObjectStore(parsed.netloc, parsed.path)
+    if parsed.scheme == 'file':
+        return LocalObjectStore(parsed.path)
+    return LocalObjectStore(uri)
+
+
+def annotation_input(video_path, store=None):
+    """Return the request fields that point the annotator at the video, and the stored URI if any.
+
+    With a GCS store the file is uploaded from disk in chunks and only its URI is sent, so memory
+    per request stays constant. That only holds with GCS: Video Intelligence only reads gs:// URIs,
+    so with a local store or none the whole file is read into memory and sent inline.
+    """
+    if store is not None and store.scheme == 'gs':
+        uri = store.put_file(video_path)
+        logger.info(f"Uploaded {video_path} to {uri}")
+        return {"input_uri": uri}, uri
+
+    with io.open(video_path, "rb") as file:
+        return {"input_content": file.read()}, None
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue already holds the maximum number of pending jobs."""
+
+
+class Job:
+    def __init__(self, job_id, meta=None):
+        self.id = job_id
+        self.status = QUEUED
+        self.meta = meta or {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'meta': self.meta,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """Runs long video analysis jobs on a bounded worker pool and keeps their status around for polling."""
+
+    def __init__(self, max_workers=None, max_pending=None, max_finished=None):
+        self.max_workers = max_workers or int(os.getenv('ANALYZE_WORKERS', '2'))
+        self.max_pending = max_pending or int(os.getenv('ANALYZE_MAX_PENDING', '50'))
+        self.max_finished = max_finished or int(os.getenv('ANALYZE_MAX_FINISHED', '500'))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analyze')
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args, meta=None, job_id=None, **kwargs):
+        """Queue fn(*args, **kwargs) and return the Job tracking it. job_id defaults to a new random id."""
+        with self.lock:
+            pending = sum(1 for job in self.jobs.values() if job.status in (QUEUED, RUNNING))
+            if pending >= self.max_pending:
+                raise QueueFullError(f"Too many pending jobs ({pending})")
+            job = Job(job_id or uuid.uuid4().hex, meta)
+            self.jobs[job.id] = job
+            self._evict_finished()
+
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = DONE
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _evict_finished(self):
+        # Drop the oldest finished jobs once we keep more than max_finished around
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in (DONE, FAILED)]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import tempfile
+import threading
+import logging
+
+from ids import new_video_id
+
+logger = logging.getLogger(__name__)
+
+STARTED = "started"
+ANNOTATED = "annotated"
+INDEXED = "indexed"
+SUMMARIZED = "summarized"
+FINISHED = "finished"
+FAILED = "failed"
+# Pipeline stages in the order they complete
+STAGES = (STARTED, ANNOTATED, INDEXED, SUMMARIZED, FINISHED)
+
+
+def reached(job, stage):
+    """Whether a journaled job has completed stage."""
+    return job is not None and job['stage'] in STAGES and STAGES.index(job['stage']) >= STAGES.index(stage)
+
+
+class JobJournal:
+    """Write-ahead record of each analysis job, so a crashed job resumes from its last completed stage.
+
+    A job is recorded with its video id and parameters before it is queued. Each stage stores what
+    the next one needs (the raw annotation results, the section texts, the analysis) in the same
+    transaction that advances the stage, so a restarted job never redoes the 20-minute annotation
+    once it has finished, and writes again under the same video id.
+
+    With an object store (see ingest.py), bytes artifacts such as the raw annotations are uploaded
+    there and the journal keeps only their URIs.
+
+    Several worker processes can share one journal. Each holds a lease on its open jobs and renews
+    it while running; a job whose lease lapsed belongs to a process that died, and is claimed by
+    whichever process calls claim_orphans() first.
+    """
+
+    def __init__(self, path=None, max_age=None, lease=None, store=None):
+        self.path = path or os.getenv('JOB_JOURNAL_PATH', './job_journal.db')
+        self.store = store
+        # Finished and failed jobs are kept this many seconds
+        self.max_age = max_age or float(os.getenv('JOB_JOURNAL_MAX_AGE', str(7 * 24 * 3600)))
+        self.lease = lease or float(os.getenv('JOB_JOURNAL_LEASE', '60'))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lock = threading.Lock()
+        self.recovery = None
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    error TEXT,
+                    result TEXT,
+                    owner TEXT NOT NULL,
+                    heartbeat_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    job_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    uri TEXT,
+                    PRIMARY KEY (job_id, name)
+                )
+            """)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if 'result' not in columns:
+                # Journals created before results were stored
+                conn.execute("ALTER TABLE jobs ADD COLUMN result TEXT")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(artifacts)")]
+            if 'uri' not in columns:
+                # Journals created before artifacts could live in an object store
+                conn.execute("ALTER TABLE artifacts ADD COLUMN uri TEXT")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def begin(self, job_id, params=None, video_id=None):
+        """Record a job unless it already is, and return it. A resumed job keeps its video id."""
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                """INSERT OR IGNORE INTO jobs
+                   (job_id, video_id, stage, params, owner, heartbeat_at, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (job_id, video_id or new_video_id(), STARTED, json.dumps(params or {}), self.owner, now, now, now)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Return {'job_id', 'video_id', 'stage', 'params', 'error', 'result', 'created_at', 'updated_at'} or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT video_id, stage, params, error, result, created_at, updated_at FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        video_id, stage, params, error, result, created_at, updated_at = row
+        return {'job_id': job_id, 'video_id': video_id, 'stage': stage, 'params': json.loads(params), 'error': error,
+                'result': json.loads(result) if result is not None else None,
+                'created_at': created_at, 'updated_at': updated_at}
+
+    def advance(self, job_id, stage, **artifacts):
+        """Mark stage complete, storing the artifacts (bytes or JSON-serializable) the later stages need.
+
+        With a store, bytes artifacts are uploaded before the transaction and only their URIs go in it.
+        """
+        rows = []
+        for name, data in artifacts.items():
+            if not isinstance(data, bytes):
+                rows.append((job_id, name, json.dumps(data).encode("utf-8"), None))
+            elif self.store is not None:
+                rows.append((job_id, name, b"", self._upload(job_id, name, data)))
+            else:
+                rows.append((job_id, name, data, None))
+        with self.lock, self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO artifacts (job_id, name, data, uri) VALUES (?, ?, ?, ?)", rows)
+            conn.execute("UPDATE jobs SET stage = ?, updated_at = ? WHERE job_id = ?", (stage, time.time(), job_id))
+
+    def _upload(self, job_id, name, data):
+        fd, path = tempfile.mkstemp(suffix=f"_{name}")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            # The same key on every attempt, so a stage repeated after a crash overwrites its upload
+            return self.store.put_file(path, key=f"journal_{job_id}_{name}")
+        finally:
+            os.remove(path)
+
+    def artifact(self, job_id, name, raw=False):
+        """A stored artifact, decoded from JSON unless raw. None if there is none."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT data, uri FROM artifacts WHERE job_id = ? AND name = ?",
+                               (job_id, name)).fetchone()
+        if row is None:
+            return None
+        data, uri = row
+        if uri is not None:
+            with self.store.open(uri) as file:
+                data = file.read()
+        return bytes(data) if raw else json.loads(data)
+
+    def finish(self, job_id, result=None):
+        """Mark a job finished with what it returned, and drop its artifacts.
+
+        The result and the stage are written together, so any process sharing the journal that
+        sees the job finished can also report its result.
+        """
+        self._close(job_id, FINISHED, None, result)
+
+    def fail(self, job_id, error):
+        """Mark a job failed. Failed jobs are not resumed."""
+        self._close(job_id, FAILED, error)
+
+    def _close(self, job_id, stage, error, result=None):
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.execute("UPDATE jobs SET stage = ?, error = ?, result = ?, updated_at = ? WHERE job_id = ?",
+                         (stage, error, json.dumps(result) if result is not None else None, now, job_id))
+            uris = [row[0] for row in conn.execute(
+                "SELECT uri FROM artifacts WHERE job_id = ? AND uri IS NOT NULL", (job_id,)
+            )]
+            conn.execute("DELETE FROM artifacts WHERE job_id = ?", (job_id,))
+            # Closed jobs are only kept for a while
+            conn.execute("DELETE FROM jobs WHERE stage IN (?, ?) AND updated_at < ?",
+                         (FINISHED, FAILED, now - self.max_age))
+        for uri in uris:
+            try:
+                self.store.delete(uri)
+            except Exception as e:
+                logger.warning(f"Could not delete artifact {uri} of job {job_id}: {e}")
+
+    def heartbeat(self):
+        """Renew the lease on this process's open jobs."""
+        with self.lock, self._connect() as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND stage NOT IN (?, ?)",
+                         (time.time(), self.owner, FINISHED, FAILED))
+
+    def claim_orphans(self):
+        """Take over open jobs whose lease lapsed, oldest first, and return them."""
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            # Taken before reading so two processes cannot claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            job_ids = [row[0] for row in conn.execute(
+                "SELECT job_id FROM jobs WHERE stage NOT IN (?, ?) AND heartbeat_at < ? ORDER BY created_at",
+                (FINISHED, FAILED, now - self.lease)
+            )]
+            conn.executemany("UPDATE jobs SET owner = ?, heartbeat_at = ? WHERE job_id = ?",
+                             [(self.owner, now, job_id) for job_id in job_ids])
+        return [self.get(job_id) for job_id in job_ids]
+
+    def release(self, job_id):
+        """Give up the lease on an open job so the next claim_orphans() picks it up again."""
+        with self.lock, self._connect() as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = 0 WHERE job_id = ?", (job_id,))
+
+    def start_recovery(self, resume):
+        """Renew leases and pass each orphaned job to resume(job), in a background thread."""
+        def run():
+            while True:
+                try:
+                    self.heartbeat()
+                    for job in self.claim_orphans():
+                        logger.info(f"Resuming job {job['job_id']} ({job['video_id']}) after the {job['stage']} stage")
+                        resume(job)
+                except Exception:
+                    logger.exception("Job recovery pass failed")
+                time.sleep(self.lease / 3)
+
+        if self.recovery is None:
+            self.recovery = threading.Thread(target=run, name='job-recovery', daemon=True)
+            self.recovery.start()
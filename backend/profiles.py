@@ -0,0 +1,62 @@
+import os
+import re
+
+from retrieval import SECTIONS
+
+# Sections annotated up front by each profile. Anything left out is fetched later, when a
+# conversation asks about it.
+PROFILES = {
+    "quick": ("LABEL_DETECTION", "SHOT_CHANGE_DETECTION"),
+    "standard": ("LABEL_DETECTION", "SHOT_CHANGE_DETECTION", "OBJECT_TRACKING", "SPEECH_TRANSCRIPTION"),
+    "full": tuple(SECTIONS),
+}
+# Used when /analyze names no profile. Anything but "full" defers sections to the conversation
+DEFAULT_PROFILE = os.getenv('ANALYSIS_PROFILE', 'full')
+
+# Where each section lives on a VideoAnnotationResults
+RESULT_FIELDS = {
+    "LABEL_DETECTION": "segment_label_annotations",
+    "FACE_DETECTION": "face_detection_annotations",
+    "PERSON_DETECTION": "person_detection_annotations",
+    "SHOT_CHANGE_DETECTION": "shot_annotations",
+    "OBJECT_TRACKING": "object_annotations",
+    "SPEECH_TRANSCRIPTION": "speech_transcriptions",
+}
+
+# Questions that can only be answered with a given section
+SECTION_TRIGGERS = {
+    "FACE_DETECTION": re.compile(r"\b(faces?|facial|expressions?|glasses|beard|smil\w*)\b", re.IGNORECASE),
+    "PERSON_DETECTION": re.compile(
+        r"\b(who|person|persons|people|man|men|woman|women|someone|anyone|somebody|intruders?|wearing|clothes|"
+        r"clothing|shirt|jacket|pose|walk\w*|run\w*|stand\w*|sit\w*)\b", re.IGNORECASE
+    ),
+    "OBJECT_TRACKING": re.compile(
+        r"\b(objects?|cars?|vehicles?|trucks?|bikes?|bags?|packages?|boxes?|doors?|carr\w*|hold\w*|track\w*)\b",
+        re.IGNORECASE
+    ),
+    "SPEECH_TRANSCRIPTION": re.compile(
+        r"\b(say|says|said|saying|speak\w*|spoke|talk\w*|speech|hear\w*|heard|voices?|audio|words?|"
+        r"shout\w*|yell\w*|conversation)\b", re.IGNORECASE
+    ),
+}
+
+
+def profile_sections(profile=None):
+    """Sections annotated by a named profile (DEFAULT_PROFILE if None). Raises ValueError for unknown names."""
+    profile = profile or DEFAULT_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown analysis profile '{profile}'. Expected one of: {', '.join(PROFILES)}")
+    return PROFILES[profile]
+
+
+def result_sections(annotation_results, section_names):
+    """(section_name, data) pairs for the requested sections of one VideoAnnotationResults."""
+    return [(name, getattr(annotation_results, RESULT_FIELDS[name])) for name in section_names]
+
+
+def sections_needed(question, available):
+    """Sections missing from available that a question needs, in canonical order."""
+    return [
+        name for name in SECTIONS
+        if name not in available and name in SECTION_TRIGGERS and SECTION_TRIGGERS[name].search(question)
+    ]
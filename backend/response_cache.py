@@ -0,0 +1,195 @@
+"""Semantic cache of conversation answers.
+
+Users on the same video ask the same few questions in slightly different words. An answer is
+stored under its video and the embedding of the normalized question; a later question on that
+video whose embedding is close enough (cosine similarity >= threshold) gets the stored answer
+without a retrieval query or a Groq call. Entries expire after ttl seconds, the least recently
+used are evicted beyond max_entries.
+
+Answers are held per process, but each is stored with its video's generation, a counter kept in
+a SQLite file shared by all workers. invalidate() bumps it when the video's analysis changes, so
+answers stored under an older generation stop matching in every worker.
+"""
+import os
+import re
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+THRESHOLD = float(os.getenv('RESPONSE_CACHE_THRESHOLD', '0.92'))
+TTL = float(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '5000'))
+
+# Questions that lean on earlier turns ("what about her?") can't be answered from another conversation
+CONTEXTUAL = re.compile(
+    r"\b(it|its|that|this(?! (video|clip|footage|recording))|those|these|they|them|their|he|she|him|her|his|"
+    r"hers|then|again|else|also|more|previous|last one|same)\b", re.IGNORECASE
+)
+PUNCTUATION = re.compile(r"[^\w\s:]")
+NUMBERS = re.compile(r"\d+(?::\d+)*")
+
+
+def normalize_question(question):
+    return " ".join(PUNCTUATION.sub(" ", question.lower()).split())
+
+
+class CacheKey:
+    """Where an answer goes once it is generated; returned by ResponseCache.lookup on a miss."""
+
+    def __init__(self, video_id, question, numbers, embedding, generation):
+        self.video_id = video_id
+        self.question = question
+        self.numbers = numbers
+        self.embedding = embedding
+        self.generation = generation
+
+
+class ResponseCache:
+    """Answers per video, found by question similarity. See the module docstring."""
+
+    def __init__(self, embedding_function=None, threshold=None, ttl=None, max_entries=None, path=None):
+        self._embedding_function = embedding_function
+        self.threshold = threshold or THRESHOLD
+        self.ttl = ttl or TTL
+        self.max_entries = max_entries or MAX_ENTRIES
+        self.path = path or os.getenv('RESPONSE_CACHE_PATH', './response_cache.db')
+        # (video_id, normalized question) -> (embedding, numbers, answer, stored_at, generation), in LRU order
+        self.entries = OrderedDict()
+        # video_id -> its normalized questions in entries, so a lookup only scans its own video
+        self.questions = {}
+        self.lock = threading.Lock()
+        self.counts = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0, 'skipped': 0,
+                       'expired': 0, 'evicted': 0, 'invalidated': 0}
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS generations (
+                    video_id TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def generation(self, video_id):
+        """How many times video_id's answers have been invalidated, across all workers."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT generation FROM generations WHERE video_id = ?", (video_id,)).fetchone()
+        return row[0] if row else 0
+
+    @property
+    def embedding_function(self):
+        if self._embedding_function is None:
+            # Lazy so importing this module does not import chromadb
+            from embeddings import get_embedding_function
+            self._embedding_function = get_embedding_function()
+        return self._embedding_function
+
+    def embed(self, text):
+        vector = np.asarray(self.embedding_function([text])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, video_id, question):
+        """Return (answer, None) on a hit, or (None, key) to pass to put() with the generated answer.
+
+        key is None when the question should not be cached, e.g. because it refers to earlier turns.
+        """
+        if CONTEXTUAL.search(question):
+            with self.lock:
+                self.counts['skipped'] += 1
+            return None, None
+        normalized = normalize_question(question)
+        if not normalized:
+            return None, None
+        numbers = tuple(NUMBERS.findall(normalized))
+        now = time.time()
+        generation = self.generation(video_id)
+
+        with self.lock:
+            entry = self.entries.get((video_id, normalized))
+            if entry is not None and now - entry[3] <= self.ttl and entry[4] == generation:
+                self.entries.move_to_end((video_id, normalized))
+                self.counts['exact_hits'] += 1
+                return entry[2], None
+
+        embedding = self.embed(normalized)
+
+        with self.lock:
+            best_key, best_score = None, self.threshold
+            for normalized_other in list(self.questions.get(video_id, ())):
+                key = (video_id, normalized_other)
+                other, other_numbers, _, stored_at, other_generation = self.entries[key]
+                if other_generation != generation:
+                    # Invalidated, possibly by another worker
+                    self._remove(key)
+                    self.counts['invalidated'] += 1
+                    continue
+                if now - stored_at > self.ttl:
+                    self._remove(key)
+                    self.counts['expired'] += 1
+                    continue
+                # "What happened at 1:00" and "at 2:00" embed almost alike but are different questions
+                if other_numbers != numbers:
+                    continue
+                score = float(np.dot(embedding, other))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is not None:
+                self.entries.move_to_end(best_key)
+                self.counts['semantic_hits'] += 1
+                return self.entries[best_key][2], None
+            self.counts['misses'] += 1
+        return None, CacheKey(video_id, normalized, numbers, embedding, generation)
+
+    def put(self, key, answer):
+        if key is None or not answer:
+            return
+        if self.generation(key.video_id) != key.generation:
+            # The analysis changed while this answer was generated
+            return
+        with self.lock:
+            self.entries[(key.video_id, key.question)] = (key.embedding, key.numbers, answer, time.time(),
+                                                          key.generation)
+            self.entries.move_to_end((key.video_id, key.question))
+            self.questions.setdefault(key.video_id, set()).add(key.question)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.counts['evicted'] += 1
+
+    def _remove(self, key):
+        del self.entries[key]
+        questions = self.questions[key[0]]
+        questions.discard(key[1])
+        if not questions:
+            del self.questions[key[0]]
+
+    def invalidate(self, video_id):
+        """Drop a video's answers in every worker, e.g. after sections were added to its analysis.
+
+        Returns how many were dropped here; other workers drop theirs on their next lookup.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT INTO generations VALUES (?, 1)
+                   ON CONFLICT(video_id) DO UPDATE SET generation = generation + 1""",
+                (video_id,)
+            )
+        with self.lock:
+            questions = self.questions.pop(video_id, set())
+            for question in questions:
+                del self.entries[(video_id, question)]
+            self.counts['invalidated'] += len(questions)
+        return len(questions)
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+            entries = len(self.entries)
+        hits = counts['exact_hits'] + counts['semantic_hits']
+        lookups = hits + counts['misses']
+        return {**counts, 'hits': hits, 'lookups': lookups, 'entries': entries,
+                'hit_rate': round(hits / lookups, 4) if lookups else None}
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def feature_key(features):
+    """Stable cache key for a list of Video Intelligence features."""
+    return ",".join(sorted(getattr(f, 'name', str(f)) for f in features))
+
+
+class ResultCache:
+    """Persistent cache of finished analyses keyed by video content hash and feature set.
+
+    Entries are evicted when older than max_age seconds, and least recently used entries go
+    first once the cache holds more than max_entries or max_bytes of stored text.
+    """
+
+    def __init__(self, path=None, max_entries=None, max_bytes=None, max_age=None):
+        self.path = path or os.getenv('RESULT_CACHE_PATH', './result_cache.db')
+        self.max_entries = max_entries or int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1000'))
+        self.max_bytes = max_bytes or int(os.getenv('RESULT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+        self.max_age = max_age or float(os.getenv('RESULT_CACHE_MAX_AGE', str(30 * 24 * 3600)))
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    content_hash TEXT NOT NULL,
+                    features TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    sections TEXT NOT NULL,
+                    analysis TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (content_hash, features)
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, content_hash, features):
+        """Return {'video_id', 'sections', 'analysis'} for a cached analysis, or None."""
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT video_id, sections, analysis, created_at FROM results WHERE content_hash = ? AND features = ?",
+                (content_hash, features)
+            ).fetchone()
+            if row is None:
+                return None
+            video_id, sections, analysis, created_at = row
+            if now - created_at > self.max_age:
+                conn.execute("DELETE FROM results WHERE content_hash = ? AND features = ?", (content_hash, features))
+                return None
+            conn.execute(
+                "UPDATE results SET accessed_at = ? WHERE content_hash = ? AND features = ?",
+                (now, content_hash, features)
+            )
+        return {'video_id': video_id, 'sections': json.loads(sections), 'analysis': analysis}
+
+    def entries(self):
+        """Yield every cached analysis, e.g. to re-index them."""
+        with self.lock, self._connect() as conn:
+            rows = conn.execute("SELECT video_id, sections, analysis FROM results").fetchall()
+        for video_id, sections, analysis in rows:
+            yield {'video_id': video_id, 'sections': json.loads(sections), 'analysis': analysis}
+
+    def put(self, content_hash, features, video_id, sections, analysis):
+        sections_json = json.dumps(sections)
+        size = len(sections_json) + len(analysis)
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, features, video_id, sections_json, analysis, size, now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.max_age,))
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        rows = conn.execute("SELECT content_hash, features, size FROM results ORDER BY accessed_at").fetchall()
+        for content_hash, features, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM results WHERE content_hash = ? AND features = ?", (content_hash, features))
+            count -= 1
+            total -= size
+        logger.info(f"Result cache evicted down to {count} entries / {total} bytes")
@@ -0,0 +1,94 @@
+"""Video-scoped lookups against the video_analysis collection.
+
+Every query carries a metadata filter on video_id, so search cost and results depend on the
+one video being discussed rather than on everything ever uploaded. Known documents are fetched
+by id instead of searched for.
+"""
+
+SECTIONS = [
+    "LABEL_DETECTION",
+    "FACE_DETECTION",
+    "PERSON_DETECTION",
+    "SHOT_CHANGE_DETECTION",
+    "OBJECT_TRACKING",
+    "SPEECH_TRANSCRIPTION",
+]
+ANALYSIS_SECTION = "GROQ_ANALYSIS"
+
+
+def section_id(video_id, section_name):
+    return f"{video_id}_{section_name}"
+
+
+def video_filter(video_id, user=None, label=None, sections=None, exclude_sections=None, kind=None):
+    """Build a Chroma where clause scoping a query to one video."""
+    clauses = [{"video_id": video_id}]
+    if kind:
+        clauses.append({"kind": kind})
+    if user:
+        clauses.append({"user": user})
+    if label:
+        clauses.append({"label": label})
+    if sections:
+        clauses.append({"section": {"$in": list(sections)}})
+    if exclude_sections:
+        clauses.append({"section": {"$nin": list(exclude_sections)}})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def flatten_documents(results):
+    """Flatten the documents of a query or get result into a list of strings."""
+    documents = []
+    for doc in results.get('documents') or []:
+        if isinstance(doc, list):
+            documents.extend(d for d in doc if isinstance(d, str))
+        elif isinstance(doc, str):
+            documents.append(doc)
+    return documents
+
+
+def query_video(collection, video_id, query_text, n_results=3, user=None, label=None,
+                sections=None, exclude_sections=(ANALYSIS_SECTION,), kind=None):
+    """Similarity search restricted to one video's documents."""
+    results = collection.query(
+        query_texts=[query_text],
+        n_results=n_results,
+        where=video_filter(video_id, user, label, sections, exclude_sections, kind)
+    )
+    return flatten_documents(results)
+
+
+def query_video_windows(collection, video_id, query_text, n_results=3, **filters):
+    """Search a video's time-window chunks, falling back to whole sections for videos indexed before chunking."""
+    documents = query_video(collection, video_id, query_text, n_results, kind="window", **filters)
+    if not documents:
+        documents = query_video(collection, video_id, query_text, n_results, **filters)
+    return documents
+
+
+def get_video_sections(collection, video_id, sections=SECTIONS):
+    """Fetch a video's section documents by id. Returns {section_name: text} for those that exist."""
+    results = collection.get(ids=[section_id(video_id, name) for name in sections])
+    by_id = dict(zip(results['ids'], results['documents']))
+    return {
+        name: by_id[section_id(video_id, name)]
+        for name in sections
+        if section_id(video_id, name) in by_id
+    }
+
+
+def assemble_sections(sections):
+    """Order section texts the same way for every prompt, skipping empty ones."""
+    return [sections[name] for name in SECTIONS if sections.get(name)]
+
+
+def get_video_analysis(collection, video_id):
+    """Fetch the stored Groq analysis for a video by id, or None."""
+    # analysis_<id> is where older conversations stored a copy of the analysis
+    ids = [section_id(video_id, ANALYSIS_SECTION), f"analysis_{video_id}"]
+    results = collection.get(ids=ids)
+    by_id = dict(zip(results['ids'], results['documents']))
+    for doc_id in ids:
+        if by_id.get(doc_id):
+            return by_id[doc_id]
+    return None
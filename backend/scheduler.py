@@ -0,0 +1,296 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = ('APIConnectionError', 'APITimeoutError', 'RateLimitError', 'InternalServerError')
+
+
+class TokenBucket:
+    """Token bucket whose refill rate backs off when the provider throttles and creeps back on success."""
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.min_rate = rate / 16
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now >= self.paused_until and self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self._take(now):
+                    return
+                wait_for = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait_for)
+
+    def try_acquire(self):
+        """Take a token if one is available now. False while paused or empty."""
+        with self.lock:
+            return self._take(time.monotonic())
+
+    def throttle(self, pause=None):
+        """The provider said slow down: halve the rate and optionally hold every caller for pause seconds."""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if pause:
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class ProviderLimit:
+    """Rate, concurrency and retry settings for one remote API."""
+
+    def __init__(self, name, rate, burst, max_in_flight, max_retries, base_delay=0.5, max_delay=30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.in_flight = 0
+        self.retries = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+
+def _status_code(error):
+    # Groq errors carry status_code, google.api_core errors carry the HTTP status as code
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(error, 'code', None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after(error):
+    """Seconds from a Retry-After header on the error's response, if any."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    status = _status_code(error)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    return type(error).__name__ in RETRYABLE_ERRORS or isinstance(error, ConnectionError)
+
+
+def retry_delay(error, attempt, base_delay, max_delay):
+    """How long to wait before retrying error, or None if it should not be retried."""
+    if not is_retryable(error):
+        return None
+    after = retry_after(error)
+    if after is not None:
+        return min(max_delay, after)
+    # Full jitter keeps a burst of failed callers from retrying in lockstep
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class _Release:
+    """Gives an in-flight slot back exactly once."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.released = False
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            if self.released:
+                return
+            self.released = True
+        with self.limit.lock:
+            self.limit.in_flight -= 1
+        self.limit.slots.release()
+
+
+def _discard(future):
+    """Clean up the losing attempt of a hedged call once it finishes."""
+    if future.exception() is not None:
+        return
+    result, release = future.result()
+    close = getattr(result, 'close', None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+    release()
+
+
+class CallScheduler:
+    """Shared gate for remote API calls: a token bucket and an in-flight cap per provider,
+    jittered exponential retries that honor Retry-After, and optional request hedging.
+    """
+
+    def __init__(self, hedge_workers=None):
+        self.providers = {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=hedge_workers or int(os.getenv('SCHEDULER_HEDGE_WORKERS', '16')),
+            thread_name_prefix='hedge',
+        )
+
+    def register(self, name, rate, burst, max_in_flight, max_retries, **kwargs):
+        self.providers[name] = ProviderLimit(name, rate, burst, max_in_flight, max_retries, **kwargs)
+
+    def stats(self):
+        return {
+            name: {
+                'rate': round(limit.bucket.rate, 3),
+                'in_flight': limit.in_flight,
+                'max_in_flight': limit.max_in_flight,
+                'retries': limit.retries,
+                'throttled': limit.throttled,
+            }
+            for name, limit in self.providers.items()
+        }
+
+    def call(self, provider, fn, hedge_after=None):
+        """Run fn() under provider's limits, retrying transient failures.
+
+        With hedge_after, a second identical attempt is started if the first has not finished
+        within that many seconds, and whichever succeeds first is returned.
+        """
+        result, release = self._call(self.providers[provider], fn, hedge_after)
+        release()
+        return result
+
+    def stream(self, provider, fn, hedge_after=None):
+        """Like call, for fn() returning a stream of chunks. The in-flight slot is held until the stream is consumed.
+
+        Only opening the stream is retried, so no chunk is ever delivered twice.
+        """
+        result, release = self._call(self.providers[provider], fn, hedge_after)
+        try:
+            yield from result
+        finally:
+            release()
+
+    def _call(self, limit, fn, hedge_after):
+        attempt = 0
+        while True:
+            try:
+                if hedge_after:
+                    return self._hedged(limit, fn, hedge_after)
+                return self._attempt(limit, fn)
+            except Exception as e:
+                delay = retry_delay(e, attempt, limit.base_delay, limit.max_delay)
+                if delay is None or attempt >= limit.max_retries:
+                    raise
+                attempt += 1
+                with limit.lock:
+                    limit.retries += 1
+                logger.warning(f"{limit.name} call failed ({e}), retry {attempt}/{limit.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _reserve(self, limit, block=True):
+        """Take an in-flight slot and a token. Returns their release, or None if block is False
+        and either is not available right away.
+        """
+        if not limit.slots.acquire(blocking=block):
+            return None
+        if block:
+            limit.bucket.acquire()
+        elif not limit.bucket.try_acquire():
+            limit.slots.release()
+            return None
+        with limit.lock:
+            limit.in_flight += 1
+        return _Release(limit)
+
+    def _attempt(self, limit, fn, release=None, dispatched=None):
+        """One attempt. Returns (result, release) with the in-flight slot still held.
+
+        release is a reservation already made by _reserve. dispatched is set once the attempt
+        has its slot and token, i.e. when the request is actually sent.
+        """
+        try:
+            release = release or self._reserve(limit)
+        finally:
+            if dispatched is not None:
+                dispatched.set()
+        try:
+            result = fn()
+        except Exception as e:
+            release()
+            if _status_code(e) == 429:
+                with limit.lock:
+                    limit.throttled += 1
+                limit.bucket.throttle(retry_after(e))
+            raise
+        limit.bucket.recover()
+        return result, release
+
+    def _hedged(self, limit, fn, hedge_after):
+        dispatched = threading.Event()
+        first = self.executor.submit(self._attempt, limit, fn, None, dispatched)
+        # The clock starts when the request is sent, not while it waits behind the rate limit
+        dispatched.wait()
+        if wait({first}, timeout=hedge_after).done:
+            return first.result()
+        # A hedge never waits for capacity: if the provider is throttled or at its in-flight
+        # cap, a second request would only add to the load
+        reserved = self._reserve(limit, block=False)
+        if reserved is None:
+            logger.info(f"{limit.name} call slower than {hedge_after}s, not hedging at the rate or in-flight limit")
+            return first.result()
+        logger.info(f"{limit.name} call slower than {hedge_after}s, sending a hedged request")
+        pending = {first, self.executor.submit(self._attempt, limit, fn, reserved)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in done if future.exception() is None), None)
+            if winner is not None:
+                for future in (done | pending) - {winner}:
+                    future.add_done_callback(_discard)
+                return winner.result()
+            error = next(iter(done)).exception()
+        raise error
+
+
+# Conversation calls are hedged after this many seconds; 0 disables hedging
+CHAT_HEDGE_AFTER = float(os.getenv('CHAT_HEDGE_AFTER', '5'))
+
+scheduler = CallScheduler()
+scheduler.register(
+    'groq',
+    rate=float(os.getenv('GROQ_RATE_LIMIT', '0.5')),
+    burst=int(os.getenv('GROQ_BURST', '10')),
+    max_in_flight=int(os.getenv('GROQ_MAX_IN_FLIGHT', '8')),
+    max_retries=int(os.getenv('GROQ_SCHEDULER_RETRIES', '4')),
+)
+scheduler.register(
+    'video_intelligence',
+    rate=float(os.getenv('VIDEO_RATE_LIMIT', '0.5')),
+    burst=int(os.getenv('VIDEO_BURST', '4')),
+    max_in_flight=int(os.getenv('VIDEO_MAX_IN_FLIGHT', '4')),
+    max_retries=int(os.getenv('VIDEO_SCHEDULER_RETRIES', '3')),
+    base_delay=2.0,
+    max_delay=60.0,
+)
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    def __init__(self, user, video_id, handler):
+        self.user = user
+        self.video_id = video_id
+        self.handler = handler
+        # Serializes turns within one conversation; different sessions run concurrently
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+        # updated_at of the stored copy this session was last synced with
+        self.synced_at = 0.0
+
+
+class SessionStore:
+    """Conversation sessions keyed by (user, video_id).
+
+    Live sessions are kept in an in-process LRU bounded by max_sessions and dropped after ttl
+    seconds of inactivity. Each session's system prompt, history and summary memory are written through to a
+    SQLite file shared by all workers, so a session evicted here or started on another worker
+    is resumed without rebuilding its prompt.
+    """
+
+    def __init__(self, handler_factory, max_sessions=None, ttl=None, path=None):
+        self.handler_factory = handler_factory
+        self.max_sessions = max_sessions or int(os.getenv('SESSION_MAX_SESSIONS', '1000'))
+        self.ttl = ttl or float(os.getenv('SESSION_TTL', str(2 * 3600)))
+        self.path = path or os.getenv('SESSION_DB_PATH', './sessions.db')
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    user TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    system_prompt TEXT NOT NULL,
+                    history TEXT NOT NULL,
+                    memory TEXT NOT NULL DEFAULT '',
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (user, video_id)
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, user, video_id):
+        """Return the live session for (user, video_id), resuming or starting it if needed.
+
+        Returns None if no analysis exists for video_id.
+        """
+        key = (user, video_id)
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            session = self.sessions.get(key)
+            if session is not None:
+                self.sessions.move_to_end(key)
+                session.last_used = now
+        if session is not None:
+            self._refresh(session)
+            return session
+
+        handler, synced_at = self._load(user, video_id, now)
+        if handler is None:
+            handler = self.handler_factory()
+            if handler.start_conversation(video_id) is None:
+                return None
+
+        with self.lock:
+            # Another request may have created it while we were loading
+            session = self.sessions.get(key)
+            if session is None:
+                session = Session(user, video_id, handler)
+                session.synced_at = synced_at
+                self.sessions[key] = session
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            self.sessions.move_to_end(key)
+            session.last_used = now
+            return session
+
+    def save(self, session):
+        """Write the session's prompt and history through to the shared store."""
+        handler = session.handler
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                (session.user, session.video_id, handler.system_prompt,
+                 json.dumps(handler.conversation_history), handler.memory, now)
+            )
+            conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+        session.synced_at = now
+
+    def set_system_prompt(self, video_id, system_prompt):
+        """Replace the system prompt of every session on video_id, e.g. after its analysis changed.
+
+        Sessions live on other workers pick the new prompt up on their next turn.
+        """
+        with self.lock:
+            sessions = [session for session in self.sessions.values() if session.video_id == video_id]
+        for session in sessions:
+            with session.lock:
+                session.handler.system_prompt = system_prompt
+        with self._connect() as conn:
+            conn.execute("UPDATE sessions SET system_prompt = ?, updated_at = ? WHERE video_id = ?",
+                         (system_prompt, time.time(), video_id))
+
+    def _fetch(self, user, video_id):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT system_prompt, history, memory, updated_at FROM sessions WHERE user = ? AND video_id = ?",
+                (user, video_id)
+            ).fetchone()
+
+    def _load(self, user, video_id, now):
+        row = self._fetch(user, video_id)
+        if row is None or now - row[3] > self.ttl:
+            return None, 0.0
+        handler = self.handler_factory()
+        handler.restore(video_id, row[0], json.loads(row[1]), row[2])
+        return handler, row[3]
+
+    def _refresh(self, session):
+        # Pick up turns another worker has saved since we last synced
+        row = self._fetch(session.user, session.video_id)
+        if row is not None and row[3] > session.synced_at:
+            with session.lock:
+                session.handler.restore(session.video_id, row[0], json.loads(row[1]), row[2])
+                session.synced_at = row[3]
+
+    def _expire(self, now):
+        while self.sessions:
+            key, session = next(iter(self.sessions.items()))
+            if now - session.last_used <= self.ttl:
+                break
+            del self.sessions[key]
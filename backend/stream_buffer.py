@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+
+class StreamBuffer:
+    """Chunks of one streamed completion, kept so a reconnecting client can resume from any offset."""
+
+    def __init__(self, stream_id):
+        self.id = stream_id
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.updated_at = time.time()
+        self.condition = threading.Condition()
+
+    def append(self, text):
+        with self.condition:
+            self.chunks.append(text)
+            self.updated_at = time.time()
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.updated_at = time.time()
+            self.condition.notify_all()
+
+    def text(self):
+        with self.condition:
+            return "".join(self.chunks)
+
+    def iter_from(self, offset=0, timeout=30):
+        """Yield (index, chunk) from offset on, waiting for new chunks until the stream finishes.
+
+        Yields (index, None) as a heartbeat when nothing arrived within timeout seconds.
+        """
+        index = offset
+        while True:
+            with self.condition:
+                if index >= len(self.chunks) and not self.done:
+                    self.condition.wait(timeout)
+                pending = self.chunks[index:]
+                done = self.done
+            for chunk in pending:
+                yield index, chunk
+                index += 1
+            if done and index >= len(self.chunks):
+                return
+            if not pending:
+                yield index, None
+
+
+class StreamRegistry:
+    """Live and recently finished streams. Finished streams are evicted by age and count.
+
+    Live streams are never evicted: their job or chat request still writes to them, and those are
+    bounded by the job queue and the request workers.
+    """
+
+    def __init__(self, max_streams=None, ttl=None):
+        self.max_streams = max_streams or int(os.getenv('STREAM_MAX_STREAMS', '1000'))
+        self.ttl = ttl or float(os.getenv('STREAM_TTL', '600'))
+        self.streams = OrderedDict()
+        self.lock = threading.Lock()
+
+    def create(self):
+        stream = StreamBuffer(uuid.uuid4().hex)
+        with self.lock:
+            self._evict()
+            self.streams[stream.id] = stream
+        return stream
+
+    def get(self, stream_id):
+        with self.lock:
+            return self.streams.get(stream_id)
+
+    def _evict(self):
+        now = time.time()
+        # Oldest first, skipping live streams
+        for stream_id in [stream_id for stream_id, stream in self.streams.items() if stream.done]:
+            expired = now - self.streams[stream_id].updated_at > self.ttl
+            if expired or len(self.streams) >= self.max_streams:
+                del self.streams[stream_id]
+
+
+def sse_events(stream, offset=0):
+    """Server-sent events for a stream. Event ids are chunk offsets, usable as Last-Event-ID on reconnect."""
+    yield f"event: stream\ndata: {json.dumps({'stream_id': stream.id})}\n\n"
+    for index, chunk in stream.iter_from(offset):
+        if chunk is None:
+            # Comment line keeps proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+            continue
+        yield f"id: {index + 1}\ndata: {json.dumps({'delta': chunk})}\n\n"
+    if stream.error:
+        yield f"event: error\ndata: {json.dumps({'error': stream.error})}\n\n"
+    else:
+        yield f"event: done\ndata: {json.dumps({'length': len(stream.text())})}\n\n"
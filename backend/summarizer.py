@@ -0,0 +1,238 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from annotation_store import format_timestamp
+from compaction import compact_text
+from clients import get_groq_client
+from scheduler import scheduler
+from token_budget import estimate_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+MODEL = "mixtral-8x7b-32768"
+# Bump when a prompt changes so cached summaries written by the old prompt are not reused
+PROMPT_VERSION = "1"
+
+# Videos whose sections fit in this many tokens are summarized in one call
+DIRECT_TOKENS = int(os.getenv('SUMMARY_DIRECT_TOKENS', '6000'))
+# Target window length; windows end on the first shot boundary after it
+WINDOW_SECONDS = float(os.getenv('SUMMARY_WINDOW_SECONDS', '120'))
+WINDOW_TOKENS = int(os.getenv('SUMMARY_WINDOW_TOKENS', '4000'))
+WINDOW_SUMMARY_TOKENS = int(os.getenv('SUMMARY_WINDOW_SUMMARY_TOKENS', '300'))
+# Window summaries are reduced in groups until they fit in one final prompt of this size
+REDUCE_TOKENS = int(os.getenv('SUMMARY_REDUCE_TOKENS', '6000'))
+WORKERS = int(os.getenv('SUMMARY_WORKERS', '4'))
+
+ANALYSIS_PROMPT = """You are a video consultant tasked with describing and analyzing a video based on provided analysis data. Your goal is to create a comprehensive description of the video's content and conclude with its main story.
+
+Here is the video analysis data:
+<video_analysis>
+{video_analysis}
+</video_analysis>
+
+Based on this data, please provide:
+1. A detailed description of the video's content, including:
+   - Main objects and people detected
+   - Key actions and events
+   - Any text or speech detected
+   - Descriptions of different scenes or shots
+2. An analysis of the video's main theme or story
+3. Any notable or interesting observations about the video
+
+Please be as specific and detailed as possible in your description and analysis.
+"""
+
+WINDOW_PROMPT = """Summarize what happens in this part of a video from its annotations. Mention people, objects, actions and anything said, with times. Reply with the summary only.
+
+<annotations>
+{annotations}
+</annotations>"""
+
+REDUCE_PROMPT = """Combine these consecutive summaries of parts of a video into one summary of the whole span. Keep times, people, objects, actions and speech. Reply with the summary only.
+
+{summaries}"""
+
+
+def digest(*parts):
+    hasher = hashlib.sha256()
+    for part in (PROMPT_VERSION, MODEL) + parts:
+        hasher.update(str(part).encode("utf-8"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+class SummaryCache:
+    """Completions keyed by a hash of their prompt, evicted least recently used first."""
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or os.getenv('SUMMARY_CACHE_PATH', './summary_cache.db')
+        self.max_entries = max_entries or int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', '20000'))
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    key TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE summaries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, summary):
+        with self.lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO summaries (key, summary, accessed_at) VALUES (?, ?, ?)",
+                         (key, summary, time.time()))
+            conn.execute(
+                "DELETE FROM summaries WHERE key IN "
+                "(SELECT key FROM summaries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+
+def shot_windows(rows, window_seconds=WINDOW_SECONDS):
+    """Cut the timeline into (start, end) windows of about window_seconds, ending on shot boundaries.
+
+    Boundaries depend only on the shots, so adding another feature to a video later leaves the
+    windows where they were. Without shots the timeline is cut every window_seconds.
+    """
+    end_of_video = max((row[3] for row in rows), default=0.0)
+    shot_ends = sorted({row[3] for row in rows if row[0] == "shot"})
+    if not shot_ends:
+        shot_ends = [min(window_seconds * (i + 1), end_of_video) for i in range(int(end_of_video // window_seconds) + 1)]
+
+    windows = []
+    start = 0.0
+    for boundary in shot_ends:
+        if boundary - start >= window_seconds:
+            windows.append((start, boundary))
+            start = boundary
+    if start < end_of_video or not windows:
+        windows.append((start, max(end_of_video, start)))
+    return windows
+
+
+class Summarizer:
+    """Summarizes a video's annotations with Groq, map-reduce style for long videos.
+
+    Short videos get one call over the formatted sections, as before. Longer ones are cut into
+    windows at shot boundaries; windows are summarized in parallel, the window summaries are
+    reduced in groups until they fit, and the final analysis is written from them. Every
+    completion is cached by a hash of its prompt, so re-summarizing after a feature is added
+    only calls Groq for the windows whose annotations changed, plus the reduce steps above them.
+    """
+
+    def __init__(self, client, cache=None, workers=None):
+        self.client = client
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers or WORKERS, thread_name_prefix='summarize')
+
+    def summarize(self, documents, rows=None, on_delta=None):
+        """Final analysis from the formatted section documents, using the timeline rows for long videos.
+
+        rows are (kind, name, start, end, confidence) annotation rows, as from VideoAnnotations.rows().
+        """
+        video_analysis = "\n\n".join(documents)
+        if rows is None or estimate_tokens(video_analysis) <= DIRECT_TOKENS:
+            return self.complete(ANALYSIS_PROMPT.format(video_analysis=video_analysis), 8192, on_delta)
+
+        rows = sorted(rows, key=lambda row: (row[2], row[0], row[1]))
+        windows = shot_windows(rows)
+        grouped = [[] for _ in windows]
+        starts = [start for start, _ in windows]
+        index = 0
+        for row in rows:
+            while index + 1 < len(starts) and row[2] >= starts[index + 1]:
+                index += 1
+            grouped[index].append(row)
+
+        prompts = [
+            WINDOW_PROMPT.format(annotations=truncate_to_tokens(compact_text(window_rows), WINDOW_TOKENS))
+            for window_rows in grouped if window_rows
+        ]
+        spans = [window for window, window_rows in zip(windows, grouped) if window_rows]
+        logger.info(f"Summarizing {len(prompts)} windows")
+        summaries = list(self.executor.map(lambda prompt: self.complete(prompt, WINDOW_SUMMARY_TOKENS), prompts))
+        parts = [
+            f"{format_timestamp(start)} to {format_timestamp(end)}:\n{summary}"
+            for (start, end), summary in zip(spans, summaries)
+        ]
+
+        while estimate_tokens("\n\n".join(parts)) > REDUCE_TOKENS and len(parts) > 1:
+            parts = self._reduce(parts)
+
+        return self.complete(ANALYSIS_PROMPT.format(video_analysis="\n\n".join(parts)), 8192, on_delta)
+
+    def _reduce(self, parts):
+        """One reduce level: merge consecutive parts in groups that fit the reduce budget."""
+        groups = [[]]
+        for part in parts:
+            if groups[-1] and estimate_tokens("\n\n".join(groups[-1] + [part])) > REDUCE_TOKENS:
+                groups.append([])
+            groups[-1].append(part)
+        if len(groups) == len(parts):
+            # Every part is too big on its own; pair them up so the loop still shrinks
+            groups = [parts[i:i + 2] for i in range(0, len(parts), 2)]
+        prompts = [REDUCE_PROMPT.format(summaries="\n\n".join(group)) for group in groups]
+        return list(self.executor.map(lambda prompt: self.complete(prompt, WINDOW_SUMMARY_TOKENS * 2), prompts))
+
+    def complete(self, prompt, max_tokens, on_delta=None):
+        """One cached completion. Cached text is passed to on_delta in one piece."""
+        key = digest(prompt, max_tokens)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached)
+            return cached
+
+        def create():
+            return self.client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=MODEL,
+                max_tokens=max_tokens,
+                temperature=0,
+                top_p=0.95,
+                stream=on_delta is not None,
+            )
+
+        if on_delta is not None:
+            pieces = []
+            for chunk in scheduler.stream('groq', create):
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    pieces.append(delta)
+                    on_delta(delta)
+            text = "".join(pieces)
+        else:
+            text = scheduler.call('groq', create).choices[0].message.content
+
+        if self.cache is not None:
+            self.cache.put(key, text)
+        return text
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_summarizer():
+    """The process-wide Summarizer, with a persistent SummaryCache."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Summarizer(get_groq_client(), SummaryCache())
+        return _default
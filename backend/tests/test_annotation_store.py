@@ -0,0 +1,129 @@
+import random
+import threading
+
+import pytest
+
+from annotation_store import KINDS, AnnotationStore, VideoAnnotations, parse_time_range
+
+
+def random_rows(count, seed):
+    rng = random.Random(seed)
+    names = ["Car", "car", "Person", "Dog", "Tree", "hello"]
+    rows = []
+    for _ in range(count):
+        start = round(rng.uniform(0, 300), 2)
+        rows.append((rng.choice(KINDS), rng.choice(names), start, round(start + rng.expovariate(1 / 20), 2),
+                     round(rng.random(), 4)))
+    return rows
+
+
+def brute_force(rows, start, end, kinds=None, min_confidence=0.0):
+    return sorted(
+        (row for row in rows
+         if row[2] <= end and row[3] >= start and (not kinds or row[0] in kinds) and row[4] >= min_confidence),
+        key=lambda row: (row[2], row[3], row[1]),
+    )
+
+
+def as_tuples(results):
+    return sorted(((r["kind"], r["name"], r["start"], r["end"], r["confidence"]) for r in results),
+                  key=lambda row: (row[2], row[3], row[1]))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_query_matches_brute_force(seed):
+    rows = random_rows(300, seed)
+    annotations = VideoAnnotations.from_rows(rows)
+    rng = random.Random(seed)
+    for _ in range(50):
+        start = rng.uniform(0, 320)
+        end = start + rng.choice([0, rng.uniform(0, 60)])
+        kinds = rng.choice([None, ["label"], ["face", "word"]])
+        min_confidence = rng.choice([0.0, 0.5])
+        result = annotations.query(start, end, kinds, min_confidence)
+        assert [r["start"] for r in result] == sorted(r["start"] for r in result)
+        assert as_tuples(result) == brute_force(rows, start, end, kinds, min_confidence)
+
+
+def test_query_on_no_rows():
+    assert VideoAnnotations.from_rows([]).query(0, 10) == []
+
+
+def test_find_is_case_insensitive_and_time_bounded():
+    rows = random_rows(200, 7)
+    annotations = VideoAnnotations.from_rows(rows)
+
+    found = annotations.find("CAR", 50, 100)
+    expected = [row for row in brute_force(rows, 50, 100) if row[1].lower() == "car"]
+    assert as_tuples(found) == expected
+    assert annotations.find("unicorn") == []
+
+
+def test_bytes_round_trip():
+    annotations = VideoAnnotations.from_rows(random_rows(50, 3))
+    restored = VideoAnnotations.from_bytes(annotations.to_bytes())
+
+    assert restored.name_table == annotations.name_table
+    assert restored.query() == annotations.query()
+    assert restored.query(10, 20) == annotations.query(10, 20)
+
+
+def test_store_reads_back_what_it_saved(tmp_path):
+    store = AnnotationStore(str(tmp_path), max_cached=1)
+    store.save("first", VideoAnnotations.from_rows(random_rows(10, 1)))
+    store.save("second", VideoAnnotations.from_rows(random_rows(20, 2)))
+
+    assert list(store.cache) == ["second"]
+    assert len(store.get("first")) == 10
+    assert len(AnnotationStore(str(tmp_path)).get("second")) == 20
+    assert store.get("missing") is None
+
+
+def test_concurrent_updates_keep_every_writer_rows(tmp_path):
+    store = AnnotationStore(str(tmp_path))
+    barrier = threading.Barrier(8)
+
+    def merge_in(i):
+        def merge(current):
+            rows = list(current.rows()) if current is not None else []
+            return VideoAnnotations.from_rows(rows + [("label", f"label{i}", float(i), float(i + 1), 1.0)])
+
+        barrier.wait()
+        store.update("video", merge)
+
+    threads = [threading.Thread(target=merge_in, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(store.get("video")) == 8
+    assert len(AnnotationStore(str(tmp_path)).get("video")) == 8
+    assert [name for name in tmp_path.iterdir() if name.suffix == ".tmp"] == []
+
+
+@pytest.mark.parametrize("text, duration, expected", [
+    ("what happens in the first 30 seconds?", None, (0.0, 30.0, True)),
+    ("what happens in the first minute?", None, (0.0, 60.0, True)),
+    ("what happens between 10 and 20 seconds?", None, (10.0, 20.0, True)),
+    ("what happens from 1:00 to 1:30?", None, (60.0, 90.0, True)),
+    ("who is there at 02:13?", None, (133.0, 133.0, True)),
+    ("what is said at 133s?", None, (133.0, 133.0, True)),
+    ("what happens around 45 seconds?", None, (40.0, 50.0, False)),
+    ("what happens after 2 minutes?", 300.0, (120.0, 300.0, False)),
+    ("what happens before 00:30?", None, (0.0, 30.0, False)),
+    ("compare 00:10 and 00:50", None, (10.0, 50.0, False)),
+    ("what happens in the last 10 seconds?", 100.0, (90.0, 100.0, True)),
+    ("what happens in the last 10 seconds?", None, None),
+    ("does it look like the 1990s?", None, None),
+    ("are there between 2 and 3 people?", None, None),
+    ("describe the video", None, None),
+    ("who is there at 02:13?", 250.0, (133.0, 133.0, True)),
+    ("who came at 12:30 pm?", 250.0, None),
+    ("who came at 9am?", None, None),
+    ("what happens from 9:00 to 9:30 am?", None, None),
+    ("who is there at 14:05?", 250.0, None),
+    ("what happens after 2 minutes?", 100.0, None),
+])
+def test_parse_time_range(text, duration, expected):
+    assert parse_time_range(text, duration) == expected
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from chunking import window_entries
+
+
+def texts(windows):
+    return [(start, end, [text for _, _, text in items]) for start, end, items in windows]
+
+
+def brute_force(entries, window, overlap):
+    step = window - overlap
+    last = max(end for _, end, _ in entries)
+    windows = []
+    window_start = 0.0
+    while window_start <= last:
+        window_end = window_start + window
+        inside = [entry for entry in entries
+                  if entry[0] < window_end and (entry[1] > window_start or entry[0] >= window_start)]
+        if inside:
+            windows.append((window_start, window_end, sorted(inside, key=lambda entry: entry[0])))
+        window_start += step
+    return windows
+
+
+def test_entries_land_in_overlapping_windows():
+    entries = [(1.0, 2.0, "a"), (27.0, 28.0, "b"), (40.0, 41.0, "c")]
+
+    assert texts(window_entries(entries, 30, 5)) == [(0.0, 30.0, ["a", "b"]), (25.0, 55.0, ["b", "c"])]
+
+
+def test_empty_stretches_are_skipped():
+    windows = window_entries([(0.0, 1.0, "a"), (410.0, 411.0, "b")], 30, 5)
+
+    assert [(start, end) for start, end, _ in windows] == [(0.0, 30.0), (400.0, 430.0)]
+
+
+def test_no_entries_no_windows():
+    assert list(window_entries([], 30, 5)) == []
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_windows_match_brute_force(seed):
+    rng = random.Random(seed)
+    entries = []
+    for i in range(rng.randint(1, 40)):
+        start = rng.choice([rng.uniform(0, 100), rng.uniform(400, 500)])
+        entries.append((start, start + rng.choice([0, rng.uniform(0, 10), rng.uniform(0, 200)]), i))
+
+    assert list(window_entries(entries, 30, 5)) == brute_force(entries, 30, 5)
+
+
+def test_long_entry_is_in_every_window_it_spans():
+    windows = window_entries([(10.0, 200.0, "car")], 30, 5)
+    assert [start for start, _, _ in windows] == [0, 25, 50, 75, 100, 125, 150, 175]
@@ -0,0 +1,167 @@
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from botocore.exceptions import ClientError
+
+from footage_store import FootageStore, FootageWriter, UserNotFoundError, decode_cursor, encode_cursor, ensure_table
+
+
+@pytest.fixture
+def dynamodb(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        yield boto3.resource("dynamodb")
+
+
+@pytest.fixture
+def users(dynamodb):
+    table = dynamodb.create_table(
+        TableName="footagedb",
+        KeySchema=[{"AttributeName": "email", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "email", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    table.put_item(Item={"email": "a@example.com"})
+    return table
+
+
+@pytest.fixture
+def store(dynamodb, users):
+    return FootageStore(ensure_table(dynamodb, "footage"), users_table=users)
+
+
+def test_ensure_table_is_idempotent(dynamodb):
+    first = ensure_table(dynamodb, "footage")
+    second = ensure_table(dynamodb, "footage")
+    assert first.name == second.name == "footage"
+
+
+def test_add_stores_record_analysis_and_bumps_version(store):
+    record = store.add("a@example.com", "door", name="Front", analysis="x" * 500, video_id="video_1")
+
+    assert record["label"] == "door"
+    assert record["video_id"] == "video_1"
+    assert len(record["preview"]) < 500
+    assert store.get_analysis("a@example.com", record["footage_id"]) == "x" * 500
+    assert store.version("a@example.com") == 1
+
+
+def test_add_without_analysis_writes_no_analysis_item(store):
+    record = store.add("a@example.com", "door")
+    assert "preview" not in record
+    assert store.get_analysis("a@example.com", record["footage_id"]) is None
+
+
+def test_add_for_unknown_user_writes_nothing(store):
+    with pytest.raises(UserNotFoundError):
+        store.add("nobody@example.com", "door", analysis="text")
+    assert store.list("nobody@example.com") == ([], None)
+    assert store.version("nobody@example.com") == 0
+
+
+def test_list_is_newest_first_and_pages_with_cursor(store):
+    for i in range(5):
+        store.add("a@example.com", f"label{i}", upload_date=f"2024-01-0{i + 1}T00:00:00")
+
+    first, cursor = store.list("a@example.com", limit=2)
+    assert [item["label"] for item in first] == ["label4", "label3"]
+    assert cursor is not None
+
+    second, cursor = store.list("a@example.com", limit=2, cursor=cursor)
+    third, cursor = store.list("a@example.com", limit=2, cursor=cursor)
+    assert [item["label"] for item in second + third] == ["label2", "label1", "label0"]
+    assert cursor is None
+
+
+def test_list_never_returns_analysis_and_projects_fields(store):
+    store.add("a@example.com", "door", name="Front", analysis="full analysis")
+
+    items, _ = store.list("a@example.com")
+    assert "analysis" not in items[0]
+    assert items[0]["preview"] == "full analysis"
+
+    items, _ = store.list("a@example.com", fields=["label"])
+    assert set(items[0]) == {"footage_id", "label"}
+
+    with pytest.raises(ValueError):
+        store.list("a@example.com", fields=["analysis"])
+
+
+def test_cursor_of_another_user_is_rejected(store):
+    cursor = encode_cursor({"email": "b@example.com", "sk": "FOOTAGE#2024"})
+    with pytest.raises(ValueError):
+        store.list("a@example.com", cursor=cursor)
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+def test_set_analysis_rewrites_analysis_and_preview(store):
+    record = store.add("a@example.com", "door", analysis="quick analysis", video_id="video_1")
+    store.set_analysis("a@example.com", record["footage_id"], record["upload_date"], "full analysis")
+
+    assert store.get_analysis("a@example.com", record["footage_id"]) == "full analysis"
+    assert store.list("a@example.com")[0][0]["preview"] == "full analysis"
+    assert store.version("a@example.com") == 2
+
+
+def test_set_analysis_of_missing_record_writes_nothing(store):
+    with pytest.raises(ClientError):
+        store.set_analysis("a@example.com", "missing", "2024-01-01T00:00:00", "analysis")
+    assert store.get_analysis("a@example.com", "missing") is None
+    assert store.version("a@example.com") == 0
+
+
+def test_add_many_skips_unknown_users(store):
+    records = store.add_many([
+        {"email": "a@example.com", "label": "one", "analysis": "text"},
+        {"email": "nobody@example.com", "label": "two"},
+    ])
+
+    assert records[0]["label"] == "one"
+    assert records[1] is None
+    assert len(store.list("a@example.com")[0]) == 1
+    assert store.list("nobody@example.com") == ([], None)
+    assert store.version("a@example.com") == 1
+    assert store.version("nobody@example.com") == 0
+
+
+def test_writer_resolves_futures_per_record(store):
+    writer = FootageWriter(store, interval=0.05)
+    stored = writer.submit("a@example.com", "door", analysis="text")
+    missing = writer.submit("nobody@example.com", "door")
+
+    assert stored.result(timeout=10)["label"] == "door"
+    with pytest.raises(UserNotFoundError):
+        missing.result(timeout=10)
+
+
+def test_writer_resubmission_overwrites_the_record(store):
+    writer = FootageWriter(store, interval=0.05)
+    for analysis in ("first", "second"):
+        writer.submit("a@example.com", "door", analysis=analysis, footage_id="job-1",
+                      upload_date="2024-01-01T00:00:00").result(timeout=10)
+
+    items, _ = store.list("a@example.com")
+    assert [item["footage_id"] for item in items] == ["job-1"]
+    assert store.get_analysis("a@example.com", "job-1") == "second"
+
+
+def test_migrate_user_moves_legacy_list_and_can_be_rerun(store, users):
+    legacy = [
+        {"label": "old", "name": "Back", "analysis": "first", "upload_date": "2023-05-01T00:00:00"},
+        {"label": "older", "analysis": "second", "upload_date": "2023-04-01T00:00:00"},
+    ]
+    users.put_item(Item={"email": "a@example.com", "footage": legacy})
+
+    assert store.migrate_user(users, "a@example.com", legacy) == 2
+    # Interrupted after the copy but before the legacy list was removed: the rerun writes the same ids
+    assert store.migrate_user(users, "a@example.com", legacy) == 2
+
+    items, _ = store.list("a@example.com")
+    assert [item["label"] for item in items] == ["old", "older"]
+    assert store.get_analysis("a@example.com", items[0]["footage_id"]) == "first"
+    assert "footage" not in users.get_item(Key={"email": "a@example.com"})["Item"]
@@ -0,0 +1,85 @@
+import hashlib
+import io
+import os
+
+from ingest import LocalObjectStore, annotation_input, copy_stream, get_object_store, hash_file, save_upload
+
+
+class NoReadInto:
+    """A stream with read() only, like some upload wrappers."""
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+
+class RecordingStore(LocalObjectStore):
+    """A local store that reports itself as GCS, to take the upload branch of annotation_input."""
+
+    scheme = 'gs'
+
+
+def test_copy_stream_goes_through_small_chunks():
+    data = os.urandom(10_000)
+    for src in (io.BytesIO(data), NoReadInto(data)):
+        dst = io.BytesIO()
+        hasher = hashlib.sha256()
+        assert copy_stream(src, dst, chunk_size=333, hasher=hasher) == len(data)
+        assert dst.getvalue() == data
+        assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_save_upload_writes_and_hashes(tmp_path):
+    data = os.urandom(5000)
+    path = str(tmp_path / "upload.mp4")
+
+    size, digest = save_upload(io.BytesIO(data), path, chunk_size=1024)
+    assert size == len(data)
+    assert digest == hashlib.sha256(data).hexdigest() == hash_file(path, chunk_size=100)
+    with open(path, "rb") as file:
+        assert file.read() == data
+
+
+def test_local_store_round_trip(tmp_path):
+    source = tmp_path / "video.mp4"
+    source.write_bytes(b"video bytes")
+    store = LocalObjectStore(str(tmp_path / "objects"))
+
+    uri = store.put_file(str(source))
+    assert uri.startswith("file://") and uri.endswith("_video.mp4")
+    with store.open(uri) as file:
+        assert file.read() == b"video bytes"
+    store.delete(uri)
+    store.delete(uri)
+    assert os.listdir(store.root) == []
+
+
+def test_get_object_store(tmp_path, monkeypatch):
+    monkeypatch.delenv('VIDEO_STORAGE_URI', raising=False)
+    assert get_object_store() is None
+    assert get_object_store(f"file://{tmp_path}/a").root == str(tmp_path / "a")
+    assert get_object_store(str(tmp_path / "b")).scheme == 'file'
+
+
+def test_annotation_input_sends_bytes_inline_without_gcs(tmp_path):
+    source = tmp_path / "video.mp4"
+    source.write_bytes(b"video bytes")
+    store = LocalObjectStore(str(tmp_path / "objects"))
+
+    assert annotation_input(str(source)) == ({"input_content": b"video bytes"}, None)
+    assert annotation_input(str(source), store) == ({"input_content": b"video bytes"}, None)
+    # Nothing is uploaded that Video Intelligence could not read anyway
+    assert os.listdir(store.root) == []
+
+
+def test_annotation_input_sends_only_the_uri_with_gcs(tmp_path):
+    source = tmp_path / "video.mp4"
+    source.write_bytes(b"video bytes")
+    store = RecordingStore(str(tmp_path / "objects"))
+
+    video_input, uri = annotation_input(str(source), store)
+    assert video_input == {"input_uri": uri}
+    with store.open(uri) as file:
+        assert file.read() == b"video bytes"
@@ -0,0 +1,121 @@
+import sqlite3
+import time
+
+import pytest
+
+from ingest import LocalObjectStore
+from journal import ANNOTATED, FAILED, FINISHED, JobJournal, STARTED, reached
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+def test_begin_is_idempotent_and_keeps_the_video_id(path):
+    journal = JobJournal(path)
+    job = journal.begin("job-1", {"label": "door"})
+
+    assert job["stage"] == STARTED
+    assert job["params"] == {"label": "door"}
+    assert journal.begin("job-1", {"label": "other"})["video_id"] == job["video_id"]
+
+
+def test_advance_stores_artifacts(path):
+    journal = JobJournal(path)
+    journal.begin("job-1")
+    journal.advance("job-1", ANNOTATED, raw=b"\x00\x01", sections={"labels": "car"})
+
+    job = journal.get("job-1")
+    assert reached(job, ANNOTATED) and not reached(job, FINISHED)
+    assert journal.artifact("job-1", "raw", raw=True) == b"\x00\x01"
+    assert journal.artifact("job-1", "sections") == {"labels": "car"}
+    assert journal.artifact("job-1", "missing") is None
+
+
+def test_bytes_artifacts_go_to_the_store(path, tmp_path):
+    store = LocalObjectStore(str(tmp_path / "objects"))
+    journal = JobJournal(path, store=store)
+    journal.begin("job-1")
+    journal.advance("job-1", ANNOTATED, raw=b"\x00" * 1000, sections={"labels": "car"})
+    # A repeated stage overwrites its upload
+    journal.advance("job-1", ANNOTATED, raw=b"\x01" * 1000, sections={"labels": "car"})
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT length(data) FROM artifacts WHERE name = 'raw'").fetchone() == (0,)
+    assert len(list((tmp_path / "objects").iterdir())) == 1
+    assert JobJournal(path, store=store).artifact("job-1", "raw", raw=True) == b"\x01" * 1000
+    assert journal.artifact("job-1", "sections") == {"labels": "car"}
+
+    journal.finish("job-1", {"analysis": "text"})
+    assert list((tmp_path / "objects").iterdir()) == []
+
+
+def test_finish_drops_artifacts_and_keeps_the_result(path):
+    journal = JobJournal(path)
+    journal.begin("job-1")
+    journal.advance("job-1", ANNOTATED, sections={})
+    journal.finish("job-1", {"analysis": "text"})
+
+    job = journal.get("job-1")
+    assert job["stage"] == FINISHED
+    assert job["result"] == {"analysis": "text"}
+    assert journal.artifact("job-1", "sections") is None
+
+
+def test_live_jobs_are_not_claimed(path):
+    owner = JobJournal(path, lease=60)
+    owner.begin("job-1")
+
+    assert JobJournal(path, lease=60).claim_orphans() == []
+
+
+def test_lapsed_lease_is_claimed_once(path):
+    owner = JobJournal(path, lease=0.05)
+    owner.begin("job-1")
+    owner.advance("job-1", ANNOTATED)
+    time.sleep(0.1)
+
+    other = JobJournal(path, lease=0.05)
+    claimed = other.claim_orphans()
+    assert [job["job_id"] for job in claimed] == ["job-1"]
+    assert claimed[0]["stage"] == ANNOTATED
+    # The claim renewed the lease
+    assert JobJournal(path, lease=0.05).claim_orphans() == []
+
+
+def test_closed_jobs_are_never_claimed(path):
+    journal = JobJournal(path, lease=0.05)
+    journal.begin("job-1")
+    journal.begin("job-2")
+    journal.finish("job-1")
+    journal.fail("job-2", "boom")
+    time.sleep(0.1)
+
+    assert JobJournal(path, lease=0.05).claim_orphans() == []
+    assert journal.get("job-2")["stage"] == FAILED
+    assert journal.get("job-2")["error"] == "boom"
+
+
+def test_released_job_is_claimed_again(path):
+    journal = JobJournal(path, lease=60)
+    journal.begin("job-1")
+    journal.release("job-1")
+
+    assert [job["job_id"] for job in JobJournal(path, lease=60).claim_orphans()] == ["job-1"]
+
+
+def test_journal_without_result_and_uri_columns_is_migrated(path):
+    with sqlite3.connect(path) as conn:
+        conn.execute("""CREATE TABLE jobs (job_id TEXT PRIMARY KEY, video_id TEXT NOT NULL, stage TEXT NOT NULL,
+                        params TEXT NOT NULL, error TEXT, owner TEXT NOT NULL, heartbeat_at REAL NOT NULL,
+                        created_at REAL NOT NULL, updated_at REAL NOT NULL)""")
+        conn.execute("CREATE TABLE artifacts (job_id TEXT NOT NULL, name TEXT NOT NULL, data BLOB NOT NULL, "
+                     "PRIMARY KEY (job_id, name))")
+    journal = JobJournal(path)
+    journal.begin("job-1")
+    journal.advance("job-1", ANNOTATED, raw=b"\x00")
+    assert journal.artifact("job-1", "raw", raw=True) == b"\x00"
+    journal.finish("job-1", [1, 2])
+
+    assert journal.get("job-1")["result"] == [1, 2]
@@ -0,0 +1,51 @@
+import numpy as np
+
+from response_cache import ResponseCache
+
+
+def embed(texts):
+    """Letter counts: close enough for reworded questions, with no model to load."""
+    vectors = []
+    for text in texts:
+        vector = np.zeros(26, dtype=np.float32)
+        for char in text:
+            if "a" <= char <= "z":
+                vector[ord(char) - ord("a")] += 1
+        vectors.append(vector)
+    return vectors
+
+
+def test_hits_reworded_questions_but_not_other_times(tmp_path):
+    cache = ResponseCache(embed, threshold=0.9, path=str(tmp_path / "responses.db"))
+    answer, key = cache.lookup("video_1", "What happens at 1:00?")
+    assert answer is None
+    cache.put(key, "a car drives by")
+
+    assert cache.lookup("video_1", "what happens at 1:00")[0] == "a car drives by"
+    assert cache.lookup("video_1", "What's happening at 1:00?")[0] == "a car drives by"
+    assert cache.lookup("video_1", "What happens at 2:00?")[0] is None
+    assert cache.lookup("video_2", "What happens at 1:00?")[0] is None
+    assert cache.lookup("video_1", "What does she do then?") == (None, None)
+
+
+def test_invalidate_reaches_other_workers(tmp_path):
+    path = str(tmp_path / "responses.db")
+    worker, other_worker = ResponseCache(embed, path=path), ResponseCache(embed, path=path)
+    for cache in (worker, other_worker):
+        _, key = cache.lookup("video_1", "Is there a dog?")
+        cache.put(key, "no")
+
+    assert worker.invalidate("video_1") == 1
+    assert worker.lookup("video_1", "Is there a dog?")[0] is None
+    assert other_worker.lookup("video_1", "Is there a dog?")[0] is None
+    assert other_worker.lookup("video_1", "is there a dog")[0] is None
+
+
+def test_answer_generated_across_an_invalidation_is_not_stored(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(embed, path=path)
+    _, key = cache.lookup("video_1", "Is there a dog?")
+    ResponseCache(embed, path=path).invalidate("video_1")
+    cache.put(key, "no")
+
+    assert cache.lookup("video_1", "Is there a dog?")[0] is None
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import CallScheduler
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+class CountingCall:
+    """fn() for the scheduler: sleeps, then fails while failures remain, and counts the requests sent."""
+
+    def __init__(self, delay=0.0, failures=0, error=APIConnectionError):
+        self.delay = delay
+        self.failures = failures
+        self.error = error
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.requests += 1
+            fail = self.failures > 0
+            self.failures -= 1
+        time.sleep(self.delay)
+        if fail:
+            raise self.error("boom")
+        return "ok"
+
+
+def make_scheduler(rate=100, burst=100, max_in_flight=8, max_retries=3):
+    scheduler = CallScheduler(hedge_workers=8)
+    scheduler.register("test", rate, burst, max_in_flight, max_retries, base_delay=0.001, max_delay=0.01)
+    return scheduler
+
+
+def test_retryable_error_is_retried():
+    scheduler = make_scheduler()
+    fn = CountingCall(failures=2)
+
+    assert scheduler.call("test", fn) == "ok"
+    assert fn.requests == 3
+    assert scheduler.stats()["test"]["retries"] == 2
+    assert scheduler.stats()["test"]["in_flight"] == 0
+
+
+def test_retries_stop_at_max_retries():
+    scheduler = make_scheduler(max_retries=2)
+    fn = CountingCall(failures=10)
+
+    with pytest.raises(APIConnectionError):
+        scheduler.call("test", fn)
+    assert fn.requests == 3
+
+
+def test_other_errors_are_not_retried():
+    scheduler = make_scheduler()
+    fn = CountingCall(failures=1, error=ValueError)
+
+    with pytest.raises(ValueError):
+        scheduler.call("test", fn)
+    assert fn.requests == 1
+    assert scheduler.stats()["test"]["in_flight"] == 0
+
+
+def test_slow_call_is_hedged():
+    scheduler = make_scheduler()
+    fn = CountingCall(delay=0.3)
+
+    assert scheduler.call("test", fn, hedge_after=0.05) == "ok"
+    assert fn.requests == 2
+
+
+def test_fast_call_is_not_hedged():
+    scheduler = make_scheduler()
+    fn = CountingCall(delay=0.0)
+
+    assert scheduler.call("test", fn, hedge_after=0.2) == "ok"
+    assert fn.requests == 1
+
+
+def test_waiting_behind_the_rate_limit_does_not_trigger_hedges():
+    # One token every 0.2s: the later calls queue longer than hedge_after before they are sent
+    scheduler = make_scheduler(rate=5, burst=1)
+    fn = CountingCall(delay=0.02)
+    threads = [threading.Thread(target=scheduler.call, args=("test", fn), kwargs={"hedge_after": 0.1})
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fn.requests == 3
+
+
+def test_no_hedge_at_the_in_flight_limit():
+    scheduler = make_scheduler(max_in_flight=1)
+    fn = CountingCall(delay=0.2)
+
+    assert scheduler.call("test", fn, hedge_after=0.05) == "ok"
+    assert fn.requests == 1
+    assert scheduler.stats()["test"]["in_flight"] == 0
@@ -0,0 +1,38 @@
+from sessions import SessionStore
+
+
+class Handler:
+    """Stands in for ConversationHandler: one canned prompt, no ChromaDB."""
+
+    def start_conversation(self, video_id):
+        self.video_id = video_id
+        self.system_prompt = f"analysis of {video_id}"
+        self.conversation_history = []
+        self.memory = ""
+        return self.system_prompt
+
+    def restore(self, video_id, system_prompt, conversation_history, memory=""):
+        self.video_id = video_id
+        self.system_prompt = system_prompt
+        self.conversation_history = list(conversation_history)
+        self.memory = memory
+
+
+def test_set_system_prompt_reaches_live_and_stored_sessions(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(Handler, path=path)
+    other_worker = SessionStore(Handler, path=path)
+
+    session = store.get("a@example.com", "video_1")
+    session.handler.conversation_history.append({"role": "user", "content": "hi"})
+    store.save(session)
+    remote = other_worker.get("a@example.com", "video_1")
+    unrelated = store.get("a@example.com", "video_2")
+
+    store.set_system_prompt("video_1", "new analysis")
+
+    assert session.handler.system_prompt == "new analysis"
+    assert unrelated.handler.system_prompt == "analysis of video_2"
+    remote = other_worker.get("a@example.com", "video_1")
+    assert remote.handler.system_prompt == "new analysis"
+    assert remote.handler.conversation_history == [{"role": "user", "content": "hi"}]
@@ -0,0 +1,41 @@
+import time
+
+from stream_buffer import StreamRegistry, sse_events
+
+
+def test_full_registry_evicts_finished_streams_only():
+    streams = StreamRegistry(max_streams=2, ttl=600)
+    live = streams.create()
+    finished = streams.create()
+    finished.finish()
+
+    newer = streams.create()
+    assert streams.get(finished.id) is None
+    assert streams.get(live.id) is live
+
+    # Nothing finished is left to evict, so the registry grows past max_streams
+    newest = streams.create()
+    assert [streams.get(stream.id) for stream in (live, newer, newest)] == [live, newer, newest]
+
+
+def test_expired_streams_are_evicted_wherever_they_are():
+    streams = StreamRegistry(max_streams=10, ttl=60)
+    live = streams.create()
+    finished = streams.create()
+    finished.finish()
+    finished.updated_at = time.time() - 120
+
+    streams.create()
+    assert streams.get(finished.id) is None
+    assert streams.get(live.id) is live
+
+
+def test_events_resume_from_offset():
+    stream = StreamRegistry().create()
+    for chunk in ("a", "b", "c"):
+        stream.append(chunk)
+    stream.finish()
+
+    events = list(sse_events(stream, 1))
+    assert [event.split("\n")[0] for event in events[1:-1]] == ["id: 2", "id: 3"]
+    assert events[-1].startswith("event: done")
@@ -0,0 +1,19 @@
+import pytest
+
+from summarizer import shot_windows
+
+
+@pytest.mark.parametrize("end, expected", [
+    (250.0, [(0.0, 120), (120, 240), (240, 250.0)]),
+    (240.0, [(0.0, 120), (120, 240)]),
+    (100.0, [(0.0, 100.0)]),
+    (0.0, [(0.0, 0.0)]),
+])
+def test_windows_without_shots_stop_at_the_end_of_the_video(end, expected):
+    assert shot_windows([("label", "car", 0.0, end, 1.0)], 120) == expected
+
+
+def test_windows_end_on_shot_boundaries():
+    rows = [("shot", "", 0.0, 70.0, 1.0), ("shot", "", 70.0, 130.0, 1.0), ("shot", "", 130.0, 200.0, 1.0),
+            ("label", "car", 0.0, 260.0, 1.0)]
+    assert shot_windows(rows, 120) == [(0.0, 130.0), (130.0, 260.0)]
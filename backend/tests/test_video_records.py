@@ -0,0 +1,35 @@
+import sqlite3
+
+from video_records import VideoRecordStore
+
+
+def test_footage_survives_put_and_is_listed_once(tmp_path):
+    store = VideoRecordStore(path=str(tmp_path / "videos.db"))
+    store.add_footage("missing", "a@example.com", "f1", "2024-01-01T00:00:00")
+    assert store.get("missing") is None
+
+    store.put("video_1", ["LABEL_DETECTION"])
+    store.add_footage("video_1", "a@example.com", "f1", "2024-01-01T00:00:00")
+    store.add_footage("video_1", "a@example.com", "f1", "2024-01-01T00:00:00")
+    store.put("video_1", ["LABEL_DETECTION", "FACE_DETECTION"])
+
+    record = store.get("video_1")
+    assert record["sections"] == ["LABEL_DETECTION", "FACE_DETECTION"]
+    assert record["footage"] == [["a@example.com", "f1", "2024-01-01T00:00:00"]]
+
+
+def test_records_from_before_footage_tracking_are_migrated(tmp_path):
+    path = str(tmp_path / "videos.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+            CREATE TABLE videos (
+                video_id TEXT PRIMARY KEY, content_hash TEXT, source_uri TEXT, sections TEXT NOT NULL,
+                segments TEXT, metadata TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("INSERT INTO videos VALUES ('video_1', NULL, NULL, '[]', NULL, '{}', 0, 0)")
+
+    store = VideoRecordStore(path=path)
+    assert store.get("video_1")["footage"] == []
+    store.add_footage("video_1", "a@example.com", "f1", "2024-01-01T00:00:00")
+    assert store.get("video_1")["footage"] == [["a@example.com", "f1", "2024-01-01T00:00:00"]]
@@ -0,0 +1,57 @@
+from annotation_store import KINDS, describe_annotations
+
+
+def parse_timestamp(value):
+    """Parse seconds ("133", "133.5") or clock time ("02:13", "1:02:13") into seconds."""
+    value = value.strip()
+    if ':' not in value:
+        return float(value)
+    seconds = 0.0
+    for part in value.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_kinds(value):
+    """Split a comma separated kind filter, rejecting unknown kinds."""
+    if not value:
+        return None
+    kinds = [kind.strip().lower() for kind in value.split(',') if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in KINDS]
+    if unknown:
+        raise ValueError(f"Unknown kind(s): {', '.join(unknown)}. Expected any of: {', '.join(KINDS)}")
+    return kinds
+
+
+def get_timeline(store, video_id, start=0.0, end=None, kinds=None, name=None, min_confidence=0.0, limit=None):
+    """What happened in a video between start and end seconds, from its precomputed annotation index.
+
+    Returns None if the video has no stored annotations. Items are ordered by start time.
+    """
+    annotations = store.get(video_id)
+    if annotations is None:
+        return None
+    if end is None:
+        end = annotations.duration()
+    if name:
+        items = [
+            item for item in annotations.find(name, start, end)
+            if (not kinds or item['kind'] in kinds) and item['confidence'] >= min_confidence
+        ]
+    else:
+        items = annotations.query(start, end, kinds, min_confidence)
+
+    counts = {}
+    for item in items:
+        counts[item['kind']] = counts.get(item['kind'], 0) + 1
+
+    return {
+        'video_id': video_id,
+        'start': start,
+        'end': end,
+        'kinds': kinds or list(KINDS),
+        'counts': counts,
+        'summary': describe_annotations(items, start, end),
+        'truncated': limit is not None and len(items) > limit,
+        'items': items[:limit] if limit is not None else items,
+    }
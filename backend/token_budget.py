@@ -0,0 +1,73 @@
+import os
+
+# Rough characters-per-token ratio for English text with the Mixtral tokenizer
+CHARS_PER_TOKEN = 4
+# Per-message overhead for role markers
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text):
+    """Cheap token estimate, good enough for budgeting without loading a tokenizer."""
+    if not text:
+        return 0
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def messages_tokens(messages):
+    return sum(estimate_tokens(m['content']) + MESSAGE_OVERHEAD for m in messages)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text so its estimate fits in max_tokens."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + "\n[truncated]"
+
+
+class TokenBudget:
+    """Keeps every conversation turn inside a fixed prompt size.
+
+    The stored analysis and retrieved context are capped, the most recent recent_messages
+    messages are sent verbatim, and once summarize_every more messages have piled up
+    behind that window they are folded into a short running memory.
+    """
+
+    def __init__(self, max_prompt_tokens=None, max_response_tokens=None, max_context_tokens=None,
+                 max_analysis_tokens=None, recent_messages=None, summarize_every=None, summary_tokens=None):
+        self.max_prompt_tokens = max_prompt_tokens or int(os.getenv('CHAT_MAX_PROMPT_TOKENS', '6000'))
+        self.max_response_tokens = max_response_tokens or int(os.getenv('CHAT_MAX_RESPONSE_TOKENS', '1024'))
+        self.max_context_tokens = max_context_tokens or int(os.getenv('CHAT_MAX_CONTEXT_TOKENS', '1500'))
+        self.max_analysis_tokens = max_analysis_tokens or int(os.getenv('CHAT_MAX_ANALYSIS_TOKENS', '3000'))
+        self.recent_messages = recent_messages or int(os.getenv('CHAT_RECENT_MESSAGES', '8'))
+        self.summarize_every = summarize_every or int(os.getenv('CHAT_SUMMARIZE_EVERY', '6'))
+        self.summary_tokens = summary_tokens or int(os.getenv('CHAT_SUMMARY_TOKENS', '300'))
+
+    def needs_summary(self, history):
+        return len(history) >= self.recent_messages + self.summarize_every
+
+    def split(self, history):
+        """Split history into (older messages to summarize, recent messages to keep)."""
+        return history[:-self.recent_messages], history[-self.recent_messages:]
+
+    def build_messages(self, system_prompt, memory, relevant_info, history):
+        """Assemble the prompt for one turn, trimming context and history to stay within budget."""
+        fixed = [{"role": "system", "content": system_prompt}]
+        if memory:
+            fixed.append({"role": "system", "content": f"Summary of the earlier conversation:\n{memory}"})
+
+        remaining = self.max_prompt_tokens - messages_tokens(fixed)
+        context = truncate_to_tokens(relevant_info, max(0, min(self.max_context_tokens, remaining // 2)))
+        fixed.append({"role": "system", "content": f"Additional relevant information:\n{context}"})
+        remaining = self.max_prompt_tokens - messages_tokens(fixed)
+
+        # Keep as many of the latest messages as fit, always including the current user message
+        recent = []
+        for message in reversed(history):
+            cost = estimate_tokens(message['content']) + MESSAGE_OVERHEAD
+            if recent and cost > remaining:
+                break
+            recent.append(message)
+            remaining -= cost
+        recent.reverse()
+        return fixed + recent
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class VideoRecordStore:
+    """What has been annotated for each video, and where its source is kept for later passes.
+
+    A video analyzed with a partial profile keeps its source in an object store so the missing
+    sections can be fetched when a conversation needs them. Once every section is in, or the
+    source is older than max_age seconds, the source is deleted. The footage records pointing at
+    a video are listed too, so their analysis can be rewritten when sections are added.
+    """
+
+    def __init__(self, path=None, max_age=None):
+        self.path = path or os.getenv('VIDEO_RECORDS_PATH', './video_records.db')
+        self.max_age = max_age or float(os.getenv('VIDEO_SOURCE_MAX_AGE', str(7 * 24 * 3600)))
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    video_id TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    source_uri TEXT,
+                    sections TEXT NOT NULL,
+                    segments TEXT,
+                    metadata TEXT NOT NULL,
+                    footage TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(videos)")]
+            if 'footage' not in columns:
+                # Records created before footage was tracked
+                conn.execute("ALTER TABLE videos ADD COLUMN footage TEXT")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, video_id):
+        """Return {'video_id', 'content_hash', 'source_uri', 'sections', 'segments', 'metadata', 'footage'} or None.
+
+        footage is a list of [email, footage_id, upload_date], one per footage record of the video.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT content_hash, source_uri, sections, segments, metadata, footage FROM videos WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        content_hash, source_uri, sections, segments, metadata, footage = row
+        return {
+            'video_id': video_id,
+            'content_hash': content_hash,
+            'source_uri': source_uri,
+            'sections': json.loads(sections),
+            'segments': json.loads(segments) if segments else None,
+            'metadata': json.loads(metadata),
+            'footage': json.loads(footage) if footage else [],
+        }
+
+    def put(self, video_id, sections, content_hash=None, source_uri=None, segments=None, metadata=None):
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO videos
+                   (video_id, content_hash, source_uri, sections, segments, metadata, footage, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, (SELECT footage FROM videos WHERE video_id = ?),
+                           COALESCE((SELECT created_at FROM videos WHERE video_id = ?), ?), ?)""",
+                (video_id, content_hash, source_uri, json.dumps(list(sections)),
+                 json.dumps(segments) if segments is not None else None, json.dumps(metadata or {}),
+                 video_id, video_id, now, now)
+            )
+
+    def add_sections(self, video_id, sections, source_uri=None):
+        """Record newly annotated sections. Returns the merged section list."""
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT sections FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+            merged = json.loads(row[0]) if row else []
+            merged += [name for name in sections if name not in merged]
+            conn.execute(
+                "UPDATE videos SET sections = ?, source_uri = ?, updated_at = ? WHERE video_id = ?",
+                (json.dumps(merged), source_uri, time.time(), video_id)
+            )
+        return merged
+
+    def add_footage(self, video_id, email, footage_id, upload_date):
+        """Record a footage record that shows this video. Does nothing for videos without a record."""
+        with self.lock, self._connect() as conn:
+            # Taken before reading so two processes cannot drop each other's entries
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT footage FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None:
+                return
+            footage = json.loads(row[0]) if row[0] else []
+            if [email, footage_id, upload_date] not in footage:
+                footage.append([email, footage_id, upload_date])
+            conn.execute("UPDATE videos SET footage = ?, updated_at = ? WHERE video_id = ?",
+                         (json.dumps(footage), time.time(), video_id))
+
+    def prune_sources(self, store):
+        """Delete sources kept longer than max_age. Their videos can no longer be extended."""
+        cutoff = time.time() - self.max_age
+        with self.lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT video_id, source_uri FROM videos WHERE source_uri IS NOT NULL AND created_at < ?", (cutoff,)
+            ).fetchall()
+            for video_id, source_uri in rows:
+                try:
+                    store.delete(source_uri)
+                except Exception as e:
+                    logger.warning(f"Could not delete source {source_uri} of {video_id}: {e}")
+                conn.execute("UPDATE videos SET source_uri = NULL WHERE video_id = ?", (video_id,))
+        return len(rows)
@@ -45,16 +45,27 @@
 
 const API_BASE_URL = 'http://localhost:5000'; // Adjust this if your backend is on a different port
 
-export async function fetchSurveillanceVideos(email) {
+// One page of a user's footage: { footages, next_cursor }. Pass next_cursor back for the next page.
+export async function fetchSurveillanceVideos(email, { limit, cursor } = {}) {
   try {
-    const response = await axios.post(`${API_BASE_URL}/footages`, { email });
-    return response.data.footages;
+    const response = await axios.get(`${API_BASE_URL}/footages`, { params: { email, limit, cursor } });
+    return response.data;
   } catch (error) {
     console.error('Error fetching surveillance videos:', error);
     throw error;
   }
 }
 
+export async function fetchFootageAnalysis(email, footageId) {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/footages/${footageId}`, { params: { email } });
+    return response.data.analysis;
+  } catch (error) {
+    console.error('Error fetching footage analysis:', error);
+    throw error;
+  }
+}
+
 export async function fetchChatMessages(videoId) {
   try {
     // Note: Your backend doesn't have a specific endpoint for fetching chat messages.
@@ -89,4 +100,4 @@ export async function sendChatMessage(videoId, message) {
     console.log(response.data);
     resolve(response);
 
-}
\ No newline at end of file
+}
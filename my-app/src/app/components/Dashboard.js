@@ -5,22 +5,36 @@ import { useUser } from '@auth0/nextjs-auth0/client';
 import { useRouter } from 'next/navigation';
 import { Camera } from 'lucide-react';
 import chatStore from '../chatStore';
+import { fetchFootageAnalysis, fetchSurveillanceVideos } from '../api';
 
-const ChatItem = ({ id, name, label, upload_date, analysis }) => {
+const PAGE_SIZE = 20;
+
+const ChatItem = ({ footage_id, name, label, upload_date, preview, email }) => {
   const [isExpanded, setIsExpanded] = useState(false);
+  const [analysis, setAnalysis] = useState(null);
   const previewLength = 100;
   const router = useRouter();
 
-  const toggleExpand = (e) => {
+  const toggleExpand = async (e) => {
     e.stopPropagation();
+    if (!isExpanded && analysis === null) {
+      // The list only carries a preview; the full analysis is fetched once, on demand
+      try {
+        setAnalysis(await fetchFootageAnalysis(email, footage_id));
+      } catch (err) {
+        console.error('Error fetching analysis:', err);
+      }
+    }
     setIsExpanded(!isExpanded);
   };
 
   const handleChatClick = () => {
-    chatStore.setCurrentChatId(id);
+    chatStore.setCurrentChatId(footage_id);
     router.push('/chatpage');
   };
 
+  const text = (isExpanded && analysis) || preview || '';
+
   // Format the date
   const formattedDate = new Date(upload_date).toLocaleString();
 
@@ -52,7 +66,7 @@ const ChatItem = ({ id, name, label, upload_date, analysis }) => {
       </div>
       <div className="p-4 w-2/3 border-l border-gray-200">
         <div className="text-gray-700 mb-2 font-light">
-          {isExpanded ? analysis : `${analysis.slice(0, previewLength)}...`}
+          {isExpanded ? text : `${text.slice(0, previewLength)}...`}
         </div>
         <button
           className="text-blue-500 hover:text-blue-600 flex items-center text-sm font-light"
@@ -67,41 +81,23 @@ const ChatItem = ({ id, name, label, upload_date, analysis }) => {
 
 const ClientChatList = () => {
   const [chats, setChats] = useState([]);
-  const [labelLog, setLabelLog] = useState({});
+  const [nextCursor, setNextCursor] = useState(null);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
   const { user } = useUser();
 
+  // Each page is a small projected listing; the browser revalidates it with If-None-Match
+  const fetchPage = (cursor) => fetchSurveillanceVideos(user.email, { limit: PAGE_SIZE, cursor });
+
   useEffect(() => {
     const fetchChats = async () => {
       if (!user || !user.email) return;
 
       setIsLoading(true);
       try {
-        const response = await fetch('http://localhost:5000/footages', {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-          },
-          body: JSON.stringify({ email: user.email }),
-        });
-        
-        if (!response.ok) {
-          throw new Error('Failed to fetch footages');
-        }
-        
-        const data = await response.json();
-        console.log(data);
+        const data = await fetchPage(null);
         setChats(data.footages || []);
-        
-        // Create label log
-        const log = (data.footages || []).reduce((acc, footage) => {
-          if (footage.label) {
-            acc[footage.label] = (acc[footage.label] || 0) + 1;
-          }
-          return acc;
-        }, {});
-        setLabelLog(log);
+        setNextCursor(data.next_cursor);
       } catch (err) {
         console.error('Error fetching footages:', err);
         setError(err.message);
@@ -113,6 +109,25 @@ const ClientChatList = () => {
     fetchChats();
   }, [user]);
 
+  const loadMore = async () => {
+    try {
+      const data = await fetchPage(nextCursor);
+      setChats((loaded) => [...loaded, ...(data.footages || [])]);
+      setNextCursor(data.next_cursor);
+    } catch (err) {
+      console.error('Error fetching footages:', err);
+      setError(err.message);
+    }
+  };
+
+  // Label log over the footage loaded so far
+  const labelLog = chats.reduce((acc, footage) => {
+    if (footage.label) {
+      acc[footage.label] = (acc[footage.label] || 0) + 1;
+    }
+    return acc;
+  }, {});
+
   if (isLoading) return <div>Loading...</div>;
   if (error) return <div>Error: {error}</div>;
 
@@ -130,13 +145,36 @@ const ClientChatList = () => {
       </div>
       <div className="space-y-6 overflow-y-auto max-h-[calc(100vh-16rem)]">
         {chats.map((chat) => (
-          <ChatItem key={chat.id} {...chat} />
+          <ChatItem key={chat.footage_id} {...chat} email={user.email} />
         ))}
+        {nextCursor && (
+          <button
+            className="w-full bg-gray-200 hover:bg-gray-300 text-gray-700 font-semibold py-2 px-4 rounded-full text-sm"
+            onClick={loadMore}
+          >
+            Load more
+          </button>
+        )}
       </div>
     </div>
   );
 };
 
+// Poll the analysis job until the backend worker pool has finished it
+const waitForJob = async (jobId, interval = 3000) => {
+  while (true) {
+    const response = await fetch(`http://localhost:5000/jobs/${jobId}/result`);
+    const data = await response.json();
+    if (response.status === 200) {
+      return data;
+    }
+    if (response.status !== 202) {
+      throw new Error(data.error || 'Video analysis failed');
+    }
+    await new Promise((resolve) => setTimeout(resolve, interval));
+  }
+};
+
 const Dashboard = () => {
   const [file, setFile] = useState(null);
   const [videoId, setVideoId] = useState(null);
@@ -146,6 +184,7 @@ const Dashboard = () => {
   const { user, error, isLoading } = useUser();
   const [label, setLabel] = useState('');
   const [name, setName] = useState('');
+  const [profile, setProfile] = useState('full');
 
   const handleFileChange = (event) => {
     setFile(event.target.files[0]);
@@ -158,6 +197,10 @@ const Dashboard = () => {
     formData.append('file', file);
     formData.append('label', label);
     formData.append('name', name);
+    formData.append('profile', profile);
+    if (user?.email) {
+      formData.append('email', user.email);
+    }
 
     try {
       // Upload and analyze the file
@@ -165,51 +208,75 @@ const Dashboard = () => {
         method: 'POST',
         body: formData,
       });
-      const analyzeData = await analyzeResponse.json();
+      const jobData = await analyzeResponse.json();
+      if (!analyzeResponse.ok) {
+        throw new Error(jobData.error || 'Failed to queue analysis');
+      }
+      const analyzeData = await waitForJob(jobData.job_id);
       setVideoId(analyzeData.video_id);
       setAnalysis(analyzeData.result);
       setLabel(analyzeData.label);
       setName(analyzeData.name);
 
-      // Save user data
-      const saveUserResponse = await fetch('http://localhost:5000/api/add-footage', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ 
-          email: user.email,
-          name: name,
-          label: label,
-          analysis: analyzeData.result
-        }),
-      });
-
-      if (!saveUserResponse.ok) {
-        console.error('Failed to save user data');
-      }
-
+      // The job stored the footage record itself (analyzeData.footage)
     } catch (error) {
-      console.error('Error during upload or saving user data:', error);
+      console.error('Error during upload or analysis:', error);
     }
   };
 
   const handleChat = async () => {
     if (!videoId || !chatInput) return;
 
+    const question = chatInput;
+    const turn = chatHistory.length;
+    setChatHistory([...chatHistory, { user: question, assistant: '' }]);
+    setChatInput('');
+    const showAnswer = (text) =>
+      setChatHistory((history) =>
+        history.map((chat, index) => (index === turn ? { ...chat, assistant: text } : chat))
+      );
+    let answer = '';
+
     try {
-      const response = await fetch('http://localhost:5000/conversation', {
+      const response = await fetch('http://localhost:5000/conversation/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ video_id: videoId, user_input: chatInput }),
+        body: JSON.stringify({ video_id: videoId, user_input: question, email: user?.email }),
       });
-      const data = await response.json();
-      setChatHistory([...chatHistory, { user: chatInput, assistant: data.response }]);
-      setChatInput('');
+      if (!response.ok) {
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || 'Failed to start conversation stream');
+      }
+
+      // Append each server-sent delta to the answer as it arrives
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const event of events) {
+          const dataLine = event.split('\n').find((line) => line.startsWith('data: '));
+          if (!dataLine) continue;
+          const data = JSON.parse(dataLine.slice(6));
+          if (data.delta) {
+            answer += data.delta;
+            showAnswer(answer);
+          } else if (data.error) {
+            // event: error, sent when the answer could not be generated
+            throw new Error(data.error);
+          }
+        }
+      }
     } catch (error) {
       console.error('Error chatting:', error);
+      // Keep whatever part of the answer arrived before the error
+      showAnswer(answer ? `${answer}\n\nError: ${error.message}` : `Error: ${error.message}`);
     }
   };
 
@@ -230,6 +297,15 @@ const Dashboard = () => {
           placeholder="Enter name"
           className="w-full p-2 border rounded mb-2"
         />
+        <select
+          value={profile}
+          onChange={(e) => setProfile(e.target.value)}
+          className="w-full p-2 border rounded mb-2"
+        >
+          <option value="quick">Quick (shots and labels, details fetched when asked)</option>
+          <option value="standard">Standard (adds objects and speech)</option>
+          <option value="full">Full (everything up front)</option>
+        </select>
         <input type="file" onChange={handleFileChange} accept="video/*" className="mb-2" />
         <button onClick={handleUpload} className="bg-blue-500 text-white px-4 py-2 rounded">
           Upload and Analyze